@@ -0,0 +1,28 @@
+"""Links author on delete cascade
+
+Revision ID: 3f8c2d9b7a15
+Revises: c52f0e8d1a76
+Create Date: 2026-10-17 13:22:47.918402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f8c2d9b7a15'
+down_revision: Union[str, None] = 'c52f0e8d1a76'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.drop_constraint('links_author_id_fkey', 'links', type_='foreignkey')
+    op.create_foreign_key('links_author_id_fkey', 'links', 'user', ['author_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('links_author_id_fkey', 'links', type_='foreignkey')
+    op.create_foreign_key('links_author_id_fkey', 'links', 'user', ['author_id'], ['id'])
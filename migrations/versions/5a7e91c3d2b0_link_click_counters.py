@@ -0,0 +1,41 @@
+"""Link click counters
+
+Revision ID: 5a7e91c3d2b0
+Revises: d81e6b0c4f29
+Create Date: 2026-10-17 18:42:07.318254
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5a7e91c3d2b0'
+down_revision: Union[str, None] = 'd81e6b0c4f29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# пропускная способность переходов по одной популярной ссылке:
+# python -m tests.benchmark_click_counters --database-url postgresql://...
+
+
+def upgrade() -> None:
+    op.create_table('link_click_counters',
+    sa.Column('link_id', sa.Integer(), nullable=False),
+    sa.Column('shard', sa.SmallInteger(), nullable=False),
+    sa.Column('clicks', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['link_id'], ['links.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('link_id', 'shard')
+    )
+
+
+def downgrade() -> None:
+    # еще не перенесенные шарды сначала складываются в links.redirect_counter
+    op.execute("""
+        UPDATE links SET redirect_counter = links.redirect_counter + totals.clicks
+        FROM (SELECT link_id, sum(clicks) AS clicks FROM link_click_counters GROUP BY link_id) AS totals
+        WHERE links.id = totals.link_id
+    """)
+    op.drop_table('link_click_counters')
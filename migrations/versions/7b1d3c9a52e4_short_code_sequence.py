@@ -0,0 +1,26 @@
+"""Short code sequence
+
+Revision ID: 7b1d3c9a52e4
+Revises: e4f28b712f45
+Create Date: 2026-10-17 10:12:31.402115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1d3c9a52e4'
+down_revision: Union[str, None] = 'e4f28b712f45'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute(sa.schema.CreateSequence(sa.Sequence('short_code_seq')))
+
+
+def downgrade() -> None:
+    op.execute(sa.schema.DropSequence(sa.Sequence('short_code_seq')))
@@ -0,0 +1,30 @@
+"""Applied click flushes
+
+Revision ID: b4d09c7e2f63
+Revises: 5a7e91c3d2b0
+Create Date: 2026-10-17 21:05:44.902113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d09c7e2f63'
+down_revision: Union[str, None] = '5a7e91c3d2b0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('applied_click_flushes',
+    sa.Column('flush_id', sa.String(), nullable=False),
+    sa.Column('applied_at', sa.DateTime(timezone=False), nullable=False),
+    sa.PrimaryKeyConstraint('flush_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('applied_click_flushes')
@@ -0,0 +1,71 @@
+"""Unique long url
+
+Revision ID: c52f0e8d1a76
+Revises: 7b1d3c9a52e4
+Create Date: 2026-10-17 11:03:48.527310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.links.urls import long_url_digest
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c52f0e8d1a76'
+down_revision: Union[str, None] = '7b1d3c9a52e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# уникальность проверяется не по самому long_url (он не ограничен по длине, а строка
+# b-tree индекса - примерно 2.7 КБ), а по sha256 нормализованного url фиксированной длины
+
+
+def upgrade() -> None:
+    op.add_column('links', sa.Column('long_url_digest', sa.String(length=64), nullable=True))
+
+    connection = op.get_bind()
+    links = sa.table('links', sa.column('id', sa.Integer), sa.column('long_url', sa.String),
+                     sa.column('long_url_digest', sa.String))
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(links.c.id, links.c.long_url)
+            .where(links.c.id > last_id)
+            .order_by(links.c.id)
+            .limit(BACKFILL_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        connection.execute(
+            links.update().where(links.c.id == sa.bindparam('link_id')).values(long_url_digest=sa.bindparam('digest')),
+            [{'link_id': row.id, 'digest': long_url_digest(row.long_url)} for row in rows]
+        )
+        last_id = rows[-1].id
+
+    # дубликаты: одинаковые url от гонки проверки и вставки в старом коде или url, совпадающие
+    # после нормализации (http://a.com и http://a.com/). Их короткие коды уже розданы, поэтому
+    # строки не удаляются: за url остается самая ранняя ссылка, остальные получают digest от
+    # своего id - по коду они открываются как раньше, но поиском по url уже не находятся
+    op.execute("""
+        UPDATE links SET long_url_digest = encode(sha256(convert_to('duplicate:' || id, 'UTF8')), 'hex')
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, row_number() OVER (PARTITION BY long_url_digest ORDER BY id) AS position
+                FROM links
+            ) AS ranked
+            WHERE position > 1
+        )
+    """)
+
+    op.alter_column('links', 'long_url_digest', nullable=False)
+    op.create_index(op.f('ix_links_long_url_digest'), 'links', ['long_url_digest'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_links_long_url_digest'), table_name='links')
+    op.drop_column('links', 'long_url_digest')
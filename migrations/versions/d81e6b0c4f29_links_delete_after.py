@@ -0,0 +1,50 @@
+"""Links delete after
+
+Revision ID: d81e6b0c4f29
+Revises: 3f8c2d9b7a15
+Create Date: 2026-10-17 14:05:19.662084
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.config import Settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81e6b0c4f29'
+down_revision: Union[str, None] = '3f8c2d9b7a15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def upgrade() -> None:
+    op.add_column('links', sa.Column('delete_after', sa.DateTime(timezone=False), nullable=True))
+
+    # то же правило, что в src/links/expiry.py: срок истечения или
+    # LINK_TTL_IN_DAYS с последнего обновления/перехода
+    connection = op.get_bind()
+    max_id = connection.execute(sa.text("SELECT coalesce(max(id), 0) FROM links")).scalar()
+    for start in range(0, max_id, BACKFILL_BATCH_SIZE):
+        connection.execute(
+            sa.text("""
+                UPDATE links SET delete_after = coalesce(
+                    expires_at,
+                    greatest(updated_at, coalesce(last_used_at, updated_at)) + make_interval(days => :ttl)
+                )
+                WHERE id > :start AND id <= :end
+            """),
+            {"ttl": Settings().LINK_TTL_IN_DAYS, "start": start, "end": start + BACKFILL_BATCH_SIZE}
+        )
+
+    op.alter_column('links', 'delete_after', nullable=False)
+    op.create_index(op.f('ix_links_delete_after'), 'links', ['delete_after'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_links_delete_after'), table_name='links')
+    op.drop_column('links', 'delete_after')
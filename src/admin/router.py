@@ -1,9 +1,21 @@
-from fastapi import APIRouter, Depends
+import os
+import shutil
+import uuid
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi_cache import FastAPICache
 from redis import asyncio as aioredis
 
 from src.auth.models import User
 from src.auth.users import get_admin_user
 from src.config import Settings
+from src.links.bloom import short_code_filter
+from src.links.cache import redirect_cache
+from src.links.importer import import_job_key
+from src.links.schemes import ImportJobResponse
+from src.tasks.tasks import import_links_task
 
 router = APIRouter(
     prefix="/admin",
@@ -19,6 +31,53 @@ async def get_cache_keys(
     return keys
 
 
+@router.get("/cache-stats", response_model=dict)
+async def get_cache_stats(
+        superuser: User = Depends(get_admin_user)
+):
+    stats = {"redirect_l1": redirect_cache.stats()}
+    if Settings().SHORT_CODE_FILTER_ENABLED:
+        stats["short_code_filter"] = await short_code_filter.stats(FastAPICache.get_backend().redis)
+    return stats
+
+
+@router.post("/import-links", response_model=ImportJobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def import_links_from_file(
+        file: UploadFile,
+        file_format: Optional[str] = Query(default=None, alias="format", pattern="^(csv|jsonl)$"),
+        superuser: User = Depends(get_admin_user)
+):
+    # сам импорт идет в celery: разбор и валидация строк не должны занимать event loop,
+    # который обслуживает редиректы; здесь файл только сохраняется в общий с воркером каталог
+    file_format = file_format or ("csv" if (file.filename or "").endswith(".csv") else "jsonl")
+    job = ImportJobResponse(job_id=uuid.uuid4().hex, status="queued")
+    path = os.path.join(Settings().IMPORT_UPLOAD_DIR, f"{job.job_id}.{file_format}")
+    await run_in_threadpool(_save_upload, file, path)
+
+    await FastAPICache.get_backend().redis.set(
+        import_job_key(job.job_id), job.model_dump_json(), ex=Settings().IMPORT_JOB_TTL
+    )
+    import_links_task.delay(job.job_id, path, file_format)
+    return job
+
+
+@router.get("/import-links/{job_id}", response_model=ImportJobResponse)
+async def get_import_job(
+        job_id: str,
+        superuser: User = Depends(get_admin_user)
+):
+    job = await FastAPICache.get_backend().redis.get(import_job_key(job_id))
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Import job not found")
+    return ImportJobResponse.model_validate_json(job)
+
+
+def _save_upload(file: UploadFile, path: str) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as destination:
+        shutil.copyfileobj(file.file, destination)
+
+
 async def _get_all_cache_keys(pattern: str = "*") -> list[str]:
     redis = aioredis.from_url(Settings().MESSAGE_BROKER_URL)
     keys = []
@@ -28,9 +28,12 @@ class User(SQLAlchemyBaseUserTable[int], DbBase):
     is_verified: Mapped[bool] = mapped_column(
         Boolean, default=True, nullable=False
     )
+    # ссылки не грузятся вместе с пользователем (он резолвится на каждом запросе),
+    # при необходимости - явно через selectinload(User.links);
+    # при удалении пользователя ссылки удаляются одним DELETE, см. UserManager.on_before_delete
     links: Mapped[List["Link"]] = relationship(
         "Link",
         back_populates="author",
-        cascade="all, delete",
-        lazy="selectin"
+        passive_deletes=True,
+        lazy="raise_on_sql"
     )
@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime
-from fastapi import Depends
+from typing import Optional
+from fastapi import Depends, Request
 from fastapi_users import BaseUserManager, FastAPIUsers, IntegerIDMixin
 from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -11,6 +12,7 @@ from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTable
 from sqlalchemy import Integer, String, DateTime, Column, Boolean
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from src.auth.models import User
+from src.links.service import LinkService
 
 
 SECRET = Settings().PASSWORD_SECRET_KEY
@@ -20,6 +22,9 @@ class UserManager(IntegerIDMixin, BaseUserManager[User, int]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    async def on_before_delete(self, user: User, request: Optional[Request] = None) -> None:
+        await LinkService(self.user_db.session).delete_by_author(user.id)
+
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
     yield SQLAlchemyUserDatabase(session, User)
@@ -23,3 +23,53 @@ class Settings(BaseSettings):
     CODE_GENERATION_SECRET: str = os.getenv("CODE_GENERATION_SECRET")
     SHORT_CODE_LENGTH: int = int(os.getenv("SHORT_CODE_LENGTH"))
     SITE_IP: str = os.getenv("SITE_IP")
+    L1_CACHE_SIZE: int = int(os.getenv("L1_CACHE_SIZE", 10000))
+    L1_CACHE_TTL: int = int(os.getenv("L1_CACHE_TTL", 30))
+    REDIRECT_COUNTER_MODE: str = os.getenv("REDIRECT_COUNTER_MODE", "direct")
+    COUNTER_FLUSH_INTERVAL: float = float(os.getenv("COUNTER_FLUSH_INTERVAL", 5))
+    COUNTER_FLUSH_BATCH_SIZE: int = int(os.getenv("COUNTER_FLUSH_BATCH_SIZE", 1000))
+    COUNTER_FLUSH_LOCK_TTL: int = int(os.getenv("COUNTER_FLUSH_LOCK_TTL", 60))
+    CLICK_COUNTER_SHARDS: int = int(os.getenv("CLICK_COUNTER_SHARDS", 0))
+    CLICK_COUNTER_COMPACTION_INTERVAL: float = float(os.getenv("CLICK_COUNTER_COMPACTION_INTERVAL", 60))
+    CLICK_COUNTER_COMPACTION_CHUNK_SIZE: int = int(os.getenv("CLICK_COUNTER_COMPACTION_CHUNK_SIZE", 10000))
+    CLICK_COUNTER_COMPACTION_MAX_CHUNKS: int = int(os.getenv("CLICK_COUNTER_COMPACTION_MAX_CHUNKS", 100))
+    SHORT_CODE_FILTER_ENABLED: bool = os.getenv("SHORT_CODE_FILTER_ENABLED", "false").lower() == "true"
+    SHORT_CODE_FILTER_CAPACITY: int = int(os.getenv("SHORT_CODE_FILTER_CAPACITY", 1000000))
+    SHORT_CODE_FILTER_ERROR_RATE: float = float(os.getenv("SHORT_CODE_FILTER_ERROR_RATE", 0.001))
+    SHORT_CODE_FILTER_REBUILD_INTERVAL: float = float(os.getenv("SHORT_CODE_FILTER_REBUILD_INTERVAL", 3600))
+    NEGATIVE_CACHE_TTL: int = int(os.getenv("NEGATIVE_CACHE_TTL", 30))
+    SHORT_CODE_ALLOCATOR: str = os.getenv("SHORT_CODE_ALLOCATOR", "hash")
+    SHORT_CODE_BLOCK_SIZE: int = int(os.getenv("SHORT_CODE_BLOCK_SIZE", 1000))
+    BATCH_SHORTEN_MAX_ITEMS: int = int(os.getenv("BATCH_SHORTEN_MAX_ITEMS", 50000))
+    BATCH_SHORTEN_CHUNK_SIZE: int = int(os.getenv("BATCH_SHORTEN_CHUNK_SIZE", 1000))
+    IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", 10000))
+    IMPORT_UPLOAD_DIR: str = os.getenv("IMPORT_UPLOAD_DIR", "imports")
+    IMPORT_JOB_TTL: int = int(os.getenv("IMPORT_JOB_TTL", 86400))
+    LINKS_PAGE_SIZE: int = int(os.getenv("LINKS_PAGE_SIZE", 100))
+    LINKS_PAGE_MAX_SIZE: int = int(os.getenv("LINKS_PAGE_MAX_SIZE", 1000))
+    LINKS_STREAM_CHUNK_SIZE: int = int(os.getenv("LINKS_STREAM_CHUNK_SIZE", 1000))
+    STATISTICS_CHUNK_SIZE: int = int(os.getenv("STATISTICS_CHUNK_SIZE", 1000))
+    CLEANUP_CHUNK_SIZE: int = int(os.getenv("CLEANUP_CHUNK_SIZE", 1000))
+    CLEANUP_MAX_CHUNKS: int = int(os.getenv("CLEANUP_MAX_CHUNKS", 100))
+    STATISTICS_GZIP_ENABLED: bool = os.getenv("STATISTICS_GZIP_ENABLED", "true").lower() == "true"
+    CACHE_COMPRESSION: str = os.getenv("CACHE_COMPRESSION", "zstd")
+    CACHE_COMPRESSION_MIN_SIZE: int = int(os.getenv("CACHE_COMPRESSION_MIN_SIZE", 1024))
+    REDIRECT_CACHE_LAYOUT: str = os.getenv("REDIRECT_CACHE_LAYOUT", "hash")
+    REDIRECT_CACHE_TTL: int = int(os.getenv("REDIRECT_CACHE_TTL", 60 * 60))
+    REDIRECT_CACHE_MIN_TTL: int = int(os.getenv("REDIRECT_CACHE_MIN_TTL", 60))
+    REDIRECT_CACHE_TTL_PER_CLICK: float = float(os.getenv("REDIRECT_CACHE_TTL_PER_CLICK", 30))
+    REDIRECT_CACHE_BUCKETS: int = int(os.getenv("REDIRECT_CACHE_BUCKETS", 65536))
+    REDIRECT_CACHE_FIELD_EXPIRY: bool = os.getenv("REDIRECT_CACHE_FIELD_EXPIRY", "false").lower() == "true"
+    HOT_LINKS_SIZE: int = int(os.getenv("HOT_LINKS_SIZE", 10000))
+    HOT_LINKS_HALF_LIFE: float = float(os.getenv("HOT_LINKS_HALF_LIFE", 600))
+    SINGLE_FLIGHT_LOCK_TTL: float = float(os.getenv("SINGLE_FLIGHT_LOCK_TTL", 5))
+    SINGLE_FLIGHT_WAIT: float = float(os.getenv("SINGLE_FLIGHT_WAIT", 2))
+    SINGLE_FLIGHT_POLL_INTERVAL: float = float(os.getenv("SINGLE_FLIGHT_POLL_INTERVAL", 0.05))
+    XFETCH_BETA: float = float(os.getenv("XFETCH_BETA", 1))
+    STATS_CACHE_MAX_STALE: int = int(os.getenv("STATS_CACHE_MAX_STALE", 10))
+    SEARCH_CACHE_MAX_STALE: int = int(os.getenv("SEARCH_CACHE_MAX_STALE", 30))
+    LINKS_PAGE_CACHE_MAX_STALE: int = int(os.getenv("LINKS_PAGE_CACHE_MAX_STALE", 120))
+    WARMUP_LINKS: int = int(os.getenv("WARMUP_LINKS", 10000))
+    WARMUP_CHUNK_SIZE: int = int(os.getenv("WARMUP_CHUNK_SIZE", 1000))
+    WARMUP_TIME_BUDGET: float = float(os.getenv("WARMUP_TIME_BUDGET", 5))
+    WARMUP_LOCK_TTL: int = int(os.getenv("WARMUP_LOCK_TTL", 60))
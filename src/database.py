@@ -1,5 +1,6 @@
 from typing import AsyncGenerator
 
+from fastapi import Depends
 from sqlalchemy import create_engine
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine, AsyncAttrs
 from sqlalchemy.orm import declarative_base, DeclarativeBase, sessionmaker
@@ -26,6 +27,42 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+
+class LazyAsyncSession:
+    # сессия (и соединение из пула) создается только при первом обращении,
+    # чтобы запросы, которые обслуживаются из кэша, вообще не трогали БД
+    def __init__(self, session_maker: async_sessionmaker):
+        self.session_maker = session_maker
+        self._session = None
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._session is not None
+
+    def __getattr__(self, name):
+        if self._session is None:
+            self._session = self.session_maker()
+        return getattr(self._session, name)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+def get_async_session_maker() -> async_sessionmaker:
+    return async_session_maker
+
+
+async def get_lazy_async_session(
+    session_maker: async_sessionmaker = Depends(get_async_session_maker)
+) -> AsyncGenerator[LazyAsyncSession, None]:
+    session = LazyAsyncSession(session_maker)
+    try:
+        yield session
+    finally:
+        await session.close()
+
 # async def create_db_and_tables():
 #     async with engine.begin() as conn:
 #         await conn.run_sync(Base.metadata.create_all)
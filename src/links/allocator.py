@@ -0,0 +1,147 @@
+import hashlib
+import hmac
+import string
+from abc import ABC, abstractmethod
+from collections import deque
+
+from fastapi_cache import FastAPICache
+from sqlalchemy import func, select, text
+
+from src.config import Settings
+from src.database import AsyncSession
+from src.links.models import short_code_seq
+
+settings = Settings()
+
+BASE62_ALPHABET = string.digits + string.ascii_lowercase + string.ascii_uppercase
+
+
+def base62_encode(number: int, length: int) -> str:
+    chars = []
+    while number:
+        number, remainder = divmod(number, 62)
+        chars.append(BASE62_ALPHABET[remainder])
+    return "".join(reversed(chars)).rjust(length, BASE62_ALPHABET[0])
+
+
+class FeistelPermutation:
+    # ключевая биекция на [0, domain): последовательные номера превращаются
+    # в коды, по которым нельзя угадать соседние
+    def __init__(self, domain: int, key: bytes, rounds: int = 4):
+        self.domain = domain
+        self.key = key
+        self.rounds = rounds
+        bits = max(2, (domain - 1).bit_length())
+        self.half_bits = (bits + 1) // 2
+        self.half_mask = (1 << self.half_bits) - 1
+
+    def _round(self, value: int, round_number: int) -> int:
+        message = round_number.to_bytes(1, "big") + value.to_bytes(8, "big")
+        digest = hmac.new(self.key, message, hashlib.sha256).digest()
+        return int.from_bytes(digest[:8], "big") & self.half_mask
+
+    def _encrypt(self, value: int) -> int:
+        left, right = value >> self.half_bits, value & self.half_mask
+        for round_number in range(self.rounds):
+            left, right = right, left ^ self._round(right, round_number)
+        return (left << self.half_bits) | right
+
+    def permute(self, value: int) -> int:
+        if not 0 <= value < self.domain:
+            raise ValueError("Value is out of permutation domain")
+        # cycle walking: повторяем, пока не попадем обратно в домен
+        value = self._encrypt(value)
+        while value >= self.domain:
+            value = self._encrypt(value)
+        return value
+
+
+class ShortCodeAllocator(ABC):
+    @abstractmethod
+    async def allocate(self, session: AsyncSession, long_url: str, attempt: int = 0) -> str:
+        ...
+
+
+class HashAllocator(ShortCodeAllocator):
+    def __init__(self, length: int, secret: str):
+        self.length = length
+        self.secret = secret
+
+    async def allocate(self, session: AsyncSession, long_url: str, attempt: int = 0) -> str:
+        # старая схема: первые N символов sha1, при коллизии хэшируем повторно
+        short_code = hashlib.sha1(long_url.encode()).hexdigest()[:self.length]
+        for _ in range(attempt):
+            short_code = hashlib.sha1((short_code + self.secret).encode()).hexdigest()[:self.length]
+        return short_code
+
+
+class CounterAllocator(ShortCodeAllocator):
+    def __init__(self, length: int, secret: str, block_size: int):
+        self.length = length
+        self.block_size = block_size
+        self.permutation = FeistelPermutation(62 ** length, secret.encode())
+        self._numbers: deque[int] = deque()
+
+    @abstractmethod
+    async def _lease(self, session: AsyncSession) -> list[int]:
+        ...
+
+    async def allocate(self, session: AsyncSession, long_url: str, attempt: int = 0) -> str:
+        if not self._numbers:
+            self._numbers.extend(await self._lease(session))
+        number = self._numbers.popleft()
+        if number >= self.permutation.domain:
+            raise ValueError("Short code space is exhausted")
+        return base62_encode(self.permutation.permute(number), self.length)
+
+
+class RedisCounterAllocator(CounterAllocator):
+    # redis здесь кэш: после очистки или перезапуска без persistence счетчик начался бы с нуля
+    # и все новые коды совпали бы с выданными. Поэтому верхняя граница выданных номеров хранится
+    # в последовательности short_code_seq (setval не откатывается вместе с транзакцией),
+    # и пропавший ключ заново заводится от нее
+    counter_key = "links:short_code_counter"
+    # запас при восстановлении: одновременные аренды могли оставить в БД границу чуть ниже выданной
+    seed_margin_blocks = 100
+
+    async def _lease(self, session: AsyncSession) -> list[int]:
+        redis = FastAPICache.get_backend().redis
+        if not await redis.exists(self.counter_key):
+            seed = await self._high_water_mark(session) + self.seed_margin_blocks * self.block_size
+            await redis.set(self.counter_key, seed, nx=True)
+        end = await redis.incrby(self.counter_key, self.block_size)
+        await session.execute(
+            text("SELECT setval('short_code_seq', greatest(:end, last_value)) FROM short_code_seq"),
+            {"end": end}
+        )
+        return list(range(end - self.block_size, end))
+
+    async def _high_water_mark(self, session: AsyncSession) -> int:
+        # первый еще не выданный номер
+        result = await session.execute(
+            text("SELECT CASE WHEN is_called THEN last_value + 1 ELSE last_value END FROM short_code_seq")
+        )
+        return result.scalar_one()
+
+
+class SequenceCounterAllocator(CounterAllocator):
+    async def _lease(self, session: AsyncSession) -> list[int]:
+        result = await session.execute(
+            select(short_code_seq.next_value()).select_from(func.generate_series(1, self.block_size))
+        )
+        return list(result.scalars().all())
+
+
+def get_short_code_allocator() -> ShortCodeAllocator:
+    length = settings.SHORT_CODE_LENGTH
+    secret = settings.CODE_GENERATION_SECRET
+    if settings.SHORT_CODE_ALLOCATOR == "hash":
+        return HashAllocator(length, secret)
+    if settings.SHORT_CODE_ALLOCATOR == "redis-counter":
+        return RedisCounterAllocator(length, secret, settings.SHORT_CODE_BLOCK_SIZE)
+    if settings.SHORT_CODE_ALLOCATOR == "sequence-counter":
+        return SequenceCounterAllocator(length, secret, settings.SHORT_CODE_BLOCK_SIZE)
+    raise ValueError(f"Unknown short code allocator '{settings.SHORT_CODE_ALLOCATOR}'")
+
+
+short_code_allocator = get_short_code_allocator()
@@ -0,0 +1,124 @@
+import hashlib
+import math
+from typing import Iterable
+
+from fastapi_cache import FastAPICache
+
+from src.config import Settings
+
+settings = Settings()
+
+MISSING_KEY_PREFIX = "links:missing:"
+
+
+class BloomFilter:
+    def __init__(self, key: str, capacity: int, error_rate: float):
+        self.key = key
+        self.count_key = f"{key}:count"
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+
+    def offsets(self, item: str) -> list[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def estimated_error_rate(self, count: int) -> float:
+        return (1 - math.exp(-self.hashes * count / self.size)) ** self.hashes
+
+    async def add(self, redis, *items: str) -> None:
+        async with redis.pipeline(transaction=False) as pipe:
+            for item in items:
+                for offset in self.offsets(item):
+                    pipe.setbit(self.key, offset, 1)
+            pipe.incrby(self.count_key, len(items))
+            await pipe.execute()
+
+    def build(self, items: Iterable[str]) -> tuple[bytes, int]:
+        # порядок бит как у SETBIT в redis: нулевой бит - старший бит первого байта
+        bits = bytearray((self.size + 7) // 8)
+        count = 0
+        for item in items:
+            for offset in self.offsets(item):
+                bits[offset >> 3] |= 0x80 >> (offset & 7)
+            count += 1
+        return bytes(bits), count
+
+    def rebuild(self, redis, items: Iterable[str]) -> int:
+        bits, count = self.build(items)
+        tmp_key = f"{self.key}:rebuild"
+        redis.set(tmp_key, bits)
+        pipe = redis.pipeline()
+        pipe.rename(tmp_key, self.key)
+        pipe.set(self.count_key, count)
+        pipe.execute()
+        return count
+
+    def add_sync(self, redis, items: Iterable[str]) -> None:
+        pipe = redis.pipeline(transaction=False)
+        count = 0
+        for item in items:
+            for offset in self.offsets(item):
+                pipe.setbit(self.key, offset, 1)
+            count += 1
+        pipe.incrby(self.count_key, count)
+        pipe.execute()
+
+    async def stats(self, redis) -> dict:
+        count = await redis.get(self.count_key)
+        count = int(count or 0)
+        return {
+            "capacity": self.capacity,
+            "size_bits": self.size,
+            "hashes": self.hashes,
+            "items": count,
+            "configured_error_rate": self.error_rate,
+            "estimated_error_rate": self.estimated_error_rate(count),
+        }
+
+
+short_code_filter = BloomFilter(
+    key="links:bloom",
+    capacity=settings.SHORT_CODE_FILTER_CAPACITY,
+    error_rate=settings.SHORT_CODE_FILTER_ERROR_RATE,
+)
+
+
+async def short_code_may_exist(short_code: str) -> bool:
+    if not settings.SHORT_CODE_FILTER_ENABLED:
+        return True
+
+    redis = FastAPICache.get_backend().redis
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.exists(MISSING_KEY_PREFIX + short_code)
+        pipe.exists(short_code_filter.key)
+        for offset in short_code_filter.offsets(short_code):
+            pipe.getbit(short_code_filter.key, offset)
+        is_missing, filter_exists, *bits = await pipe.execute()
+
+    if is_missing:
+        return False
+    # пока фильтр ни разу не построен, ему нельзя доверять
+    return not filter_exists or all(bits)
+
+
+async def remember_missing_short_code(short_code: str) -> None:
+    if not settings.SHORT_CODE_FILTER_ENABLED:
+        return
+    redis = FastAPICache.get_backend().redis
+    await redis.set(MISSING_KEY_PREFIX + short_code, 1, ex=settings.NEGATIVE_CACHE_TTL)
+
+
+async def register_short_code(short_code: str) -> None:
+    await register_short_codes([short_code])
+
+
+async def register_short_codes(short_codes: list[str]) -> None:
+    if not settings.SHORT_CODE_FILTER_ENABLED or not short_codes:
+        return
+    redis = FastAPICache.get_backend().redis
+    await redis.delete(*[MISSING_KEY_PREFIX + short_code for short_code in short_codes])
+    await short_code_filter.add(redis, *short_codes)
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import math
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from src.config import Settings
+from src.links.counters import HOT_LINKS_KEY
+from src.links.expiry import utc_timestamp
+from src.links.generations import GENERATION_KEY_PREFIX, get_generation, link_namespace
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+INVALIDATION_CHANNEL = "links:invalidate"
+
+# L2-кэш редиректов в redis: коды разложены по небольшим hash-бакетам "r:<номер>",
+# которые redis хранит компактно (listpack) вместо отдельного ключа на каждую ссылку
+REDIRECT_BUCKET_PREFIX = "r:"
+# ключи прежней раскладки: строка на ссылку, как у get_link_cache_key_builder для redirect_link
+LEGACY_REDIRECT_KEY_PREFIX = "src.links.router:redirect_link"
+
+
+class LocalCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[str, float]] = OrderedDict()
+        # номер последней инвалидации и когда сбрасывался каждый ключ (не больше maxsize последних;
+        # для забытых ключей берется _forgotten_version - так запись только пропустится лишний раз)
+        self._version = 0
+        self._invalidated: OrderedDict[str, int] = OrderedDict()
+        self._forgotten_version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self) -> int:
+        # берется до чтения из redis/БД и передается в set: если ключ за это время сбросили
+        # (pub/sub пришел, пока шел await), прочитанное значение уже устарело и не записывается
+        return self._version
+
+    def get(self, key: str) -> Optional[str]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, expires_at = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: str, ttl: Optional[int] = None, version: Optional[int] = None) -> None:
+        if self.maxsize <= 0:
+            return
+        if version is not None and self._invalidated.get(key, self._forgotten_version) > version:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: str) -> None:
+        self._data.pop(key, None)
+        self._version += 1
+        self._invalidated[key] = self._version
+        self._invalidated.move_to_end(key)
+        while len(self._invalidated) > max(self.maxsize, 1):
+            _, self._forgotten_version = self._invalidated.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._version += 1
+        self._invalidated.clear()
+        self._forgotten_version = self._version
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# L1-кэш short_code -> long_url в памяти воркера, стоит перед redis
+redirect_cache = LocalCache(maxsize=settings.L1_CACHE_SIZE, ttl=settings.L1_CACHE_TTL)
+
+
+def redirect_bucket_key(short_code: str) -> str:
+    return f"{REDIRECT_BUCKET_PREFIX}{zlib.crc32(short_code.encode()) % settings.REDIRECT_CACHE_BUCKETS:x}"
+
+
+async def legacy_redirect_key(redis, short_code: str) -> str:
+    generation = await get_generation(redis, link_namespace(short_code))
+    return f"{LEGACY_REDIRECT_KEY_PREFIX}:{generation}:{short_code}"
+
+
+def encode_redirect(long_url: str, valid_until: int) -> str:
+    # "<unix-время, до которого запись действительна>|<url>", срок проверяет скрипт перехода,
+    # см. src/links/redirects.py; записи прежнего формата - "<expires_at или пусто>|<url>" или просто url
+    return f"{valid_until}|{long_url}"
+
+
+def decode_redirect(value: str) -> tuple[str, Optional[int]]:
+    # url и сколько секунд запись еще действительна (None - срок не записан)
+    valid_until, separator, long_url = value.partition("|")
+    if not separator or not (valid_until == "" or valid_until.isdigit()):
+        return value, None
+    if not valid_until:
+        return long_url, None
+    return long_url, int(valid_until) - int(time.time())
+
+
+def redirect_cache_ttl(expires_at: Optional[datetime], clicks: float = 0) -> int:
+    # популярные ссылки живут в кэше дольше: clicks - затухающий счет переходов из рейтинга
+    # links:hot (примерно переходы за последние HOT_LINKS_HALF_LIFE / ln 2 секунд);
+    # TTL в пределах REDIRECT_CACHE_MIN_TTL..REDIRECT_CACHE_TTL, но не дольше жизни самой ссылки
+    ttl = settings.REDIRECT_CACHE_MIN_TTL + int(clicks * settings.REDIRECT_CACHE_TTL_PER_CLICK)
+    ttl = max(settings.REDIRECT_CACHE_MIN_TTL, min(ttl, settings.REDIRECT_CACHE_TTL))
+    if expires_at is not None:
+        ttl = min(ttl, math.ceil((expires_at - datetime.utcnow()).total_seconds()))
+    return ttl
+
+
+def redirect_valid_until(expires_at: Optional[datetime], ttl: int) -> int:
+    valid_until = int(time.time()) + ttl
+    if expires_at is not None:
+        valid_until = min(valid_until, utc_timestamp(expires_at))
+    return valid_until
+
+
+async def cache_redirect(redis, short_code: str, long_url: str, expires_at: Optional[datetime] = None) -> int:
+    # возвращает TTL записи (0 - ссылка уже истекла, запись не сделана)
+    ttl = redirect_cache_ttl(expires_at, float(await redis.zscore(HOT_LINKS_KEY, short_code) or 0))
+    if ttl <= 0:
+        return 0
+
+    value = encode_redirect(long_url, redirect_valid_until(expires_at, ttl))
+    if settings.REDIRECT_CACHE_LAYOUT == "keys":
+        await redis.set(await legacy_redirect_key(redis, short_code), value, ex=ttl)
+        return ttl
+
+    async with redis.pipeline(transaction=False) as pipe:
+        _queue_bucket_write(pipe, short_code, value, ttl)
+        await pipe.execute()
+    return ttl
+
+
+async def cache_redirects(redis, links: Iterable[tuple[str, str, Optional[datetime]]]) -> dict[str, int]:
+    # пачка (short_code, long_url, expires_at) для прогрева кэша: один pipeline на чтение
+    # рейтинга (и поколений для раскладки keys) и один на запись; возвращает TTL записанных кодов
+    links = list(links)
+    if not links:
+        return {}
+
+    keys_layout = settings.REDIRECT_CACHE_LAYOUT == "keys"
+    async with redis.pipeline(transaction=False) as pipe:
+        for short_code, _, _ in links:
+            pipe.zscore(HOT_LINKS_KEY, short_code)
+            if keys_layout:
+                pipe.get(GENERATION_KEY_PREFIX + link_namespace(short_code))
+        replies = await pipe.execute()
+    step = 2 if keys_layout else 1
+
+    written = {}
+    async with redis.pipeline(transaction=False) as pipe:
+        for i, (short_code, long_url, expires_at) in enumerate(links):
+            ttl = redirect_cache_ttl(expires_at, float(replies[i * step] or 0))
+            if ttl <= 0:
+                continue
+            value = encode_redirect(long_url, redirect_valid_until(expires_at, ttl))
+            if keys_layout:
+                generation = int(replies[i * step + 1] or 0)
+                pipe.set(f"{LEGACY_REDIRECT_KEY_PREFIX}:{generation}:{short_code}", value, ex=ttl)
+            else:
+                _queue_bucket_write(pipe, short_code, value, ttl)
+            written[short_code] = ttl
+        if written:
+            await pipe.execute()
+    return written
+
+
+def _queue_bucket_write(pipe, short_code: str, value: str, ttl: int) -> None:
+    key = redirect_bucket_key(short_code)
+    pipe.hset(key, short_code, value)
+    if settings.REDIRECT_CACHE_FIELD_EXPIRY:
+        # TTL отдельного поля, redis >= 7.4
+        pipe.execute_command("HEXPIRE", key, ttl, "FIELDS", 1, short_code)
+    else:
+        # TTL бакета ставится только при его создании, поэтому ни одна запись
+        # не живет дольше REDIRECT_CACHE_TTL, даже если в бакет постоянно пишут;
+        # записи с меньшим TTL при чтении отсекает скрипт перехода, а память под ними
+        # освобождается вместе с бакетом
+        pipe.expire(key, settings.REDIRECT_CACHE_TTL, nx=True)
+
+
+def queue_invalidation(pipe, short_code: str) -> None:
+    # локально сбрасываем сразу, остальным воркерам - через pub/sub вместе с остальными командами pipeline;
+    # ключ прежней раскладки сбрасывается поколением ссылки
+    redirect_cache.pop(short_code)
+    pipe.hdel(redirect_bucket_key(short_code), short_code)
+    pipe.publish(INVALIDATION_CHANNEL, short_code)
+
+
+async def listen_for_invalidations(redis) -> None:
+    while True:
+        try:
+            pubsub = redis.pubsub()
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # пока не были подписаны, могли пропустить сообщения,
+            # поэтому после (пере)подключения сбрасываем весь L1-кэш
+            redirect_cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                data = message["data"]
+                redirect_cache.pop(data.decode("utf-8") if isinstance(data, bytes) else data)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Invalidation listener failed, reconnecting")
+            await asyncio.sleep(1)
@@ -0,0 +1,90 @@
+import logging
+import zlib
+from typing import Any, Optional
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from fastapi_cache.coder import Coder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+from src.config import Settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+# Сжатая запись начинается с байта-метки алгоритма. JSON с таких байтов не начинается,
+# поэтому несжатые записи (в том числе записанные прежним JsonCoder) читаются как есть.
+ZLIB_MARKER = b"\x01"
+ZSTD_MARKER = b"\x02"
+LZ4_MARKER = b"\x03"
+
+
+def _available_codecs() -> dict:
+    codecs = {"zlib": (ZLIB_MARKER, zlib.compress, zlib.decompress)}
+    if zstandard is not None:
+        codecs["zstd"] = (ZSTD_MARKER, zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress)
+    if lz4_frame is not None:
+        codecs["lz4"] = (LZ4_MARKER, lz4_frame.compress, lz4_frame.decompress)
+    return codecs
+
+
+CODECS = _available_codecs()
+DECOMPRESSORS = {marker: decompress for marker, _, decompress in CODECS.values()}
+
+
+def resolve_compression(name: str) -> Optional[str]:
+    if name == "none":
+        return None
+    if name not in CODECS:
+        # zstandard есть в requirements.txt, но в окружении без него (и без необязательного lz4) работаем на zlib
+        logger.warning("cache compression %s is not available, falling back to zlib", name)
+        return "zlib"
+    return name
+
+
+def _default(value: Any) -> Any:
+    # model_dump в python-режиме быстрее jsonable_encoder: datetime и прочее orjson сериализует сам
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    return jsonable_encoder(value)
+
+
+class OrjsonCoder(Coder):
+    compression: Optional[str] = resolve_compression(settings.CACHE_COMPRESSION)
+    min_size: int = settings.CACHE_COMPRESSION_MIN_SIZE
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, JSONResponse):
+            data = value.body
+        else:
+            data = orjson.dumps(value, default=_default)
+        if cls.compression is None or len(data) < cls.min_size:
+            return data
+        marker, compress, _ = CODECS[cls.compression]
+        return marker + compress(data)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        decompress = DECOMPRESSORS.get(value[:1])
+        if decompress is not None:
+            value = decompress(value[1:])
+        return orjson.loads(value)
+
+    @classmethod
+    def decode_as_type(cls, value: bytes, *, type_: Any) -> Any:
+        # ответ при отдаче все равно проверяется по response_model эндпоинта,
+        # повторная валидация через pydantic на каждом попадании не нужна
+        return cls.decode(value)
@@ -0,0 +1,202 @@
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from redis.exceptions import ResponseError
+from sqlalchemy import Integer, SmallInteger, String, DateTime, case, column, delete, func, select, tuple_, update, \
+    values
+from sqlalchemy.dialects import postgresql
+
+from src.links.models import AppliedClickFlush, Link, LinkClickCounter
+
+# отложенные переходы: поле c:<code> - сколько раз перешли, t:<code> - когда последний раз
+PENDING_CLICKS_KEY = "links:clicks:pending"
+PROCESSING_CLICKS_KEY = "links:clicks:processing"
+# id пачки в processing, см. processing_flush_id
+PROCESSING_FLUSH_ID_KEY = "links:clicks:processing:id"
+# сбрасывает переходы один воркер за раз
+FLUSH_LOCK_KEY = "links:clicks:flush"
+# id примененных пачек нужны, только пока пачка может оставаться в processing
+APPLIED_FLUSH_RETENTION = timedelta(days=1)
+# рейтинг популярных ссылок: sorted set код -> затухающее число переходов, см. decay_hot_links
+HOT_LINKS_KEY = "links:hot"
+
+
+async def get_pending_clicks(redis, short_code: str) -> tuple[int, Optional[datetime]]:
+    async with redis.pipeline(transaction=False) as pipe:
+        for key in (PENDING_CLICKS_KEY, PROCESSING_CLICKS_KEY):
+            pipe.hmget(key, f"c:{short_code}", f"t:{short_code}")
+        result = await pipe.execute()
+
+    clicks, last_used = 0, None
+    for counter, timestamp in result:
+        clicks += int(counter or 0)
+        if timestamp is not None:
+            used_at = datetime.utcfromtimestamp(int(timestamp))
+            last_used = max(last_used, used_at) if last_used else used_at
+    return clicks, last_used
+
+
+def take_pending_clicks(redis) -> dict[str, tuple[int, Optional[datetime]]]:
+    # если прошлый сброс упал, сначала доделываем его, иначе атомарно
+    # забираем накопленное, новые переходы пойдут в свежий hash
+    if not redis.exists(PROCESSING_CLICKS_KEY):
+        try:
+            redis.rename(PENDING_CLICKS_KEY, PROCESSING_CLICKS_KEY)
+        except ResponseError:
+            return {}
+
+    pending = {}
+    for field, value in redis.hgetall(PROCESSING_CLICKS_KEY).items():
+        field = field.decode("utf-8") if isinstance(field, bytes) else field
+        kind, short_code = field.split(":", 1)
+        clicks, last_used = pending.get(short_code, (0, None))
+        if kind == "c":
+            clicks = int(value)
+        else:
+            last_used = datetime.utcfromtimestamp(int(value))
+        pending[short_code] = (clicks, last_used)
+    return pending
+
+
+def processing_flush_id(redis) -> str:
+    # id выдается пачке один раз и живет, пока она в processing: повторный сброс после падения
+    # или повторной доставки задачи получит тот же id и увидит, что пачка уже в БД
+    redis.set(PROCESSING_FLUSH_ID_KEY, uuid.uuid4().hex, nx=True)
+    flush_id = redis.get(PROCESSING_FLUSH_ID_KEY)
+    return flush_id.decode("utf-8") if isinstance(flush_id, bytes) else flush_id
+
+
+def release_pending_clicks(redis) -> None:
+    redis.delete(PROCESSING_CLICKS_KEY, PROCESSING_FLUSH_ID_KEY)
+
+
+def build_claim_flush_statement(flush_id: str, now: datetime):
+    # ничего не возвращает, если пачка уже применена; параллельная транзакция с тем же id
+    # ждет на первичном ключе и после ее коммита тоже получает конфликт
+    return (
+        postgresql.insert(AppliedClickFlush)
+        .values(flush_id=flush_id, applied_at=now)
+        .on_conflict_do_nothing(index_elements=[AppliedClickFlush.flush_id])
+        .returning(AppliedClickFlush.flush_id)
+    )
+
+
+def build_forget_flushes_statement(before: datetime):
+    return delete(AppliedClickFlush).where(AppliedClickFlush.applied_at < before)
+
+
+def trim_hot_links(redis, size: int) -> None:
+    redis.zremrangebyrank(HOT_LINKS_KEY, 0, -size - 1)
+
+
+def decay_hot_links(redis, factor: float) -> None:
+    # экспоненциальное затухание: счет ссылки - это недавние переходы, а не все с момента появления
+    redis.zunionstore(HOT_LINKS_KEY, {HOT_LINKS_KEY: factor})
+
+
+def _pending_values(batch: list[tuple[str, int, Optional[datetime]]]):
+    return values(
+        column("short_code", String),
+        column("clicks", Integer),
+        column("last_used", DateTime),
+        name="pending",
+    ).data(batch)
+
+
+def _last_used_values(pending, ttl: timedelta) -> dict:
+    return {
+        "last_used_at": func.greatest(
+            func.coalesce(Link.last_used_at, pending.c.last_used),
+            pending.c.last_used
+        ),
+        # переход продлевает жизнь ссылки без срока истечения, см. src/links/expiry.py
+        "delete_after": case(
+            (
+                Link.expires_at.is_(None) & pending.c.last_used.isnot(None),
+                func.greatest(Link.delete_after, pending.c.last_used + ttl)
+            ),
+            else_=Link.delete_after
+        ),
+    }
+
+
+def build_flush_statement(batch: list[tuple[str, int, Optional[datetime]]], ttl: timedelta):
+    pending = _pending_values(batch)
+
+    return (
+        update(Link)
+        .where(Link.short_code == pending.c.short_code)
+        .values(
+            redirect_counter=Link.redirect_counter + pending.c.clicks,
+            **_last_used_values(pending, ttl)
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def build_sharded_flush_statements(batch: list[tuple[str, int, Optional[datetime]]], ttl: timedelta, shards: int):
+    # переходы - в случайные шарды link_click_counters, строка links обновляется,
+    # только если сдвинулось время последнего перехода (оно округлено до минуты),
+    # то есть не чаще раза в минуту на ссылку; только PostgreSQL
+    statements = []
+    pending = values(
+        column("short_code", String),
+        column("shard", SmallInteger),
+        column("clicks", Integer),
+        name="pending",
+    ).data([(short_code, random.randrange(shards), clicks) for short_code, clicks, _ in batch])
+    insert = postgresql.insert(LinkClickCounter).from_select(
+        ["link_id", "shard", "clicks"],
+        select(Link.id, pending.c.shard, pending.c.clicks).join(pending, Link.short_code == pending.c.short_code)
+    )
+    statements.append(insert.on_conflict_do_update(
+        index_elements=[LinkClickCounter.link_id, LinkClickCounter.shard],
+        set_={"clicks": LinkClickCounter.clicks + insert.excluded.clicks}
+    ))
+
+    used_batch = [row for row in batch if row[2] is not None]
+    if used_batch:
+        used = _pending_values(used_batch)
+        statements.append(
+            update(Link)
+            .where(
+                (Link.short_code == used.c.short_code)
+                & (Link.last_used_at.is_(None) | (Link.last_used_at < used.c.last_used))
+            )
+            # переход не меняет саму ссылку, updated_at остается прежним
+            .values(updated_at=Link.updated_at, **_last_used_values(used, ttl))
+            .execution_options(synchronize_session=False)
+        )
+    return statements
+
+
+def total_redirect_counter():
+    # links.redirect_counter плюс шарды, еще не перенесенные в него compact_click_counters_task
+    sharded = select(
+        func.coalesce(func.sum(LinkClickCounter.clicks), 0)
+    ).where(LinkClickCounter.link_id == Link.id).scalar_subquery()
+    return (Link.redirect_counter + sharded).label("redirect_counter")
+
+
+def build_compact_chunk_statement(chunk_size: int):
+    # одна транзакция: шарды удаляются и их сумма добавляется в links.redirect_counter,
+    # поэтому читатели видят либо шарды, либо уже перенесенные переходы; строки шардов,
+    # которые сейчас увеличивает другая транзакция, пропускаются до следующего раза
+    chunk = select(LinkClickCounter.link_id, LinkClickCounter.shard).limit(chunk_size).with_for_update(skip_locked=True)
+    moved = (
+        delete(LinkClickCounter)
+        .where(tuple_(LinkClickCounter.link_id, LinkClickCounter.shard).in_(chunk))
+        .returning(LinkClickCounter.link_id, LinkClickCounter.clicks)
+        .cte("moved")
+    )
+    totals = select(
+        moved.c.link_id, func.sum(moved.c.clicks).label("clicks")
+    ).group_by(moved.c.link_id).subquery("totals")
+    return (
+        update(Link)
+        .where(Link.id == totals.c.link_id)
+        .values(redirect_counter=Link.redirect_counter + totals.c.clicks, updated_at=Link.updated_at)
+        .execution_options(synchronize_session=False)
+    )
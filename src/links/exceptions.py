@@ -53,3 +53,11 @@ class AliasLengthError(APIError):
             status_code=status.HTTP_409_CONFLICT,
             detail=f"Alias length must be between 4 and 16 symbols"
         )
+
+
+class BatchFormatError(APIError):
+    def __init__(self, detail: str):
+        super().__init__(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=detail
+        )
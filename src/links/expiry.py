@@ -0,0 +1,30 @@
+import calendar
+from datetime import datetime, timedelta
+from typing import Optional
+
+from src.config import Settings
+
+
+def utcnow_minute() -> datetime:
+    return datetime.utcnow().replace(second=0, microsecond=0)
+
+
+def utc_timestamp(value: datetime) -> int:
+    # datetime в БД наивные в UTC, .timestamp() посчитал бы их в локальной зоне
+    return calendar.timegm(value.utctimetuple())
+
+
+def link_ttl() -> timedelta:
+    return timedelta(days=Settings().LINK_TTL_IN_DAYS)
+
+
+def compute_delete_after(expires_at: Optional[datetime], last_activity_at: datetime) -> datetime:
+    # момент, после которого ссылку удалит clear_outdated_links_task: срок истечения,
+    # а если его нет - LINK_TTL_IN_DAYS с последнего создания/обновления/перехода
+    if expires_at is not None:
+        return expires_at
+    return last_activity_at + link_ttl()
+
+
+def default_delete_after(context) -> datetime:
+    return compute_delete_after(context.get_current_parameters().get("expires_at"), utcnow_minute())
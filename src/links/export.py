@@ -0,0 +1,47 @@
+import csv
+import zlib
+from io import StringIO
+from typing import AsyncIterator, Iterable
+
+STATISTICS_HEADER = [
+    "Short URL", "Original URL", "Created At",
+    "Expires At", "Redirects", "Last Used"
+]
+
+GZIP_LEVEL = 6
+
+
+def _format_datetime(value, default: str) -> str:
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else default
+
+
+async def iter_statistics_csv(link_chunks: AsyncIterator[Iterable], base_url: str) -> AsyncIterator[str]:
+    # заголовок отдается сразу, еще до выполнения запроса, дальше по куску CSV на пачку строк курсора
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(STATISTICS_HEADER)
+    yield buffer.getvalue()
+
+    async for links in link_chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        for link in links:
+            writer.writerow([
+                f"{base_url}/links/{link.short_code}",
+                link.long_url,
+                _format_datetime(link.created_at, ""),
+                _format_datetime(link.expires_at, "N/A"),
+                link.redirect_counter,
+                _format_datetime(link.last_used_at, "Never")
+            ])
+        yield buffer.getvalue()
+
+
+async def gzip_chunks(chunks: AsyncIterator[str]) -> AsyncIterator[bytes]:
+    # wbits=31 - формат gzip; каждый кусок сбрасывается клиенту сразу (Z_SYNC_FLUSH)
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk.encode()) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,40 @@
+from typing import Iterable
+
+from src.links.urls import normalize_url, long_url_digest
+
+# Версионированные пространства имен кэша: номер поколения входит в ключ,
+# поэтому для инвалидации достаточно INCR счетчика - старые записи больше
+# никто не прочитает, и они сами истекут по своему TTL.
+GENERATION_KEY_PREFIX = "links:gen:"
+# счетчик живет дольше любой записи кэша, поэтому после его истечения
+# (поколение снова 0) записей со старым номером уже нет
+GENERATION_TTL = 24 * 60 * 60
+
+ALL_LINKS_NAMESPACE = "all"
+
+
+def link_namespace(short_code: str) -> str:
+    return f"link:{short_code}"
+
+
+def url_namespace(url: str) -> str:
+    # без схемы: поиск "test.com" может вернуть и http://, и https:// ссылку
+    return f"url:{long_url_digest(normalize_url(url).split('://', 1)[-1])}"
+
+
+def link_namespaces(short_codes: Iterable[str] = (), urls: Iterable[str] = ()) -> list[str]:
+    # изменение любой ссылки меняет и общий список /links/all
+    namespaces = [link_namespace(short_code) for short_code in short_codes if short_code]
+    namespaces += [url_namespace(url) for url in urls if url]
+    namespaces.append(ALL_LINKS_NAMESPACE)
+    return list(dict.fromkeys(namespaces))
+
+
+async def get_generation(redis, namespace: str) -> int:
+    return int(await redis.get(GENERATION_KEY_PREFIX + namespace) or 0)
+
+
+def queue_generation_bumps(pipe, namespaces: Iterable[str]) -> None:
+    for namespace in namespaces:
+        pipe.incr(GENERATION_KEY_PREFIX + namespace)
+        pipe.expire(GENERATION_KEY_PREFIX + namespace, GENERATION_TTL)
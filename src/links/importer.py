@@ -0,0 +1,245 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.redis import RedisBackend
+from pydantic import ValidationError
+from redis import asyncio as aioredis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.config import Settings
+from src.links.allocator import short_code_allocator
+from src.links.bloom import register_short_codes
+from src.links.expiry import compute_delete_after, utcnow_minute
+from src.links.schemes import CreateLinkRequest, ImportLinksResponse
+from src.links.urls import long_url_digest
+from src.links.utils import invalidate_links
+
+logger = logging.getLogger(__name__)
+
+# статус фоновых импортов из /admin/import-links
+IMPORT_JOB_KEY_PREFIX = "links:import:"
+
+IMPORT_COLUMNS = ["short_code", "long_url", "long_url_digest", "expires_at", "delete_after"]
+
+CREATE_STAGING_TABLE = text("""
+    CREATE TEMP TABLE IF NOT EXISTS links_import (
+        short_code VARCHAR NOT NULL,
+        long_url VARCHAR NOT NULL,
+        long_url_digest VARCHAR(64) NOT NULL,
+        expires_at TIMESTAMP WITHOUT TIME ZONE,
+        delete_after TIMESTAMP WITHOUT TIME ZONE NOT NULL
+    )
+""")
+
+TRUNCATE_STAGING_TABLE = text("TRUNCATE links_import")
+
+# конфликтующие строки не вставляются; по RETURNING видно, какие прошли, остальные разбирает _load_batch
+MERGE_STAGING_TABLE = text("""
+    INSERT INTO links (short_code, long_url, long_url_digest, redirect_counter, created_at, updated_at, expires_at,
+                       delete_after)
+    SELECT short_code, long_url, long_url_digest, 0,
+           date_trunc('minute', timezone('utc', now())),
+           date_trunc('minute', timezone('utc', now())),
+           expires_at, delete_after
+    FROM links_import
+    ON CONFLICT DO NOTHING
+    RETURNING short_code, long_url_digest
+""")
+
+SELECT_EXISTING_DIGESTS = text("SELECT long_url_digest FROM links WHERE long_url_digest = ANY(:digests)")
+
+MAX_REPORTED_INVALID_ROWS = 100
+
+
+class StagedLink(NamedTuple):
+    line_number: int
+    short_code: str
+    long_url: str
+    long_url_digest: str
+    expires_at: Optional[datetime]
+    is_alias: bool
+    attempt: int = 0
+
+    def record(self) -> tuple:
+        return (
+            self.short_code, self.long_url, self.long_url_digest, self.expires_at,
+            compute_delete_after(self.expires_at, utcnow_minute())
+        )
+
+
+def iter_rows(lines: Iterable[str], file_format: str) -> Iterator[Optional[dict]]:
+    # строки, которые не удалось разобрать, отдаем как None
+    if file_format == "csv":
+        yield from csv.DictReader(lines)
+        return
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield None
+            continue
+        yield row if isinstance(row, dict) else None
+
+
+def validate_row(row: Optional[dict]) -> Optional[CreateLinkRequest]:
+    if row is None:
+        return None
+    try:
+        return CreateLinkRequest.model_validate({
+            "original_url": row.get("original_url"),
+            "custom_alias": row.get("custom_alias") or None,
+            "expires_at": row.get("expires_at") or None,
+        })
+    except (ValidationError, TypeError, ValueError):
+        # ошибка в одной строке не должна прерывать импорт, когда часть пачек уже закоммичена
+        return None
+
+
+async def import_links(
+        db_engine,
+        lines: Iterable[str],
+        file_format: str,
+        batch_size: Optional[int] = None
+) -> ImportLinksResponse:
+    batch_size = batch_size or Settings().IMPORT_BATCH_SIZE
+    stats = ImportLinksResponse()
+    started_at = time.monotonic()
+
+    async with db_engine.connect() as conn:
+        await conn.execute(CREATE_STAGING_TABLE)
+        await conn.commit()
+        driver_connection = (await conn.get_raw_connection()).driver_connection
+
+        batch = []
+        for line_number, row in enumerate(iter_rows(lines, file_format), start=1):
+            stats.total += 1
+            model = validate_row(row)
+            if model is None:
+                _report_invalid(stats, line_number)
+                continue
+
+            long_url = model.original_url.strip()
+            short_code = model.custom_alias.strip() if model.custom_alias else \
+                await short_code_allocator.allocate(conn, long_url)
+            batch.append(StagedLink(
+                line_number, short_code, long_url, long_url_digest(long_url), model.expires_at,
+                is_alias=model.custom_alias is not None
+            ))
+
+            if len(batch) >= batch_size:
+                await _load_batch(conn, driver_connection, batch, stats)
+                batch = []
+                _report_progress(stats, started_at)
+
+        if batch:
+            await _load_batch(conn, driver_connection, batch, stats)
+
+    _report_progress(stats, started_at)
+    return stats
+
+
+async def _load_batch(conn, driver_connection, batch: list[StagedLink], stats: ImportLinksResponse) -> None:
+    """Загружает пачку в одной транзакции: очистка staging, COPY и слияние.
+
+    Дубликаты по URL (уже в links или повтор внутри пачки) считаются пропущенными.
+    Если URL новый, а сгенерированный код занят, код выделяется заново со следующей попыткой
+    и строка загружается повторно, до CODE_GENERATION_ATTEMPTS раз; занятый alias и исчерпанные
+    попытки попадают в invalid с номером строки.
+    """
+    attempts = Settings().CODE_GENERATION_ATTEMPTS
+    imported = []
+    pending = batch
+    while pending:
+        await conn.execute(TRUNCATE_STAGING_TABLE)
+        await driver_connection.copy_records_to_table(
+            "links_import", records=[link.record() for link in pending], columns=IMPORT_COLUMNS
+        )
+        inserted = {digest: short_code for short_code, digest in (await conn.execute(MERGE_STAGING_TABLE)).all()}
+        imported.extend(inserted.values())
+
+        rejected = []
+        for link in pending:
+            if inserted.get(link.long_url_digest) == link.short_code:
+                # одинаковые строки в пачке: вставлена только первая
+                del inserted[link.long_url_digest]
+            else:
+                rejected.append(link)
+        if not rejected:
+            break
+
+        existing = set((await conn.execute(
+            SELECT_EXISTING_DIGESTS, {"digests": [link.long_url_digest for link in rejected]}
+        )).scalars().all())
+        pending = []
+        for link in rejected:
+            if link.long_url_digest in existing:
+                stats.skipped += 1
+            elif link.is_alias or link.attempt >= attempts:
+                _report_invalid(stats, link.line_number)
+            else:
+                short_code = await short_code_allocator.allocate(conn, link.long_url, link.attempt + 1)
+                pending.append(link._replace(short_code=short_code, attempt=link.attempt + 1))
+    await conn.commit()
+
+    await register_short_codes(imported)
+    if imported:
+        await invalidate_links()
+    stats.imported += len(imported)
+
+
+def _report_invalid(stats: ImportLinksResponse, line_number: int) -> None:
+    stats.invalid += 1
+    if len(stats.invalid_rows) < MAX_REPORTED_INVALID_ROWS:
+        stats.invalid_rows.append(line_number)
+
+
+def _report_progress(stats: ImportLinksResponse, started_at: float) -> None:
+    stats.seconds = round(time.monotonic() - started_at, 3)
+    stats.rows_per_second = round(stats.total / stats.seconds, 1) if stats.seconds else 0.0
+    logger.info(
+        f"import: processed {stats.total}, imported {stats.imported}, skipped {stats.skipped}, "
+        f"invalid {stats.invalid}, {stats.rows_per_second} rows/sec"
+    )
+
+
+def import_job_key(job_id: str) -> str:
+    return IMPORT_JOB_KEY_PREFIX + job_id
+
+
+async def import_file(path: str, file_format: str, batch_size: Optional[int] = None) -> ImportLinksResponse:
+    # вне приложения (консоль, celery): свой кэш-бэкенд и свой движок, так как каждый запуск
+    # идет в новом event loop, а соединения пула к нему привязаны
+    FastAPICache.init(RedisBackend(aioredis.from_url(Settings().MESSAGE_BROKER_URL)), prefix="fastapi-cache")
+    db_engine = create_async_engine(Settings().DATABASE_URL)
+    try:
+        with open(path, encoding="utf-8", newline="") as file:
+            return await import_links(db_engine, file, file_format, batch_size)
+    finally:
+        await db_engine.dispose()
+
+
+async def _main(path: str, file_format: str, batch_size: Optional[int]) -> None:
+    stats = await import_file(path, file_format, batch_size)
+    print(stats.model_dump_json(indent=2))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Import links from CSV/JSONL file")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    args = parser.parse_args()
+    file_format = args.format or ("csv" if args.path.endswith(".csv") else "jsonl")
+    asyncio.run(_main(args.path, file_format, args.batch_size))
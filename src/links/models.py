@@ -1,7 +1,11 @@
 from datetime import datetime
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, SmallInteger, String, DateTime, ForeignKey, Sequence
 from sqlalchemy.orm import Mapped, relationship, mapped_column, declared_attr
 from src.database import DbBase
+from src.links.expiry import default_delete_after
+
+# счетчик для генерации коротких кодов (SHORT_CODE_ALLOCATOR = sequence-counter)
+short_code_seq = Sequence("short_code_seq", metadata=DbBase.metadata)
 
 
 class Link(DbBase):
@@ -10,18 +14,21 @@ class Link(DbBase):
     id = Column(Integer, primary_key=True)
     short_code = Column(String, nullable=False, unique=True, index=True)
     long_url = Column(String, nullable=False)
+    # sha256 нормализованного long_url (см. src/links/urls.py), по нему проверяется уникальность и ищется ссылка
+    long_url_digest = Column(String(64), nullable=False, unique=True, index=True)
     redirect_counter = Column(Integer, nullable=False, default=0)
     author_id: Mapped[int] = mapped_column(
         Integer,
-        ForeignKey("user.id"),
+        ForeignKey("user.id", ondelete="CASCADE"),
         index=True,
         nullable=True
     )
 
     @declared_attr
     def author(cls) -> Mapped["User"]:
-        from src.auth.users import User
-        return relationship("User", back_populates="links", lazy="selectin")
+        from src.auth.models import User
+        # автор нужен редко, грузится только явно через selectinload(Link.author)
+        return relationship("User", back_populates="links", lazy="raise_on_sql")
 
     # alias = Column(String, unique=True, index=True, nullable=True)
     created_at = Column(DateTime(timezone=False), nullable=False,
@@ -31,3 +38,26 @@ class Link(DbBase):
                         onupdate=lambda: datetime.utcnow().replace(second=0, microsecond=0))
     expires_at = Column(DateTime(timezone=False), nullable=True)
     last_used_at = Column(DateTime(timezone=False), nullable=True)
+    # когда ссылку пора удалить (см. src/links/expiry.py), поддерживается при создании,
+    # обновлении и переходах; очистка идет по индексу только по просроченным строкам
+    delete_after = Column(DateTime(timezone=False), nullable=False, index=True, default=default_delete_after)
+
+
+class LinkClickCounter(DbBase):
+    # шардированный счетчик переходов (CLICK_COUNTER_SHARDS > 0): переход увеличивает случайный шард,
+    # а не одну строку links, поэтому популярная ссылка не упирается в блокировку строки;
+    # compact_click_counters_task периодически переносит шарды в links.redirect_counter
+    __tablename__ = "link_click_counters"
+
+    link_id = Column(Integer, ForeignKey("links.id", ondelete="CASCADE"), primary_key=True)
+    shard = Column(SmallInteger, primary_key=True)
+    clicks = Column(Integer, nullable=False, default=0)
+
+
+class AppliedClickFlush(DbBase):
+    # пачки отложенных переходов, уже примененные flush_click_counters_task: id пачки пишется
+    # в той же транзакции, что и счетчики, поэтому повторный сброс той же пачки ничего не меняет
+    __tablename__ = "applied_click_flushes"
+
+    flush_id = Column(String, primary_key=True)
+    applied_at = Column(DateTime(timezone=False), nullable=False)
@@ -0,0 +1,91 @@
+import hashlib
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from redis.exceptions import NoScriptError
+
+from src.config import Settings
+from src.links.cache import LEGACY_REDIRECT_KEY_PREFIX, decode_redirect, redirect_bucket_key
+from src.links.counters import PENDING_CLICKS_KEY, HOT_LINKS_KEY
+from src.links.expiry import utc_timestamp
+from src.links.generations import GENERATION_KEY_PREFIX, link_namespace
+
+settings = Settings()
+
+# Весь переход за один вызов redis: поиск в L2-кэше с проверкой срока действия записи,
+# отложенный счетчик переходов и рейтинг популярных ссылок.
+# KEYS: бакет кэша, отложенные переходы, рейтинг, поколение ссылки.
+# ARGV: код, текущее время (unix), искать ли url (1/0), считать ли переход в redis (1/0),
+# префикс строковых ключей раскладки keys ("" - читать бакеты), учитывать ли в рейтинге (1/0).
+# Строковый ключ собирается внутри скрипта, redis cluster здесь не используется.
+REDIRECT_SCRIPT = """
+local code, now = ARGV[1], tonumber(ARGV[2])
+local result = false
+if ARGV[3] == '1' then
+    local value
+    if ARGV[5] == '' then
+        value = redis.call('HGET', KEYS[1], code)
+    else
+        local generation = redis.call('GET', KEYS[4]) or '0'
+        value = redis.call('GET', ARGV[5] .. ':' .. generation .. ':' .. code)
+    end
+    if not value then
+        return false
+    end
+    -- запись действительна до min(срок ссылки, время записи + ее TTL), см. encode_redirect
+    local valid_until = string.match(value, '^(%d*)|')
+    if valid_until and valid_until ~= '' and tonumber(valid_until) <= now then
+        redis.call('HDEL', KEYS[1], code)
+        return false
+    end
+    result = value
+end
+if ARGV[4] == '1' then
+    redis.call('HINCRBY', KEYS[2], 'c:' .. code, 1)
+    redis.call('HSET', KEYS[2], 't:' .. code, now - now % 60)
+end
+if ARGV[6] == '1' then
+    redis.call('ZINCRBY', KEYS[3], 1, code)
+end
+return result
+"""
+REDIRECT_SCRIPT_SHA = hashlib.sha1(REDIRECT_SCRIPT.encode()).hexdigest()
+
+
+class ResolvedRedirect(NamedTuple):
+    long_url: str
+    # сколько секунд запись кэша еще действительна, None - срок не записан (прежний формат)
+    ttl: Optional[int]
+
+
+async def resolve_redirect(
+        redis,
+        short_code: str,
+        lookup: bool = True,
+        count_click: bool = False,
+        rank: bool = True
+) -> Optional[ResolvedRedirect]:
+    # при lookup=False только учитывает переход (url уже взят из L1 или БД),
+    # при rank=False и count_click=False только читает кэш
+    keys = [
+        redirect_bucket_key(short_code),
+        PENDING_CLICKS_KEY,
+        HOT_LINKS_KEY,
+        GENERATION_KEY_PREFIX + link_namespace(short_code),
+    ]
+    args = [
+        short_code,
+        utc_timestamp(datetime.utcnow()),
+        int(lookup),
+        int(count_click),
+        LEGACY_REDIRECT_KEY_PREFIX if settings.REDIRECT_CACHE_LAYOUT == "keys" else "",
+        int(rank),
+    ]
+    try:
+        value = await redis.evalsha(REDIRECT_SCRIPT_SHA, len(keys), *keys, *args)
+    except NoScriptError:
+        # после перезапуска redis кэш скриптов пуст, EVAL загрузит скрипт заново
+        value = await redis.eval(REDIRECT_SCRIPT, len(keys), *keys, *args)
+    if not value:
+        return None
+    return ResolvedRedirect(*decode_redirect(value.decode("utf-8")))
@@ -1,23 +1,36 @@
-import csv
+import json
 import time
-from io import StringIO
-from typing import Union
+from datetime import datetime
+from typing import Union, AsyncIterator, Optional
 from fastapi import APIRouter, Request, Depends, Query, BackgroundTasks
 from fastapi.responses import Response
 from fastapi.responses import StreamingResponse, RedirectResponse
 from fastapi_cache import FastAPICache
-from fastapi_cache.decorator import cache
-from sqlalchemy.ext.asyncio import AsyncSession
+from pydantic import ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from starlette import status
 from src.auth.users import get_current_user_or_none, get_current_user, User
-from src.database import get_async_session
+from src.config import Settings
+from src.database import get_async_session, get_async_session_maker
+from src.links.cache import redirect_cache, cache_redirect
+from src.links.counters import get_pending_clicks
 from src.links.dependencies import get_link_service
+from src.links.exceptions import BatchFormatError, LinkNotFoundError
+from src.links.export import iter_statistics_csv, gzip_chunks
+from src.links.redirects import ResolvedRedirect, resolve_redirect
 from src.links.schemes import CreateLinkRequest, ShortenLinkResponse, UpdateLinkResponse, UpdateLinkRequest, \
-    StatsLinkResponse, GetLinkResponse, GetAllLinksResponse, GetLinkShortResponse
+    StatsLinkResponse, GetLinkResponse, GetAllLinksResponse, GetLinkShortResponse, BatchShortenResponse, \
+    BatchLinkResult
 from src.links.service import LinkService
+from src.links.singleflight import single_flight
+from src.links.xfetch import xfetch_cache, write_entry
 from src.links.utils import search_cache_key_builder, get_link_cache_key_builder, get_all_links_key_builder
 from src.tasks.tasks import clear_outdated_links_task
 
+settings = Settings()
+
+LINK_STATS_CACHE_TTL = 5
+
 router = APIRouter(
     prefix="/links",
     tags=["links"]
@@ -37,20 +50,112 @@ async def shorten_link(
         expires_at=model.expires_at,
         user=user
     )
+    await _seed_link_stats(link)
 
     return ShortenLinkResponse(
         link=f"{str(request.base_url).rstrip('/')}/links/{link.short_code}"
     )
 
 
+@router.post(
+    "/shorten/batch",
+    response_model=BatchShortenResponse,
+    status_code=status.HTTP_200_OK,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": {"$ref": "#/components/schemas/CreateLinkRequest"}}
+                },
+                "application/x-ndjson": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+async def shorten_links_batch(
+        request: Request,
+        user: User = Depends(get_current_user_or_none),
+        link_service: LinkService = Depends(get_link_service)
+) -> BatchShortenResponse:
+    results = {}
+    models = []
+    positions = []
+    async for index, item in _read_batch_items(request):
+        if index >= settings.BATCH_SHORTEN_MAX_ITEMS:
+            raise BatchFormatError(f"Batch cannot contain more than {settings.BATCH_SHORTEN_MAX_ITEMS} links")
+        try:
+            if isinstance(item, (bytes, str)):
+                model = CreateLinkRequest.model_validate_json(item)
+            else:
+                model = CreateLinkRequest.model_validate(item)
+        except ValidationError as ex:
+            results[index] = BatchLinkResult(
+                index=index,
+                status="invalid",
+                detail=ex.errors(include_url=False, include_context=False)
+            )
+            continue
+        models.append(model)
+        positions.append(index)
+
+    created = await link_service.create_many(models, user=user)
+
+    base_url = str(request.base_url).rstrip('/')
+    for index, (result_status, short_code, detail) in zip(positions, created):
+        results[index] = BatchLinkResult(
+            index=index,
+            status=result_status,
+            link=f"{base_url}/links/{short_code}" if short_code else None,
+            detail=detail
+        )
+
+    results = [results[i] for i in sorted(results)]
+    return BatchShortenResponse(
+        created=sum(result.status == "created" for result in results),
+        duplicates=sum(result.status == "duplicate" for result in results),
+        invalid=sum(result.status == "invalid" for result in results),
+        errors=sum(result.status == "error" for result in results),
+        results=results
+    )
+
+
+async def _read_batch_items(request: Request) -> AsyncIterator[tuple[int, object]]:
+    # принимаем либо JSON-массив, либо NDJSON (одна ссылка на строку)
+    if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+        index = 0
+        buffer = b""
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield index, line
+                    index += 1
+        if buffer.strip():
+            yield index, buffer
+        return
+
+    try:
+        items = await request.json()
+    except ValueError:
+        raise BatchFormatError("Body must be a JSON array or NDJSON")
+    if not isinstance(items, list):
+        raise BatchFormatError("Body must be a JSON array or NDJSON")
+    for index, item in enumerate(items):
+        yield index, item
+
+
 @router.get("/search", response_model=GetLinkResponse, status_code=status.HTTP_200_OK)
-@cache(expire=10, key_builder=search_cache_key_builder)
+@xfetch_cache(expire=10, key_builder=search_cache_key_builder, max_stale=settings.SEARCH_CACHE_MAX_STALE)
 async def search_link_by_original_url(
     request: Request,
     original_url: str = Query(),
-    link_service: LinkService = Depends(get_link_service)
+    session_maker: async_sessionmaker = Depends(get_async_session_maker)
 ) -> GetLinkResponse:
-    link = await link_service.find_by_long_url(original_url)
+    # ответ может пересчитываться в фоне уже после запроса, поэтому сессия своя
+    async with session_maker() as session:
+        link = await LinkService(session).find_by_long_url(original_url)
 
     return GetLinkResponse(
         original_url=link.long_url,
@@ -61,14 +166,17 @@ async def search_link_by_original_url(
 
 
 @router.get("/all", response_model=GetAllLinksResponse, status_code=status.HTTP_200_OK)
-# раз в минуту обновляем кэш
-@cache(expire=60, key_builder=get_all_links_key_builder)
+# раз в минуту обновляем кэш, каждая страница кэшируется под своим ключом
+@xfetch_cache(expire=60, key_builder=get_all_links_key_builder, max_stale=settings.LINKS_PAGE_CACHE_MAX_STALE)
 async def get_all_links(
         request: Request,
+        after: Optional[int] = Query(default=None),
+        limit: int = Query(default=settings.LINKS_PAGE_SIZE, ge=1, le=settings.LINKS_PAGE_MAX_SIZE),
         user: User = Depends(get_current_user),
-        link_service: LinkService = Depends(get_link_service)
+        session_maker: async_sessionmaker = Depends(get_async_session_maker)
 ) -> GetAllLinksResponse:
-    links = await link_service.get_all_redirect_links()
+    async with session_maker() as session:
+        links = await LinkService(session).get_all_redirect_links(after=after, limit=limit)
 
     return GetAllLinksResponse(
         links=[
@@ -76,43 +184,65 @@ async def get_all_links(
                 original_url=link.long_url,
                 short_url=f"{str(request.base_url).rstrip('/')}/links/{link.short_code}"
             ) for link in links
-        ]
+        ],
+        next_after=links[-1].id if len(links) == limit else None
     )
 
 
+@router.get("/all/stream", response_class=StreamingResponse)
+async def stream_all_links(
+        request: Request,
+        after: Optional[int] = Query(default=None),
+        user: User = Depends(get_current_user),
+        session_maker: async_sessionmaker = Depends(get_async_session_maker)
+):
+    # тот же формат, что и у /links/all, но без кэша и без ограничения на размер:
+    # строки пишутся в ответ по мере чтения курсора
+    base_url = str(request.base_url).rstrip('/')
+
+    async def generate():
+        yield '{"links": ['
+        first = True
+        async with session_maker() as session:
+            async for rows in LinkService(session).stream_redirect_links(
+                    after=after, chunk_size=settings.LINKS_STREAM_CHUNK_SIZE):
+                chunk = ",".join(
+                    json.dumps({"original_url": row.long_url, "short_url": f"{base_url}/links/{row.short_code}"})
+                    for row in rows
+                )
+                yield chunk if first else "," + chunk
+                first = False
+        yield ']}'
+
+    return StreamingResponse(generate(), media_type="application/json")
+
+
 @router.get("/my-statistics", response_class=StreamingResponse)
 async def get_user_statistics(
         request: Request,
         user: User = Depends(get_current_user),
-        link_service: LinkService = Depends(get_link_service)
+        session_maker: async_sessionmaker = Depends(get_async_session_maker)
 ):
-    links = await link_service.get_links_by_author(user.id)
-
-    csv_data = StringIO()
-    writer = csv.writer(csv_data)
-
-    writer.writerow([
-        "Short URL", "Original URL", "Created At",
-        "Expires At", "Redirects", "Last Used"
-    ])
-
-    for link in links:
-        writer.writerow([
-            f"{str(request.base_url).rstrip('/')}/links/{link.short_code}",
-            link.long_url,
-            link.created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            link.expires_at.strftime("%Y-%m-%d %H:%M:%S") if link.expires_at else "N/A",
-            link.redirect_counter,
-            link.last_used_at.strftime("%Y-%m-%d %H:%M:%S") if link.last_used_at else "Never"
-        ])
-
-    csv_data.seek(0)
+    # CSV пишется по мере чтения серверного курсора, целиком в памяти не собирается
+    async def link_chunks():
+        async with session_maker() as session:
+            async for links in LinkService(session).stream_links_by_author(
+                    user.id, chunk_size=settings.STATISTICS_CHUNK_SIZE):
+                yield links
+
+    content = iter_statistics_csv(link_chunks(), str(request.base_url).rstrip('/'))
+    headers = {
+        "Content-Disposition": f"attachment; filename=statistics.csv",
+        "Vary": "Accept-Encoding"
+    }
+    if settings.STATISTICS_GZIP_ENABLED and "gzip" in request.headers.get("accept-encoding", ""):
+        content = gzip_chunks(content)
+        headers["Content-Encoding"] = "gzip"
+
     return StreamingResponse(
-        iter([csv_data.getvalue()]),
+        content,
         media_type="text/csv",
-        headers={
-            "Content-Disposition": f"attachment; filename=statistics.csv"
-        }
+        headers=headers
     )
 
 
@@ -123,21 +253,59 @@ async def redirect_link(
     short_code: str,
     background_tasks: BackgroundTasks,
     link_service: LinkService = Depends(get_link_service),
+    session_maker: async_sessionmaker = Depends(get_async_session_maker),
 ):
-    backend = FastAPICache.get_backend()
-    cache_key = get_link_cache_key_builder(func=redirect_link, short_code=short_code)
-
-    cached_url = await backend.get(cache_key)
+    redis = FastAPICache.get_backend().redis
+    # в режиме buffered переход считает скрипт в redis, в БД их сбрасывает пачками flush_click_counters_task
+    buffered = settings.REDIRECT_COUNTER_MODE == "buffered"
+    # инвалидация, пришедшая во время await ниже, не даст записать в L1 старый url
+    l1_version = redirect_cache.version()
+    cached_url = redirect_cache.get(short_code)
+
+    # один вызов redis: поиск в L2 (если нет в L1), счетчик переходов и рейтинг ссылок
+    resolved = await resolve_redirect(redis, short_code, lookup=cached_url is None, count_click=buffered)
+    if cached_url is None and resolved:
+        cached_url = resolved.long_url
+        # в L1 запись живет не дольше, чем в redis, поэтому истекшая ссылка не отдается и отсюда
+        redirect_cache.set(short_code, cached_url, resolved.ttl, version=l1_version)
 
     if cached_url:
-        cached_url = cached_url.decode("utf-8")
-        background_tasks.add_task(link_service.increment_counter, short_code)
+        _count_click_in_db(short_code, background_tasks, session_maker)
         return RedirectResponse(url=cached_url, status_code=302)
-    else:
+
+    async def load_redirect() -> ResolvedRedirect:
         link = await link_service.get(short_code)
-        await backend.set(cache_key, link.long_url, expire=5*60)
-        background_tasks.add_task(link_service.increment_counter, short_code)
-        return RedirectResponse(url=link.long_url, status_code=302)
+        if link.expires_at is not None and link.expires_at <= datetime.utcnow():
+            # ссылка истекла, но еще не удалена clear_outdated_links_task
+            raise LinkNotFoundError()
+        ttl = await cache_redirect(redis, short_code, link.long_url, link.expires_at)
+        return ResolvedRedirect(link.long_url, ttl)
+
+    # при одновременных промахах по одному коду в БД идет только один запрос
+    resolved = await single_flight(
+        redis,
+        f"redirect:{short_code}",
+        read_cache=lambda: resolve_redirect(redis, short_code, rank=False),
+        load=load_redirect
+    )
+    long_url = resolved.long_url
+    redirect_cache.set(short_code, long_url, resolved.ttl, version=l1_version)
+    # при промахе скрипт переход не учел
+    await resolve_redirect(redis, short_code, lookup=False, count_click=buffered)
+    _count_click_in_db(short_code, background_tasks, session_maker)
+    return RedirectResponse(url=long_url, status_code=302)
+
+
+def _count_click_in_db(short_code: str, background_tasks: BackgroundTasks, session_maker: async_sessionmaker) -> None:
+    if settings.REDIRECT_COUNTER_MODE != "buffered":
+        background_tasks.add_task(_increment_counter, short_code, session_maker)
+
+
+async def _increment_counter(short_code: str, session_maker: async_sessionmaker) -> None:
+    # фоновая задача выполняется уже после закрытия сессии запроса,
+    # поэтому открываем свою короткую сессию
+    async with session_maker() as session:
+        await LinkService(session).increment_counter(short_code)
 
 
 @router.delete("/{short_code}", response_class=Response, status_code=status.HTTP_204_NO_CONTENT)
@@ -179,23 +347,44 @@ async def update_link(
 
 
 @router.get("/{short_code}/stats", response_model=StatsLinkResponse, status_code=status.HTTP_200_OK)
-@cache(expire=5, key_builder=get_link_cache_key_builder)
+@xfetch_cache(expire=LINK_STATS_CACHE_TTL, key_builder=get_link_cache_key_builder,
+              max_stale=settings.STATS_CACHE_MAX_STALE)
 async def link_stats(
         short_code: str,
-        link_service: LinkService = Depends(get_link_service)
+        session_maker: async_sessionmaker = Depends(get_async_session_maker)
 ) -> Union[Response, StatsLinkResponse]:
 
-    link = await link_service.get_stats(
-        short_code=short_code
-    )
+    async with session_maker() as session:
+        link = await LinkService(session).get_stats(
+            short_code=short_code
+        )
+
+    redirect_amount, last_used_at = link.redirect_counter, link.last_used_at
+    if settings.REDIRECT_COUNTER_MODE == "buffered":
+        pending_clicks, pending_last_used = await get_pending_clicks(FastAPICache.get_backend().redis, short_code)
+        redirect_amount += pending_clicks
+        if pending_last_used and (last_used_at is None or pending_last_used > last_used_at):
+            last_used_at = pending_last_used
 
+    return _stats_response(link, redirect_amount, last_used_at)
+
+
+def _stats_response(link, redirect_amount: int, last_used_at: Optional[datetime]) -> StatsLinkResponse:
     return StatsLinkResponse(
         original_url=link.long_url,
         creation_datetime=link.created_at.strftime("%m/%d/%Y, %H:%M:%S"),
-        redirect_amount=link.redirect_counter,
-        last_used_datetime=link.last_used_at.strftime("%m/%d/%Y, %H:%M:%S") if link.last_used_at else None
+        redirect_amount=redirect_amount,
+        last_used_datetime=last_used_at.strftime("%m/%d/%Y, %H:%M:%S") if last_used_at else None
     )
 
 
+async def _seed_link_stats(link) -> None:
+    # у только что созданной ссылки переходов нет, статистику можно положить в кэш сразу
+    key = await get_link_cache_key_builder(func=link_stats, short_code=link.short_code)
+    value = FastAPICache.get_coder().encode(_stats_response(link, 0, None))
+    await write_entry(FastAPICache.get_backend().redis, key, value, 0.0,
+                      LINK_STATS_CACHE_TTL, settings.STATS_CACHE_MAX_STALE)
+
+
 # current_active_user = fastapi_users.current_user(active=True)
 
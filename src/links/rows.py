@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+from src.links.counters import total_redirect_counter
+from src.links.models import Link
+
+
+# легкие read-only строки для списков и выгрузок: без identity map,
+# отслеживания изменений и загрузчиков связей, только нужные колонки
+
+
+class LinkListRow(NamedTuple):
+    id: int
+    short_code: str
+    long_url: str
+
+
+class LinkStatsRow(NamedTuple):
+    short_code: str
+    long_url: str
+    created_at: datetime
+    expires_at: Optional[datetime]
+    redirect_counter: int
+    last_used_at: Optional[datetime]
+
+
+class LinkRedirectRow(NamedTuple):
+    short_code: str
+    long_url: str
+    expires_at: Optional[datetime]
+
+
+LINK_LIST_COLUMNS = (Link.id, Link.short_code, Link.long_url)
+
+# redirect_counter - вместе с шардами link_click_counters
+LINK_STATS_COLUMNS = (
+    Link.short_code, Link.long_url, Link.created_at,
+    Link.expires_at, total_redirect_counter(), Link.last_used_at
+)
+
+LINK_REDIRECT_COLUMNS = (Link.short_code, Link.long_url, Link.expires_at)
@@ -1,6 +1,6 @@
 import validators
 from typing import Optional
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pydantic import BaseModel, field_validator, Field
 
 
@@ -27,6 +27,9 @@ class CreateLinkRequest(BaseModel):
 
     @field_validator('expires_at')
     def round_to_minute(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            # в БД время хранится без зоны в UTC, иначе сравнение с utcnow() падает с TypeError
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
         if value is not None:
             value = value.replace(second=0, microsecond=0)
         if value is not None and value < datetime.utcnow().replace(tzinfo=None):
@@ -57,6 +60,9 @@ class UpdateLinkRequest(BaseModel):
 
     @field_validator('expires_at')
     def round_to_minute(cls, value: Optional[datetime]) -> Optional[datetime]:
+        if value is not None and value.tzinfo is not None:
+            # в БД время хранится без зоны в UTC, иначе сравнение с utcnow() падает с TypeError
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
         if value is not None:
             value = value.replace(second=0, microsecond=0)
         if value is not None and value < datetime.utcnow().replace(tzinfo=None):
@@ -99,3 +105,39 @@ class GetLinkShortResponse(BaseModel):
 
 class GetAllLinksResponse(BaseModel):
     links: list[GetLinkShortResponse]
+    # id последней ссылки на странице, передается в after для следующей страницы
+    next_after: int | None = Field(default=None)
+
+
+class BatchLinkResult(BaseModel):
+    index: int
+    status: str
+    link: str | None = Field(default=None)
+    detail: str | list | None = Field(default=None)
+
+
+class BatchShortenResponse(BaseModel):
+    created: int
+    duplicates: int
+    invalid: int
+    # не удалось подобрать свободный код за CODE_GENERATION_ATTEMPTS попыток
+    errors: int = 0
+    results: list[BatchLinkResult]
+
+
+class ImportLinksResponse(BaseModel):
+    total: int = 0
+    imported: int = 0
+    skipped: int = 0
+    invalid: int = 0
+    invalid_rows: list[int] = Field(default_factory=list)
+    seconds: float = 0.0
+    rows_per_second: float = 0.0
+
+
+class ImportJobResponse(BaseModel):
+    job_id: str
+    # queued, running, done или failed
+    status: str
+    result: ImportLinksResponse | None = Field(default=None)
+    detail: str | None = Field(default=None)
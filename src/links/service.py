@@ -1,17 +1,25 @@
-import hashlib
 from datetime import datetime, timedelta
-from typing import Optional, List
+from typing import Optional, List, Tuple, AsyncIterator
 
 from sqlalchemy import delete, select, and_, or_
+from sqlalchemy.dialects import postgresql, sqlite
 
 from src.auth.models import User
 from src.config import Settings
 from src.database import AsyncSession
+from src.links.allocator import short_code_allocator
+from src.links.bloom import short_code_may_exist, remember_missing_short_code, register_short_code, \
+    register_short_codes
 from src.links.exceptions import NonUniqueAliasError, AliasLengthError, UrlAlreadyExists, LinkNotFoundError, \
     NonUniqueShortCodeError, PermissionDenied
+from src.links.counters import build_sharded_flush_statements
+from src.links.expiry import compute_delete_after, link_ttl, utcnow_minute
 from src.links.models import Link
-from src.links.schemes import UpdateLinkRequest
-from src.links.utils import invalidate_cache
+from src.links.rows import LinkListRow, LinkStatsRow, LinkRedirectRow, LINK_LIST_COLUMNS, LINK_STATS_COLUMNS, \
+    LINK_REDIRECT_COLUMNS
+from src.links.schemes import UpdateLinkRequest, CreateLinkRequest
+from src.links.urls import long_url_digest, long_url_variants
+from src.links.utils import invalidate_cache, invalidate_links, cache_link_redirect
 
 settings = Settings()
 
@@ -30,13 +38,10 @@ class LinkService:
         )
 
     async def find_by_long_url(self, long_url: str) -> Optional[Link]:
-        url_to_search = [long_url.strip()]
-        if not long_url.startswith(('http://', 'https://')):
-            url_to_search.append('https://' + long_url.strip())
-            url_to_search.append('http://' + long_url.strip())
+        digests = [long_url_digest(url) for url in long_url_variants(long_url)]
         link = (await self.session.execute(
             select(Link).filter(
-                Link.long_url.in_(url_to_search)
+                Link.long_url_digest.in_(digests)
             )
         )).scalar_one_or_none()
         if not link:
@@ -45,18 +50,26 @@ class LinkService:
 
 
     async def get(self, short_code: str) -> Optional[Link]:
+        if not await short_code_may_exist(short_code):
+            raise LinkNotFoundError()
+
         link = await self._get_link_by_short_code(short_code)
 
         if not link:
+            await remember_missing_short_code(short_code)
             raise LinkNotFoundError()
 
         return link
 
-    async def get_stats(self, short_code: str) -> Optional[Link]:
-        link = await self._get_link_by_short_code(short_code)
-        if not link:
+    async def get_stats(self, short_code: str) -> LinkStatsRow:
+        row = (await self.session.execute(
+            select(*LINK_STATS_COLUMNS).filter(
+                Link.short_code == short_code.strip()
+            )
+        )).one_or_none()
+        if not row:
             raise LinkNotFoundError()
-        return link
+        return LinkStatsRow._make(row)
 
     async def create(
             self,
@@ -69,44 +82,141 @@ class LinkService:
         long_url = long_url.strip() if long_url else None
         custom_alias = custom_alias.strip() if custom_alias else None
 
-        await self._url_unique_or_raise(long_url)
-
-        if custom_alias:
-            await self._alias_unique_or_raise(custom_alias)
-            short_code = custom_alias
+        if custom_alias and (len(custom_alias) > 16 or len(custom_alias) < 4):
+            raise AliasLengthError(custom_alias)
+
+        expires_at = expires_at.replace(tzinfo=None) if expires_at else None
+        attempts = 0 if custom_alias else Settings().CODE_GENERATION_ATTEMPTS
+        for attempt in range(attempts + 1):
+            short_code = custom_alias or await self._generate_short_code(long_url, attempt=attempt)
+            link = await self._insert_link(
+                long_url=long_url,
+                long_url_digest=long_url_digest(long_url),
+                short_code=short_code,
+                expires_at=expires_at,
+                author_id=user.id if user else None,
+                delete_after=compute_delete_after(expires_at, utcnow_minute())
+            )
+            if link is not None:
+                break
+            await self._raise_on_conflict(long_url, short_code, is_alias=bool(custom_alias))
         else:
-            short_code = await self._generate_short_code(long_url)
-            short_code_is_unique = await self._is_short_code_unique(short_code)
-            if not short_code_is_unique:
-                attempts = Settings().CODE_GENERATION_ATTEMPTS
-                secret = Settings().CODE_GENERATION_SECRET
-                for i in range(attempts):
-                    short_code = await self._generate_short_code(short_code + secret)
-                    short_code_is_unique = await self._is_short_code_unique(short_code)
-                    if short_code_is_unique:
-                        break
             # нужно на будущее, на тот случай, если все варианты закончатся,
             # чтобы по логам можно было увидеть, что такая ошибка часто падает
             # и что то нужно делать
-            if not short_code_is_unique:
-                raise ValueError("Cannot create short link")
-
-        link = Link(
-            long_url=long_url,
-            short_code=short_code,
-            expires_at=expires_at.replace(tzinfo=None) if expires_at else None
-                if expires_at else None,
-            author_id=user.id if user else None
-        )
+            raise ValueError("Cannot create short link")
+
+        await register_short_code(link.short_code)
+        await invalidate_links()
+        await cache_link_redirect(link.short_code, link.long_url, link.expires_at)
 
+        return link
+
+    async def create_many(
+            self,
+            items: List[CreateLinkRequest],
+            user: Optional[User] = None
+    ) -> List[Tuple[str, Optional[str], Optional[str]]]:
+        # для каждой ссылки возвращает (status, short_code, detail),
+        # status - created / duplicate, порядок как у items
+        results = [None] * len(items)
+        seen_digests, seen_aliases = set(), set()
+        rows = {}
+
+        for position, item in enumerate(items):
+            long_url = item.original_url.strip()
+            custom_alias = item.custom_alias.strip() if item.custom_alias else None
+            digest = long_url_digest(long_url)
+            if digest in seen_digests:
+                results[position] = ("duplicate", None, UrlAlreadyExists(long_url).detail)
+                continue
+            if custom_alias and custom_alias in seen_aliases:
+                results[position] = ("duplicate", None, NonUniqueAliasError(custom_alias).detail)
+                continue
+            seen_digests.add(digest)
+            if custom_alias:
+                seen_aliases.add(custom_alias)
+            expires_at = item.expires_at.replace(tzinfo=None) if item.expires_at else None
+            rows[position] = {
+                "long_url": long_url,
+                "long_url_digest": digest,
+                "short_code": custom_alias,
+                "expires_at": expires_at,
+                "author_id": user.id if user else None,
+                "delete_after": compute_delete_after(expires_at, utcnow_minute()),
+            }
+
+        positions = list(rows)
+        chunk_size = Settings().BATCH_SHORTEN_CHUNK_SIZE
+        for start in range(0, len(positions), chunk_size):
+            chunk = {position: rows[position] for position in positions[start:start + chunk_size]}
+            results_chunk = await self._create_chunk(chunk)
+            for position, result in results_chunk.items():
+                results[position] = result
+
+        created = [short_code for status, short_code, _ in results if status == "created"]
+        await register_short_codes(created)
+        if created:
+            await invalidate_links()
+
+        return results
+
+    async def _create_chunk(self, rows: dict) -> dict:
+        results = {}
+        aliases = {position for position, row in rows.items() if row["short_code"]}
+        attempts = Settings().CODE_GENERATION_ATTEMPTS
+
+        for attempt in range(attempts + 1):
+            for position, row in rows.items():
+                if position not in aliases:
+                    row["short_code"] = await self._generate_short_code(row["long_url"], attempt=attempt)
+
+            inserted = await self._insert_links(list(rows.values()))
+
+            conflicting = {}
+            for position, row in rows.items():
+                if (row["short_code"], row["long_url"]) in inserted:
+                    results[position] = ("created", row["short_code"], None)
+                else:
+                    conflicting[position] = row
+            if not conflicting:
+                return results
+
+            existing = (await self.session.execute(
+                select(Link.long_url_digest, Link.short_code).filter(
+                    or_(
+                        Link.long_url_digest.in_([row["long_url_digest"] for row in conflicting.values()]),
+                        Link.short_code.in_([row["short_code"] for row in conflicting.values()])
+                    )
+                )
+            )).all()
+            existing_digests = {row.long_url_digest for row in existing}
+
+            rows = {}
+            for position, row in conflicting.items():
+                if row["long_url_digest"] in existing_digests:
+                    results[position] = ("duplicate", None, UrlAlreadyExists(row["long_url"]).detail)
+                elif position in aliases:
+                    results[position] = ("duplicate", None, NonUniqueAliasError(row["short_code"]).detail)
+                else:
+                    # сгенерированный код уже занят - пробуем следующий
+                    rows[position] = row
+            if not rows:
+                return results
+
+        for position in rows:
+            results[position] = ("error", None, "Cannot create short link")
+        return results
+
+    async def _insert_links(self, rows: List[dict]) -> set:
+        stmt = self._insert().values(rows).on_conflict_do_nothing().returning(Link.short_code, Link.long_url)
         try:
-            self.session.add(link)
+            inserted = {(row.short_code, row.long_url) for row in (await self.session.execute(stmt)).all()}
             await self.session.commit()
         except Exception as ex:
             await self.session.rollback()
             raise ex
-
-        return link
+        return inserted
 
     async def delete(
             self,
@@ -133,9 +243,24 @@ class LinkService:
             await self.session.rollback()
 
         await invalidate_cache(short_code=link.short_code, original_url=original_url)
+        await remember_missing_short_code(link.short_code)
 
         return link
 
+    async def delete_by_author(self, user_id: int) -> int:
+        # одним DELETE ... RETURNING вместо загрузки и удаления каждой ссылки через ORM
+        try:
+            deleted = (await self.session.execute(
+                delete(Link).where(Link.author_id == user_id).returning(Link.short_code, Link.long_url)
+            )).all()
+            await self.session.commit()
+        except Exception as ex:
+            await self.session.rollback()
+            raise ex
+
+        await invalidate_links([row.short_code for row in deleted], [row.long_url for row in deleted])
+        return len(deleted)
+
     async def update(
             self,
             short_code: str,
@@ -150,9 +275,14 @@ class LinkService:
         if link.author_id != user.id:
             raise PermissionDenied()
 
+        previous_url = link.long_url
         if link.long_url != model.original_url:
-            await self._url_unique_or_raise(model.original_url)
+            digest = long_url_digest(model.original_url)
+            # тот же url в другой записи (например, со слэшем на конце) не считается конфликтом
+            if link.long_url_digest != digest:
+                await self._url_unique_or_raise(model.original_url)
             link.long_url = model.original_url
+            link.long_url_digest = digest
 
         # if model.custom_alias:
         #     if link.short_code != model.custom_alias:
@@ -162,33 +292,93 @@ class LinkService:
         if link.expires_at != model.expires_at:
             link.expires_at = model.expires_at.replace(tzinfo=None) if model.expires_at else None
 
+        link.delete_after = compute_delete_after(link.expires_at, utcnow_minute())
+
         original_url = link.long_url
 
         try:
             await self.session.commit()
             await self.session.refresh(link)
-            await invalidate_cache(short_code=short_code, original_url=original_url)
+            await invalidate_cache(short_code=short_code, original_url=original_url, previous_url=previous_url)
+            await cache_link_redirect(short_code, link.long_url, link.expires_at)
             return link
         except Exception as ex:
             await self.session.rollback()
             raise ex
 
-    async def get_all_redirect_links(self) -> List[Link]:
-        # result = (await self.session.execute(
-        #     select(Link).filter(
-        #       self._get_expired_filter()
-        #     ))).scalars().all()
-        result = (await self.session.execute(
-            select(Link))).scalars().all()
-        return [row for row in result]
-
-    async def get_links_by_author(self, user_id: int) -> List[Link]:
-        result = (await self.session.execute(
-            select(Link).filter(
+    async def get_all_redirect_links(
+            self,
+            after: Optional[int] = None,
+            limit: Optional[int] = None
+    ) -> List[LinkListRow]:
+        # keyset-пагинация по id: страница всегда одна проба по первичному ключу, без OFFSET
+        query = select(*LINK_LIST_COLUMNS).order_by(Link.id)
+        if after is not None:
+            query = query.filter(Link.id > after)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self.session.execute(query)
+        return [LinkListRow._make(row) for row in result.tuples()]
+
+    async def stream_redirect_links(
+            self,
+            after: Optional[int] = None,
+            chunk_size: int = 1000
+    ) -> AsyncIterator[List[LinkListRow]]:
+        # серверный курсор: в памяти одновременно не больше chunk_size строк
+        query = select(*LINK_LIST_COLUMNS).order_by(Link.id)
+        if after is not None:
+            query = query.filter(Link.id > after)
+        result = await self.session.stream(query.execution_options(yield_per=chunk_size))
+        async for rows in result.partitions():
+            yield [LinkListRow._make(row) for row in rows]
+
+    async def get_redirect_targets(self, short_codes: List[str]) -> List[LinkRedirectRow]:
+        # только действующие ссылки, истекшие в кэш не попадают
+        result = await self.session.execute(
+            select(*LINK_REDIRECT_COLUMNS).filter(
+                Link.short_code.in_(short_codes) & self._get_expired_filter()
+            )
+        )
+        return [LinkRedirectRow._make(row) for row in result.tuples()]
+
+    async def stream_most_used_redirect_targets(
+            self,
+            limit: int,
+            chunk_size: int = 1000
+    ) -> AsyncIterator[List[LinkRedirectRow]]:
+        # рейтинг по счетчику переходов из БД, когда в redis его нет (например, после сброса redis);
+        # индекса по redirect_counter нет, это один top-N проход по таблице при старте
+        result = await self.session.stream(
+            select(*LINK_REDIRECT_COLUMNS).filter(
+                self._get_expired_filter()
+            ).order_by(
+                Link.redirect_counter.desc(), Link.last_used_at.desc().nulls_last()
+            ).limit(limit).execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield [LinkRedirectRow._make(row) for row in rows]
+
+    async def get_links_by_author(self, user_id: int) -> List[LinkStatsRow]:
+        result = await self.session.execute(
+            select(*LINK_STATS_COLUMNS).filter(
                 (Link.author_id == user_id) # & self._get_expired_filter()
             ).order_by(Link.created_at.desc())
-        )).scalars().all()
-        return [row for row in result]
+        )
+        return [LinkStatsRow._make(row) for row in result.tuples()]
+
+    async def stream_links_by_author(
+            self,
+            user_id: int,
+            chunk_size: int = 1000
+    ) -> AsyncIterator[List[LinkStatsRow]]:
+        result = await self.session.stream(
+            select(*LINK_STATS_COLUMNS).filter(
+                Link.author_id == user_id
+            ).order_by(Link.created_at.desc()).execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield [LinkStatsRow._make(row) for row in rows]
 
     async def _get_link_by_short_code(self, short_code: str) -> Optional[Link]:
         return (await self.session.execute(
@@ -198,17 +388,53 @@ class LinkService:
         )).scalar_one_or_none()
 
     async def increment_counter(self, short_code: str) -> None:
+        if settings.CLICK_COUNTER_SHARDS > 0:
+            # без чтения и блокировки строки links на каждый переход, см. build_sharded_flush_statements
+            batch = [(short_code.strip(), 1, utcnow_minute())]
+            for statement in build_sharded_flush_statements(batch, link_ttl(), settings.CLICK_COUNTER_SHARDS):
+                await self.session.execute(statement)
+            await self.session.commit()
+            return
+
         link = await self._get_link_by_short_code(short_code)
         if link:
             link.redirect_counter += 1
-            link.last_used_at = datetime.utcnow().replace(second=0, microsecond=0)
+            link.last_used_at = utcnow_minute()
+            if link.expires_at is None:
+                link.delete_after = compute_delete_after(None, link.last_used_at)
+            await self.session.commit()
+
+    def _insert(self):
+        if self.session.bind.dialect.name == "sqlite":
+            return sqlite.insert(Link)
+        return postgresql.insert(Link)
+
+    async def _insert_link(self, **values) -> Optional[Link]:
+        # уникальность url и кода проверяет сама БД, одной вставкой без предварительных select
+        stmt = self._insert().values(**values).on_conflict_do_nothing().returning(Link)
+        try:
+            link = (await self.session.execute(stmt)).scalar_one_or_none()
             await self.session.commit()
+        except Exception as ex:
+            await self.session.rollback()
+            raise ex
+        return link
+
+    async def _raise_on_conflict(self, long_url: str, short_code: str, is_alias: bool) -> None:
+        digest = long_url_digest(long_url)
+        conflicts = (await self.session.execute(
+            select(Link.long_url_digest, Link.short_code).filter(
+                or_(Link.long_url_digest == digest, Link.short_code == short_code)
+            )
+        )).all()
+        if any(row.long_url_digest == digest for row in conflicts):
+            raise UrlAlreadyExists(long_url)
+        if is_alias:
+            raise NonUniqueAliasError(short_code)
 
-    async def _generate_short_code(self, long_url: str) -> str:
-        # генерируем хэш и берем первые N символом
-        # всего вариантов 62^N ([a-z] + [A-Z] + [0-9])
-        hash_object = hashlib.sha1(long_url.encode())
-        return hash_object.hexdigest()[:settings.SHORT_CODE_LENGTH]
+    async def _generate_short_code(self, long_url: str, attempt: int = 0) -> str:
+        # способ генерации задается SHORT_CODE_ALLOCATOR, см. src/links/allocator.py
+        return await short_code_allocator.allocate(self.session, long_url, attempt)
 
     async def _alias_unique_or_raise(self, alias: str) -> None:
         if not await self._is_short_code_unique(alias):
@@ -241,7 +467,7 @@ class LinkService:
         #     )
         # )
         query = select(Link).where(
-            Link.long_url == url.strip()
+            Link.long_url_digest == long_url_digest(url)
         )
         f = datetime.utcnow()
         result = (await self.session.execute(query)).scalar_one_or_none()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from redis.exceptions import LockError
+
+from src.config import Settings
+
+settings = Settings()
+
+LOCK_KEY_PREFIX = "links:lock:"
+
+
+class _LeaderCancelled(Exception):
+    pass
+
+
+class SingleFlight:
+    """Одна загрузка на ключ внутри воркера: остальные корутины ждут ее результат."""
+
+    def __init__(self):
+        self._calls: dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, load: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                # запрос, который грузил значение, отменили (клиент ушел) - грузим сами
+                return await self.do(key, load)
+
+        future = asyncio.get_running_loop().create_future()
+        # исключение лидера без ожидающих не должно попадать в лог как "never retrieved"
+        future.add_done_callback(lambda done: done.cancelled() or done.exception())
+        self._calls[key] = future
+        try:
+            result = await load()
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except Exception as ex:
+            future.set_exception(ex)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+
+local_flights = SingleFlight()
+
+
+def make_lock(redis, key: str):
+    return redis.lock(LOCK_KEY_PREFIX + key, timeout=settings.SINGLE_FLIGHT_LOCK_TTL, thread_local=False)
+
+
+async def release_lock(lock) -> None:
+    try:
+        await lock.release()
+    except LockError:
+        # загрузка заняла дольше TTL блокировки, ее уже нет
+        pass
+
+
+async def _load_across_workers(
+        redis,
+        key: str,
+        read_cache: Callable[[], Awaitable[Optional[Any]]],
+        load: Callable[[], Awaitable[Any]]
+) -> Any:
+    lock = make_lock(redis, key)
+    if await lock.acquire(blocking=False):
+        try:
+            return await load()
+        finally:
+            await release_lock(lock)
+
+    # значение грузит другой воркер: ждем, пока оно появится в кэше
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.SINGLE_FLIGHT_POLL_INTERVAL)
+        value = await read_cache()
+        if value is not None:
+            return value
+        if not await redis.exists(LOCK_KEY_PREFIX + key):
+            # блокировку сняли, а в кэше пусто: у лидера ошибка или результат не кэшируется
+            break
+    return await load()
+
+
+async def single_flight(
+        redis,
+        key: str,
+        read_cache: Callable[[], Awaitable[Optional[Any]]],
+        load: Callable[[], Awaitable[Any]]
+) -> Any:
+    """Загружает значение промаха кэша один раз на ключ.
+
+    Внутри воркера остальные корутины ждут future лидера, между воркерами - короткую
+    блокировку в redis, перечитывая кэш. load должен сам записать значение в кэш.
+    """
+    return await local_flights.do(key, lambda: _load_across_workers(redis, key, read_cache, load))
+
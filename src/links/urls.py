@@ -0,0 +1,43 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_url(url: str) -> str:
+    # приводит эквивалентные варианты url к одному виду: регистр схемы и хоста,
+    # порт по умолчанию и завершающий слэш не влияют на результат
+    url = url.strip()
+    if not url.lower().startswith(('http://', 'https://')):
+        url = 'http://' + url
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc
+    try:
+        host = (parts.hostname or "").lower()
+        port = parts.port
+    except ValueError:
+        return urlunsplit((scheme, netloc.lower(), parts.path.rstrip("/"), parts.query, parts.fragment))
+
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{port}"
+    userinfo = netloc.rpartition("@")[0]
+    netloc = f"{userinfo}@{host}" if userinfo else host
+
+    return urlunsplit((scheme, netloc, parts.path.rstrip("/"), parts.query, parts.fragment))
+
+
+def long_url_digest(url: str) -> str:
+    # sha256 от нормализованного url: фиксированная длина, по нему уникальный индекс
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def long_url_variants(url: str) -> list[str]:
+    # url без схемы ищем и как http, и как https
+    url = url.strip()
+    if url.lower().startswith(('http://', 'https://')):
+        return [url]
+    return ['https://' + url, 'http://' + url]
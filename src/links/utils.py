@@ -1,7 +1,15 @@
+from datetime import datetime
+from typing import Iterable, Optional
+
 from fastapi_cache import FastAPICache
 
+from src.links.cache import queue_invalidation, cache_redirect
+from src.links.generations import ALL_LINKS_NAMESPACE, link_namespace, url_namespace, link_namespaces, \
+    get_generation, queue_generation_bumps
+from src.links.urls import long_url_variants, normalize_url
+
 
-def search_cache_key_builder(
+async def search_cache_key_builder(
     func,
     namespace: str = "",
     original_url: str = None,
@@ -10,10 +18,16 @@ def search_cache_key_builder(
 ) -> str:
     if not original_url:
         original_url = kwargs.get("kwargs", {}).get("original_url")
-    return f"{func.__module__}:{func.__name__}:{original_url}"
+    generation = await get_generation(FastAPICache.get_backend().redis, url_namespace(original_url))
+    # эквивалентные url (регистр хоста, порт по умолчанию, слэш) делят одну запись кэша;
+    # url без схемы ищется и как http, и как https (long_url_variants), поэтому кэшируется отдельно от http://
+    search_url = normalize_url(original_url)
+    if len(long_url_variants(original_url)) > 1:
+        search_url = "any:" + search_url
+    return f"{func.__module__}:{func.__name__}:{generation}:{search_url}"
 
 
-def get_link_cache_key_builder(
+async def get_link_cache_key_builder(
     func,
     namespace: str = "",
     short_code: str = None,
@@ -22,43 +36,39 @@ def get_link_cache_key_builder(
 ) -> str:
     if not short_code:
         short_code = kwargs.get("kwargs", {}).get("short_code")
-    return f"{func.__module__}:{func.__name__}:{short_code}"
+    generation = await get_generation(FastAPICache.get_backend().redis, link_namespace(short_code))
+    return f"{func.__module__}:{func.__name__}:{generation}:{short_code}"
 
 
-def get_all_links_key_builder(
+async def get_all_links_key_builder(
     func,
     namespace: str = "",
     *args,
     **kwargs
 ) -> str:
-    return f"{func.__module__}:{func.__name__}"
+    # каждая страница кэшируется отдельно, любое изменение ссылок сбрасывает все страницы
+    params = kwargs.get("kwargs", {})
+    generation = await get_generation(FastAPICache.get_backend().redis, ALL_LINKS_NAMESPACE)
+    return f"{func.__module__}:{func.__name__}:{generation}:{params.get('after')}:{params.get('limit')}"
 
 
-async def invalidate_cache(short_code: str = None, original_url: str = None):
+async def invalidate_cache(short_code: str = None, original_url: str = None, previous_url: str = None):
     if short_code is None and original_url is None:
         return
 
-    backend = FastAPICache.get_backend()
+    await invalidate_links([short_code] if short_code else [], [original_url, previous_url])
+
 
-    if short_code:
-        from src.links.router import redirect_link
-        redirect_key = get_link_cache_key_builder(
-            func=redirect_link,
-            short_code=short_code
-        )
-        from src.links.router import link_stats
-        stats_key = get_link_cache_key_builder(
-            func=link_stats,
-            short_code=short_code
-        )
+async def invalidate_links(short_codes: Iterable[str] = (), urls: Iterable[str] = ()) -> None:
+    # один pipeline с INCR поколений, без перебора и удаления ключей
+    short_codes = list(short_codes)
+    async with FastAPICache.get_backend().redis.pipeline(transaction=False) as pipe:
+        queue_generation_bumps(pipe, link_namespaces(short_codes, urls))
+        for short_code in short_codes:
+            queue_invalidation(pipe, short_code)
+        await pipe.execute()
 
-        await backend.clear(key=redirect_key, namespace="")
-        await backend.clear(key=stats_key, namespace="")
 
-    if original_url:
-        from src.links.router import search_link_by_original_url
-        search_key = search_cache_key_builder(
-            func=search_link_by_original_url,
-            original_url=original_url
-        )
-        await backend.clear(search_key)
\ No newline at end of file
+async def cache_link_redirect(short_code: str, long_url: str, expires_at: Optional[datetime] = None) -> None:
+    # write-through: новая или измененная ссылка отдается из кэша с первого перехода
+    await cache_redirect(FastAPICache.get_backend().redis, short_code, long_url, expires_at)
@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.config import Settings
+from src.links.cache import cache_redirects, redirect_cache
+from src.links.counters import HOT_LINKS_KEY
+from src.links.rows import LinkRedirectRow
+from src.links.service import LinkService
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+# прогревает redis один воркер на деплой, остальные стартуют сразу
+WARMUP_LOCK_KEY = "links:warmup"
+
+
+async def _cache_chunk(redis, rows: List[LinkRedirectRow], l1_version: int) -> None:
+    ttls = await cache_redirects(redis, rows)
+    for short_code, long_url, _ in rows:
+        if short_code in ttls:
+            redirect_cache.set(short_code, long_url, ttls[short_code], version=l1_version)
+
+
+async def warm_up_redirects(redis, session_maker: async_sessionmaker, limit: int, chunk_size: int) -> int:
+    """Загружает в кэш редиректов limit самых популярных ссылок, возвращает число записей.
+
+    Популярность берется из рейтинга links:hot, а если в нем меньше limit кодов
+    (например, redis пуст после перезапуска) - оставшиеся добираются из БД по счетчику переходов.
+    """
+    started_at = time.monotonic()
+    warmed: set[str] = set()
+    hot_codes = [code.decode("utf-8") for code in await redis.zrevrange(HOT_LINKS_KEY, 0, limit - 1)]
+
+    async with session_maker() as session:
+        service = LinkService(session)
+        for start in range(0, len(hot_codes), chunk_size):
+            l1_version = redirect_cache.version()
+            rows = await service.get_redirect_targets(hot_codes[start:start + chunk_size])
+            await _cache_chunk(redis, rows, l1_version)
+            warmed.update(row.short_code for row in rows)
+
+        if len(hot_codes) < limit:
+            # курсор читает с начала потока, поэтому версия берется одна на весь поток
+            l1_version = redirect_cache.version()
+            async for rows in service.stream_most_used_redirect_targets(limit, chunk_size):
+                rows = [row for row in rows if row.short_code not in warmed][:limit - len(warmed)]
+                await _cache_chunk(redis, rows, l1_version)
+                warmed.update(row.short_code for row in rows)
+                if len(warmed) >= limit:
+                    break
+
+    logger.info("Redirect cache warmed up: %d links in %.2fs", len(warmed), time.monotonic() - started_at)
+    return len(warmed)
+
+
+async def _warm_up_safely(redis, session_maker: async_sessionmaker) -> None:
+    try:
+        if not await redis.set(WARMUP_LOCK_KEY, 1, nx=True, ex=settings.WARMUP_LOCK_TTL):
+            logger.info("Redirect cache warm-up is done by another worker")
+            return
+        await warm_up_redirects(redis, session_maker, settings.WARMUP_LINKS, settings.WARMUP_CHUNK_SIZE)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        # без прогрева сервис работает, просто первые переходы идут в БД
+        logger.exception("Redirect cache warm-up failed")
+
+
+async def start_warmup(redis, session_maker: async_sessionmaker) -> Optional[asyncio.Task]:
+    """Прогрев кэша при старте: ждет не дольше WARMUP_TIME_BUDGET секунд.
+
+    Если не успел, прогрев продолжается в фоне, а приложение начинает принимать запросы.
+    Возвращает задачу прогрева, чтобы отменить ее при остановке, или None, если прогрев отключен.
+    """
+    if settings.WARMUP_LINKS <= 0:
+        return None
+
+    task = asyncio.create_task(_warm_up_safely(redis, session_maker))
+    try:
+        await asyncio.wait_for(asyncio.shield(task), settings.WARMUP_TIME_BUDGET)
+    except asyncio.TimeoutError:
+        logger.info("Redirect cache warm-up exceeded %ss, continuing in background", settings.WARMUP_TIME_BUDGET)
+    return task
@@ -0,0 +1,104 @@
+import asyncio
+import functools
+import logging
+import math
+import random
+import time
+from typing import Any, Awaitable, Callable
+
+from fastapi_cache import FastAPICache
+
+from src.config import Settings
+from src.links.singleflight import make_lock, release_lock, single_flight
+
+logger = logging.getLogger(__name__)
+
+settings = Settings()
+
+# запись - hash: v - ответ в формате coder из FastAPICache, d - сколько секунд он считался,
+# e - unix-время логического истечения; физически запись живет еще max_stale секунд
+VALUE_FIELD = b"v"
+DELTA_FIELD = b"d"
+EXPIRES_FIELD = b"e"
+
+_refreshing: set[str] = set()
+_background_tasks: set[asyncio.Task] = set()
+
+
+def should_refresh(expires_at: float, delta: float, beta: float, now: float = None) -> bool:
+    # XFetch: чем дольше пересчет и ближе истечение, тем вероятнее обновить заранее;
+    # после истечения (устаревшая запись) - всегда
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1.0 - random.random()) >= expires_at
+
+
+async def write_entry(redis, key: str, value: bytes, delta: float, expire: int, max_stale: int) -> None:
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping={VALUE_FIELD: value, DELTA_FIELD: delta, EXPIRES_FIELD: time.time() + expire})
+        pipe.expire(key, expire + max_stale)
+        await pipe.execute()
+
+
+async def _refresh_in_background(redis, key: str, recompute: Callable[[], Awaitable[Any]]) -> None:
+    try:
+        lock = make_lock(redis, key)
+        if not await lock.acquire(blocking=False):
+            # запись уже обновляет другой воркер
+            return
+        try:
+            await recompute()
+        finally:
+            await release_lock(lock)
+    except Exception:
+        logger.exception("Background refresh of %s failed", key)
+    finally:
+        _refreshing.discard(key)
+
+
+def _schedule_refresh(redis, key: str, recompute: Callable[[], Awaitable[Any]]) -> None:
+    if key in _refreshing:
+        return
+    _refreshing.add(key)
+    task = asyncio.create_task(_refresh_in_background(redis, key, recompute))
+    # на задачу нужна ссылка, иначе ее может собрать сборщик мусора
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def xfetch_cache(expire: int, key_builder: Callable, max_stale: int):
+    """Кэш эндпоинта с вероятностным ранним обновлением (XFetch) и stale-while-revalidate.
+
+    Запись обновляется в фоне незадолго до истечения (тем раньше, чем дольше пересчет)
+    или после него, пока не прошло max_stale секунд; запрос при этом сразу получает
+    значение из кэша. Настоящий промах грузится через single-flight.
+    Эндпоинт пересчитывается в фоне с теми же аргументами, поэтому сессию БД он должен
+    открывать сам, а не получать из зависимости запроса.
+    """
+    def wrapper(func):
+        @functools.wraps(func)
+        async def inner(*args, **kwargs):
+            backend = FastAPICache.get_backend()
+            redis = backend.redis
+            coder = FastAPICache.get_coder()
+            key = await key_builder(func, kwargs=kwargs)
+
+            async def recompute():
+                started_at = time.perf_counter()
+                result = await func(*args, **kwargs)
+                await write_entry(redis, key, coder.encode(result), time.perf_counter() - started_at,
+                                  expire, max_stale)
+                return result
+
+            async def read_cache():
+                value = await redis.hget(key, VALUE_FIELD)
+                return coder.decode(value) if value is not None else None
+
+            entry = await redis.hgetall(key)
+            if entry:
+                if should_refresh(float(entry[EXPIRES_FIELD]), float(entry[DELTA_FIELD]), settings.XFETCH_BETA):
+                    _schedule_refresh(redis, key, recompute)
+                return coder.decode(entry[VALUE_FIELD])
+
+            return await single_flight(redis, key, read_cache, recompute)
+        return inner
+    return wrapper
@@ -1,4 +1,5 @@
 import aioredis
+import asyncio
 import uvicorn
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
@@ -10,17 +11,27 @@ from src.admin.router import router as admin_router
 from src.auth.router import add_auth_routers
 from src.auth.users import fastapi_users
 from src.config import Settings
+from src.database import async_session_maker
 from src.links.exception_handlers import api_error_handler, global_exception_handler
+from src.links.cache import listen_for_invalidations
+from src.links.coder import OrjsonCoder
 from src.links.exceptions import APIError
 from src.links.router import router as links_router
+from src.links.warmup import start_warmup
 from fastapi.middleware.cors import CORSMiddleware
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI) -> AsyncIterator[None]:
     redis = aioredis.from_url(Settings().MESSAGE_BROKER_URL)
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
+    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache", coder=OrjsonCoder)
+    invalidation_listener = asyncio.create_task(listen_for_invalidations(redis))
+    # запросы начинают приниматься только после прогрева (или истечения его бюджета времени)
+    warmup = await start_warmup(redis, async_session_maker)
     yield
+    if warmup is not None:
+        warmup.cancel()
+    invalidation_listener.cancel()
 
 app = FastAPI(
     lifespan=lifespan,
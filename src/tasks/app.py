@@ -2,4 +2,5 @@ from celery import Celery
 from src.config import Settings
 
 app = Celery('tasks', broker=Settings().MESSAGE_BROKER_URL)
+app.conf.task_routes = {'src.tasks.tasks.import_links_task': {'queue': 'imports'}}
 app.autodiscover_tasks(['src.tasks'])
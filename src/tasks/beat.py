@@ -1,7 +1,9 @@
 import asyncio
 
+from src.config import Settings
 from src.tasks.app import app
-from src.tasks.tasks import clear_outdated_links_task
+from src.tasks.tasks import clear_outdated_links_task, flush_click_counters_task, rebuild_short_code_filter_task, \
+    compact_click_counters_task
 
 
 @app.on_after_finalize.connect
@@ -11,4 +13,18 @@ def setup_periodic_tasks(sender, **kwargs):
         clear_outdated_links_task.s(),
         name="clear_outdated_links",
     )
-
+    sender.add_periodic_task(
+        Settings().COUNTER_FLUSH_INTERVAL,
+        flush_click_counters_task.s(),
+        name="flush_click_counters",
+    )
+    sender.add_periodic_task(
+        Settings().CLICK_COUNTER_COMPACTION_INTERVAL,
+        compact_click_counters_task.s(),
+        name="compact_click_counters",
+    )
+    sender.add_periodic_task(
+        Settings().SHORT_CODE_FILTER_REBUILD_INTERVAL,
+        rebuild_short_code_filter_task.s(),
+        name="rebuild_short_code_filter",
+    )
@@ -1,52 +1,191 @@
 import asyncio
+import contextlib
 import logging
+import os
+import time
 from datetime import datetime, timedelta
 
-from sqlalchemy import select
+from redis import Redis
+from redis.exceptions import LockError
+from sqlalchemy import delete, select
 
 from src.config import Settings
 from src.database import sync_session_maker
+from src.links.bloom import short_code_filter
+from src.links.cache import queue_invalidation
+from src.links.counters import take_pending_clicks, release_pending_clicks, build_flush_statement, trim_hot_links, \
+    decay_hot_links, build_sharded_flush_statements, build_compact_chunk_statement, processing_flush_id, \
+    build_claim_flush_statement, build_forget_flushes_statement, FLUSH_LOCK_KEY, APPLIED_FLUSH_RETENTION
+from src.links.expiry import link_ttl
+from src.links.generations import link_namespaces, queue_generation_bumps
+from src.links.importer import import_file, import_job_key
 from src.links.models import Link
-from src.links.utils import invalidate_cache
+from src.links.schemes import ImportJobResponse
 from src.tasks.app import app
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+def build_delete_outdated_chunk_statement(now: datetime, chunk_size: int):
+    # по индексу на delete_after читаются только строки, которые пора удалять;
+    # они блокируются только на время одной пачки, занятые другим воркером пропускаются
+    outdated_ids = select(Link.id).filter(
+        Link.delete_after < now
+    ).order_by(Link.delete_after).limit(chunk_size).with_for_update(skip_locked=True)
+    return delete(Link).where(Link.id.in_(outdated_ids)).returning(Link.short_code, Link.long_url)
+
+
+def _invalidate_deleted_links(redis, deleted) -> None:
+    # поколения кэша всей пачки поднимаются одним pipeline, воркерам уходит сброс их L1-кэша
+    pipe = redis.pipeline(transaction=False)
+    queue_generation_bumps(pipe, link_namespaces(
+        [row.short_code for row in deleted], [row.long_url for row in deleted]
+    ))
+    for row in deleted:
+        queue_invalidation(pipe, row.short_code)
+    pipe.execute()
+
+
 @app.task(ignore_result=True, acks_late=True)
 def clear_outdated_links_task():
-    ttl_limit = datetime.utcnow().replace(tzinfo=None) - timedelta(days=Settings().LINK_TTL_IN_DAYS)
+    settings = Settings()
+    now = datetime.utcnow().replace(tzinfo=None)
+    chunk_size = settings.CLEANUP_CHUNK_SIZE
+    redis = Redis.from_url(settings.MESSAGE_BROKER_URL)
+    started_at = time.monotonic()
+    total = 0
+
+    # за один запуск удаляется не больше CLEANUP_MAX_CHUNKS пачек, остальное - в следующий раз
+    with sync_session_maker() as session:
+        for _ in range(settings.CLEANUP_MAX_CHUNKS):
+            deleted = session.execute(
+                build_delete_outdated_chunk_statement(now, chunk_size)
+            ).all()
+            session.commit()
+            if deleted:
+                _invalidate_deleted_links(redis, deleted)
+                total += len(deleted)
+                logger.info(f"deleted outdated links chunk of {len(deleted)}")
+            if len(deleted) < chunk_size:
+                break
+
+    elapsed = time.monotonic() - started_at
+    logger.info(
+        f"outdated_links deleted == {total} in {elapsed:.3f}s "
+        f"({total / elapsed if elapsed else 0:.1f} links/sec)"
+    )
+
+
+@app.task(ignore_result=True, acks_late=True)
+def flush_click_counters_task():
+    redis = Redis.from_url(Settings().MESSAGE_BROKER_URL)
+    # пересекающиеся запуски взяли бы одну и ту же пачку из processing
+    lock = redis.lock(FLUSH_LOCK_KEY, timeout=Settings().COUNTER_FLUSH_LOCK_TTL, blocking=False)
+    if not lock.acquire():
+        logger.info("click counters are flushed by another worker")
+        return
+    try:
+        _flush_click_counters(redis)
+    finally:
+        # если сброс шел дольше TTL, блокировка уже истекла; повтор пачки отсечет applied_click_flushes
+        with contextlib.suppress(LockError):
+            lock.release()
+
+
+def _flush_click_counters(redis) -> None:
+    # рейтинг ссылок пополняется на каждом переходе, держим в нем только самые популярные;
+    # за интервал сброса счет уменьшается в 2 ** (интервал / HOT_LINKS_HALF_LIFE) раз
+    if Settings().HOT_LINKS_HALF_LIFE > 0:
+        decay_hot_links(redis, 0.5 ** (Settings().COUNTER_FLUSH_INTERVAL / Settings().HOT_LINKS_HALF_LIFE))
+    trim_hot_links(redis, Settings().HOT_LINKS_SIZE)
+    pending = take_pending_clicks(redis)
+
+    logger.info(f"pending click counters len == {len(pending)}")
+
+    if not pending:
+        return
+
+    rows = [(short_code, clicks, last_used) for short_code, (clicks, last_used) in pending.items()]
+    batch_size = Settings().COUNTER_FLUSH_BATCH_SIZE
+    shards = Settings().CLICK_COUNTER_SHARDS
+    flush_id = processing_flush_id(redis)
+    now = datetime.utcnow().replace(tzinfo=None)
     with sync_session_maker() as session:
-        # print(Link.updated_at + timedelta(days=Settings().LINK_TTL_IN_DAYS),
-        #       datetime.utcnow().replace(tzinfo=None),
-        #       Link.updated_at + timedelta(days=Settings().LINK_TTL_IN_DAYS) < datetime.utcnow().replace(tzinfo=None))
-        stmt = session.execute(
-            select(Link).filter(
-                # если нет срока истечения ссылки
-                Link.expires_at.is_(None) & (
-                    # то удаляем ее если с момента создания/обновленияя ссылки прошло более N дней
-                    (
-                            Link.updated_at + timedelta(days=Settings().LINK_TTL_IN_DAYS)
-                                < datetime.utcnow().replace(tzinfo=None)
-                    )
-                    # и ее вообще не использовали, или с момента последнего использования прошло N дней
-                    & (Link.last_used_at.is_(None) | (Link.last_used_at < ttl_limit))
-                )
-                # или если есть срок истечения ссылки и он прошел
-                | (Link.expires_at.isnot(None) & (Link.expires_at < datetime.utcnow().replace(tzinfo=None)))
-            )
-        )
-
-        outdated_links = stmt.scalars().all()
-
-        logger.info(f"outdated_links len == {len(outdated_links)}")
-
-        if outdated_links:
-            for link in outdated_links:
-                logger.info(f"Deleting link {link.short_code}")
-                session.delete(link)
-                loop = asyncio.get_event_loop()
-                loop.create_task(invalidate_cache(short_code=link.short_code, original_url=link.long_url))
+        # id пачки фиксируется в той же транзакции, что и счетчики: если воркер упал после коммита,
+        # но до release_pending_clicks, или задачу доставили повторно, пачка только убирается из redis
+        if session.execute(build_claim_flush_statement(flush_id, now)).first() is None:
+            logger.info(f"click counters batch {flush_id} is already applied")
+        else:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                if shards > 0:
+                    for statement in build_sharded_flush_statements(batch, link_ttl(), shards):
+                        session.execute(statement)
+                else:
+                    session.execute(build_flush_statement(batch, link_ttl()))
+            session.execute(build_forget_flushes_statement(now - APPLIED_FLUSH_RETENTION))
+        session.commit()
+
+    release_pending_clicks(redis)
 
+
+@app.task(ignore_result=True, acks_late=True)
+def compact_click_counters_task():
+    # запускается и при CLICK_COUNTER_SHARDS = 0, чтобы после отключения шардов перенести остатки
+    settings = Settings()
+    total = 0
+    with sync_session_maker() as session:
+        for _ in range(settings.CLICK_COUNTER_COMPACTION_MAX_CHUNKS):
+            updated = session.execute(
+                build_compact_chunk_statement(settings.CLICK_COUNTER_COMPACTION_CHUNK_SIZE)
+            ).rowcount
             session.commit()
+            total += updated
+            if not updated:
+                break
+
+    logger.info(f"click counter shards compacted into {total} links")
+
+
+@app.task(ignore_result=True, acks_late=True)
+def rebuild_short_code_filter_task():
+    if not Settings().SHORT_CODE_FILTER_ENABLED:
+        return
+
+    redis = Redis.from_url(Settings().MESSAGE_BROKER_URL)
+    # created_at округляется до минуты, берем с запасом
+    started_at = datetime.utcnow().replace(second=0, microsecond=0) - timedelta(minutes=2)
+    with sync_session_maker() as session:
+        short_codes = session.execute(
+            select(Link.short_code).execution_options(yield_per=10000)
+        ).scalars()
+        count = short_code_filter.rebuild(redis, short_codes)
+
+        # ссылки, созданные во время перестроения, могли не попасть в новый фильтр
+        recent_short_codes = session.execute(
+            select(Link.short_code).filter(Link.created_at >= started_at)
+        ).scalars().all()
+        short_code_filter.add_sync(redis, recent_short_codes)
+
+    logger.info(f"short code filter rebuilt with {count} codes")
+
+
+@app.task(ignore_result=True)
+def import_links_task(job_id: str, path: str, file_format: str):
+    # идет в отдельной очереди imports, чтобы долгий импорт не задерживал сброс счетчиков и очистку
+    settings = Settings()
+    redis = Redis.from_url(settings.MESSAGE_BROKER_URL)
+    key = import_job_key(job_id)
+    redis.set(key, ImportJobResponse(job_id=job_id, status="running").model_dump_json(), ex=settings.IMPORT_JOB_TTL)
+    try:
+        stats = asyncio.run(import_file(path, file_format))
+    except Exception as ex:
+        logger.exception(f"import {job_id} failed")
+        job = ImportJobResponse(job_id=job_id, status="failed", detail=str(ex))
+    else:
+        job = ImportJobResponse(job_id=job_id, status="done", result=stats)
+    finally:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+    redis.set(key, job.model_dump_json(), ex=settings.IMPORT_JOB_TTL)
@@ -0,0 +1,70 @@
+"""Сравнение JsonCoder из fastapi-cache и OrjsonCoder (с разными алгоритмами сжатия) на странице /links/all.
+
+Запуск: python -m tests.benchmark_cache_coder [--links 1000] [--rounds 200] [--redis-url redis://localhost:6379/15]
+С --redis-url дополнительно выводится MEMORY USAGE записи в Redis.
+"""
+import argparse
+import time
+from datetime import datetime
+from unittest.mock import patch
+
+from fastapi_cache.coder import JsonCoder
+from redis import Redis
+
+from src.links.coder import CODECS, OrjsonCoder
+from src.links.schemes import GetAllLinksResponse, GetLinkShortResponse
+
+BENCHMARK_KEY = "benchmark:cache-coder"
+
+
+def _page(links: int) -> GetAllLinksResponse:
+    return GetAllLinksResponse(
+        links=[
+            GetLinkShortResponse(
+                original_url=f"https://example.com/articles/{i}?utm_source=newsletter&created={datetime(2025, 1, 1)}",
+                short_url=f"https://short.example/links/c{i:07d}"
+            )
+            for i in range(links)
+        ],
+        next_after=links
+    )
+
+
+def _timed(func, rounds: int) -> float:
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started_at) / rounds * 1000
+
+
+def _measure(name: str, coder, page, rounds: int, redis) -> None:
+    data = coder.encode(page)
+    encode_ms = _timed(lambda: coder.encode(page), rounds)
+    decode_ms = _timed(lambda: coder.decode_as_type(data, type_=GetAllLinksResponse), rounds)
+    memory = ""
+    if redis is not None:
+        redis.set(BENCHMARK_KEY, data)
+        memory = f"  {redis.memory_usage(BENCHMARK_KEY) / 1024:>8.1f} KiB in redis"
+    print(f"{name:<20} {len(data) / 1024:>8.1f} KiB  encode {encode_ms:>7.3f} ms  decode {decode_ms:>7.3f} ms{memory}")
+
+
+def main(links: int, rounds: int, redis_url: str = None) -> None:
+    page = _page(links)
+    redis = Redis.from_url(redis_url) if redis_url else None
+
+    _measure("JsonCoder", JsonCoder, page, rounds, redis)
+    for compression in [None, *CODECS]:
+        with patch.object(OrjsonCoder, "compression", compression), patch.object(OrjsonCoder, "min_size", 0):
+            _measure(f"OrjsonCoder/{compression or 'none'}", OrjsonCoder, page, rounds, redis)
+
+    if redis is not None:
+        redis.delete(BENCHMARK_KEY)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--links", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--redis-url")
+    args = parser.parse_args()
+    main(args.links, args.rounds, args.redis_url)
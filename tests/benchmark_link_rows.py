@@ -0,0 +1,80 @@
+"""Сравнение загрузки списка ссылок ORM-объектами и проекцией колонок в LinkListRow / LinkStatsRow.
+
+Запуск: python -m tests.benchmark_link_rows [--rows 100000]
+"""
+import argparse
+import asyncio
+import time
+import tracemalloc
+from datetime import datetime
+
+from sqlalchemy import StaticPool, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from src.auth.models import User
+from src.database import DbBase
+from src.links.models import Link
+from src.links.service import LinkService
+
+
+async def _fill(session_maker, rows: int) -> None:
+    created_at = datetime.utcnow().replace(second=0, microsecond=0)
+    async with session_maker() as session:
+        await session.execute(insert(User).values(id=1, email="bench@mail.com", hashed_password="x"))
+        for start in range(0, rows, 10000):
+            await session.execute(insert(Link), [
+                {
+                    "short_code": f"code{i}",
+                    "long_url": f"http://example.com/{i}",
+                    "long_url_digest": f"{i:064x}",
+                    "redirect_counter": i % 100,
+                    "author_id": 1,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+                for i in range(start, min(start + 10000, rows))
+            ])
+        await session.commit()
+
+
+async def _measure(session_maker, name: str, load) -> None:
+    async with session_maker() as session:
+        tracemalloc.start()
+        started_at = time.perf_counter()
+        result = await load(session)
+        elapsed = time.perf_counter() - started_at
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{name:<40} {len(result):>8} rows  {elapsed * 1000:>9.1f} ms  {peak / 2 ** 20:>8.1f} MiB peak")
+
+
+async def _orm_all(session):
+    return (await session.execute(select(Link).order_by(Link.id))).scalars().all()
+
+
+async def _orm_by_author(session):
+    return (await session.execute(
+        select(Link).filter(Link.author_id == 1).order_by(Link.created_at.desc())
+    )).scalars().all()
+
+
+async def main(rows: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(DbBase.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    await _fill(session_maker, rows)
+
+    await _measure(session_maker, "/links/all: ORM Link", _orm_all)
+    await _measure(session_maker, "/links/all: LinkListRow",
+                   lambda session: LinkService(session).get_all_redirect_links())
+    await _measure(session_maker, "/links/my-statistics: ORM Link", _orm_by_author)
+    await _measure(session_maker, "/links/my-statistics: LinkStatsRow",
+                   lambda session: LinkService(session).get_links_by_author(1))
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    asyncio.run(main(parser.parse_args().rows))
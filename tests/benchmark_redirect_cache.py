@@ -0,0 +1,62 @@
+"""Память redis под кэш редиректов: строковый ключ на ссылку против hash-бакетов.
+
+Нужен отдельный пустой redis (база очищается): python -m tests.benchmark_redirect_cache \\
+    --redis-url redis://localhost:6379/15 [--links 1000000] [--buckets 16384]
+Бакеты остаются в listpack, пока в них не больше hash-max-listpack-entries полей
+и значения не длиннее hash-max-listpack-value байт.
+"""
+import argparse
+from unittest.mock import patch
+
+from redis import Redis
+
+from src.links.cache import LEGACY_REDIRECT_KEY_PREFIX, redirect_bucket_key, settings
+
+PIPELINE_SIZE = 10000
+
+
+def _long_url(i: int) -> str:
+    return f"https://example.com/articles/{i}?utm_source=newsletter"
+
+
+def _used_memory(redis: Redis) -> int:
+    return redis.info("memory")["used_memory"]
+
+
+def _fill(redis: Redis, links: int, layout: str, ttl: int) -> None:
+    pipe = redis.pipeline(transaction=False)
+    for i in range(links):
+        short_code = f"c{i:08d}"
+        if layout == "keys":
+            pipe.set(f"{LEGACY_REDIRECT_KEY_PREFIX}:0:{short_code}", _long_url(i), ex=ttl)
+        else:
+            key = redirect_bucket_key(short_code)
+            pipe.hset(key, short_code, _long_url(i))
+            pipe.expire(key, ttl, nx=True)
+        if i % PIPELINE_SIZE == PIPELINE_SIZE - 1:
+            pipe.execute()
+    pipe.execute()
+
+
+def main(redis_url: str, links: int, buckets: int) -> None:
+    redis = Redis.from_url(redis_url)
+    print(f"hash-max-listpack-entries={redis.config_get('hash-max-listpack-entries')}, "
+          f"hash-max-listpack-value={redis.config_get('hash-max-listpack-value')}")
+    with patch.object(settings, "REDIRECT_CACHE_BUCKETS", buckets):
+        for layout in ("keys", "hash"):
+            redis.flushdb()
+            before = _used_memory(redis)
+            _fill(redis, links, layout, settings.REDIRECT_CACHE_TTL)
+            used = _used_memory(redis) - before
+            print(f"{layout:<6} {links:>9} links  {used / 2 ** 20:>8.1f} MiB  {used / links:>6.1f} B/link")
+        print("bucket encoding:", redis.object("encoding", redirect_bucket_key("c00000000")))
+    redis.flushdb()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis-url", required=True)
+    parser.add_argument("--links", type=int, default=1000000)
+    parser.add_argument("--buckets", type=int, default=16384)
+    args = parser.parse_args()
+    main(args.redis_url, args.links, args.buckets)
@@ -1,11 +1,12 @@
 import pytest
 import runpy
 from httpx import AsyncClient, ASGITransport
-from unittest.mock import AsyncMock, patch, MagicMock
+from unittest.mock import ANY, AsyncMock, patch, MagicMock
 from src.admin.router import _get_all_cache_keys
 from src.main import app
 from src.auth.users import get_admin_user
 from src.auth.models import User
+from src.links.schemes import ImportJobResponse, ImportLinksResponse
 
 
 @pytest.fixture(autouse=True)
@@ -26,6 +27,69 @@ async def test_get_cache_keys():
         assert response.json() == mock_keys
 
 
+@pytest.mark.anyio
+async def test_get_cache_stats():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/admin/cache-stats")
+    assert response.status_code == 200
+    stats = response.json()["redirect_l1"]
+    assert {"size", "hits", "misses", "evictions", "hit_ratio"} <= stats.keys()
+
+
+@pytest.fixture
+def mock_import_redis():
+    redis = MagicMock()
+    redis.set = AsyncMock()
+    redis.get = AsyncMock(return_value=None)
+    with patch("src.admin.router.FastAPICache.get_backend", return_value=MagicMock(redis=redis)):
+        yield redis
+
+
+@pytest.mark.anyio
+async def test_import_links_from_file(mock_import_redis, tmp_path):
+    with patch("src.admin.router.import_links_task") as mock_task, \
+         patch("src.admin.router.Settings") as mock_settings:
+        mock_settings.return_value.IMPORT_UPLOAD_DIR = str(tmp_path / "imports")
+        mock_settings.return_value.IMPORT_JOB_TTL = 60
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post(
+                "/admin/import-links",
+                files={"file": ("links.csv", b"original_url\ngoogle.com\nyahoo.com\n", "text/csv")}
+            )
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    assert response.json()["status"] == "queued"
+    mock_import_redis.set.assert_awaited_once_with(f"links:import:{job_id}", ANY, ex=60)
+    path = str(tmp_path / "imports" / f"{job_id}.csv")
+    mock_task.delay.assert_called_once_with(job_id, path, "csv")
+    with open(path, "rb") as file:
+        assert file.read() == b"original_url\ngoogle.com\nyahoo.com\n"
+
+
+@pytest.mark.anyio
+async def test_get_import_job(mock_import_redis):
+    job = ImportJobResponse(job_id="job", status="done", result=ImportLinksResponse(total=2, imported=1, skipped=1))
+    mock_import_redis.get.return_value = job.model_dump_json().encode()
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get("/admin/import-links/job")
+        mock_import_redis.get.return_value = None
+        missing = await client.get("/admin/import-links/other")
+    assert response.status_code == 200
+    assert response.json()["result"]["imported"] == 1
+    mock_import_redis.get.assert_any_await("links:import:job")
+    assert missing.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_import_links_from_file_wrong_format():
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.post(
+            "/admin/import-links?format=xml",
+            files={"file": ("links.xml", b"<links/>", "text/xml")}
+        )
+    assert response.status_code == 422
+
+
 @pytest.mark.anyio
 async def test__get_all_cache_keys():
     mock_redis = MagicMock()
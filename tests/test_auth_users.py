@@ -47,3 +47,21 @@ async def test_get_user_manager():
         user_manager_gen = get_user_manager()
         user_manager = await user_manager_gen.__anext__()
         assert isinstance(user_manager, UserManager)
+
+
+@pytest.mark.anyio
+async def test_user_manager_deletes_links_in_bulk():
+    mock_user_db = MagicMock(spec=SQLAlchemyUserDatabase)
+    mock_user_db.session = AsyncMock()
+    user_manager = UserManager(mock_user_db)
+    with patch("src.auth.users.LinkService") as mock_link_service:
+        mock_link_service.return_value.delete_by_author = AsyncMock(return_value=3)
+        await user_manager.on_before_delete(User(id=1))
+    mock_link_service.assert_called_once_with(mock_user_db.session)
+    mock_link_service.return_value.delete_by_author.assert_awaited_once_with(1)
+
+
+def test_user_links_are_not_eager_loaded():
+    from src.links.models import Link
+    assert User.links.property.lazy == "raise_on_sql"
+    assert Link.author.property.lazy == "raise_on_sql"
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from sqlalchemy.ext.asyncio import AsyncSession, AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase
 from src.database import (
@@ -8,7 +8,10 @@ from src.database import (
     async_session_maker,
     sync_engine,
     sync_session_maker,
-    get_async_session
+    get_async_session,
+    get_async_session_maker,
+    get_lazy_async_session,
+    LazyAsyncSession
 )
 
 
@@ -51,3 +54,36 @@ async def test_get_async_session():
         session = await gen.__anext__()
         assert session == mock_session
         mock_session_maker.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_lazy_async_session_not_materialized_until_used():
+    session_maker = MagicMock()
+    gen = get_lazy_async_session(session_maker)
+    session = await gen.__anext__()
+    assert isinstance(session, LazyAsyncSession)
+    assert session.is_materialized is False
+    with pytest.raises(StopAsyncIteration):
+        await gen.__anext__()
+    session_maker.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_lazy_async_session_materializes_on_first_use():
+    real_session = MagicMock()
+    real_session.execute = AsyncMock(return_value="result")
+    real_session.close = AsyncMock()
+    session_maker = MagicMock(return_value=real_session)
+    gen = get_lazy_async_session(session_maker)
+    session = await gen.__anext__()
+    assert await session.execute("query") == "result"
+    assert await session.execute("query") == "result"
+    session_maker.assert_called_once()
+    with pytest.raises(StopAsyncIteration):
+        await gen.__anext__()
+    real_session.close.assert_awaited_once()
+    assert session.is_materialized is False
+
+
+def test_get_async_session_maker():
+    assert get_async_session_maker() is async_session_maker
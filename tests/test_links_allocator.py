@@ -0,0 +1,135 @@
+import hashlib
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.allocator import (
+    BASE62_ALPHABET,
+    base62_encode,
+    CounterAllocator,
+    ShortCodeAllocator,
+    FeistelPermutation,
+    HashAllocator,
+    RedisCounterAllocator,
+    SequenceCounterAllocator,
+    get_short_code_allocator,
+    settings
+)
+
+
+def test_base62_encode():
+    assert base62_encode(0, 3) == "000"
+    assert base62_encode(61, 1) == "Z"
+    assert base62_encode(62, 2) == "10"
+    assert base62_encode(62 ** 3 - 1, 3) == "ZZZ"
+    assert len(BASE62_ALPHABET) == 62
+
+
+def test_feistel_permutation_is_bijection():
+    permutation = FeistelPermutation(62 ** 2, b"secret")
+    permuted = [permutation.permute(value) for value in range(62 ** 2)]
+    assert sorted(permuted) == list(range(62 ** 2))
+    assert permuted[:10] != list(range(10))
+
+
+def test_feistel_permutation_depends_on_key():
+    first = FeistelPermutation(62 ** 9, b"secret")
+    second = FeistelPermutation(62 ** 9, b"other")
+    assert [first.permute(i) for i in range(5)] != [second.permute(i) for i in range(5)]
+
+
+def test_feistel_permutation_out_of_domain():
+    permutation = FeistelPermutation(100, b"secret")
+    with pytest.raises(ValueError):
+        permutation.permute(100)
+
+
+@pytest.mark.anyio
+async def test_hash_allocator_keeps_previous_codes():
+    allocator = HashAllocator(length=9, secret="secret")
+    first = hashlib.sha1(b"http://test.com").hexdigest()[:9]
+    second = hashlib.sha1((first + "secret").encode()).hexdigest()[:9]
+    assert await allocator.allocate(None, "http://test.com") == first
+    assert await allocator.allocate(None, "http://test.com", attempt=1) == second
+
+
+def _mock_counter_redis(exists: bool, incrby_results: list[int]):
+    redis = MagicMock()
+    redis.exists = AsyncMock(return_value=exists)
+    redis.set = AsyncMock()
+    redis.incrby = AsyncMock(side_effect=incrby_results)
+    return redis
+
+
+@pytest.mark.anyio
+async def test_redis_counter_allocator_leases_blocks():
+    allocator = RedisCounterAllocator(length=9, secret="secret", block_size=3)
+    redis = _mock_counter_redis(True, [3, 6])
+    session = AsyncMock()
+    with patch("src.links.allocator.FastAPICache") as mock_fastapi_cache:
+        mock_fastapi_cache.get_backend.return_value.redis = redis
+        codes = [await allocator.allocate(session, "http://test.com") for _ in range(4)]
+    assert redis.incrby.await_count == 2
+    redis.incrby.assert_awaited_with(RedisCounterAllocator.counter_key, 3)
+    redis.set.assert_not_awaited()
+    # граница выданных номеров сохраняется в БД на каждую аренду
+    assert session.execute.await_count == 2
+    assert "setval('short_code_seq'" in str(session.execute.await_args.args[0])
+    assert session.execute.await_args.args[1] == {"end": 6}
+    assert len(set(codes)) == 4
+    assert all(len(code) == 9 and set(code) <= set(BASE62_ALPHABET) for code in codes)
+
+
+@pytest.mark.anyio
+async def test_redis_counter_allocator_seeds_lost_counter_from_db():
+    allocator = RedisCounterAllocator(length=9, secret="secret", block_size=3)
+    redis = _mock_counter_redis(False, [5000 + 300 + 3])
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(scalar_one=MagicMock(return_value=5000))
+    with patch("src.links.allocator.FastAPICache") as mock_fastapi_cache:
+        mock_fastapi_cache.get_backend.return_value.redis = redis
+        await allocator.allocate(session, "http://test.com")
+    redis.set.assert_awaited_once_with(RedisCounterAllocator.counter_key, 5000 + 300, nx=True)
+    assert list(allocator._numbers) == [5301, 5302]
+
+
+def test_allocators_are_abstract():
+    with pytest.raises(TypeError):
+        ShortCodeAllocator()
+    with pytest.raises(TypeError):
+        CounterAllocator(length=9, secret="secret", block_size=3)
+
+
+@pytest.mark.anyio
+async def test_sequence_counter_allocator_leases_blocks():
+    allocator = SequenceCounterAllocator(length=9, secret="secret", block_size=2)
+    session = AsyncMock()
+    session.execute.return_value = MagicMock(
+        scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=[1, 2]))))
+    first = await allocator.allocate(session, "http://test.com")
+    second = await allocator.allocate(session, "http://test.com")
+    session.execute.assert_awaited_once()
+    assert first != second
+    assert "generate_series" in str(session.execute.call_args.args[0])
+
+
+@pytest.mark.anyio
+async def test_counter_allocator_exhausted():
+    allocator = RedisCounterAllocator(length=1, secret="secret", block_size=1)
+    allocator._numbers.append(62)
+    with pytest.raises(ValueError, match="exhausted"):
+        await allocator.allocate(None, "http://test.com")
+
+
+@pytest.mark.parametrize("name, allocator_class", [
+    ("hash", HashAllocator),
+    ("redis-counter", RedisCounterAllocator),
+    ("sequence-counter", SequenceCounterAllocator),
+])
+def test_get_short_code_allocator(name, allocator_class):
+    with patch.object(settings, "SHORT_CODE_ALLOCATOR", name):
+        assert isinstance(get_short_code_allocator(), allocator_class)
+
+
+def test_get_short_code_allocator_unknown():
+    with patch.object(settings, "SHORT_CODE_ALLOCATOR", "unknown"):
+        with pytest.raises(ValueError):
+            get_short_code_allocator()
@@ -0,0 +1,183 @@
+import math
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.bloom import (
+    BloomFilter,
+    MISSING_KEY_PREFIX,
+    settings,
+    short_code_filter,
+    short_code_may_exist,
+    remember_missing_short_code,
+    register_short_code,
+    register_short_codes
+)
+
+
+def _mock_async_redis(execute_result=None):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=execute_result)
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    redis = MagicMock()
+    redis.pipeline.return_value = pipe
+    redis.set = AsyncMock()
+    redis.get = AsyncMock()
+    redis.delete = AsyncMock()
+    return redis, pipe
+
+
+@pytest.fixture
+def filter_enabled():
+    with patch.object(settings, "SHORT_CODE_FILTER_ENABLED", True):
+        yield
+
+
+@pytest.fixture
+def mock_redis():
+    redis, pipe = _mock_async_redis()
+    with patch("src.links.bloom.FastAPICache") as mock_fastapi_cache:
+        mock_fastapi_cache.get_backend.return_value.redis = redis
+        yield redis, pipe
+
+
+def test_bloom_filter_sizing():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    assert bloom.size == math.ceil(-1000 * math.log(0.01) / math.log(2) ** 2)
+    assert bloom.hashes == 7
+    assert bloom.estimated_error_rate(1000) == pytest.approx(0.01, rel=0.1)
+    assert bloom.estimated_error_rate(0) == 0
+
+
+def test_bloom_filter_offsets():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    offsets = bloom.offsets("short")
+    assert offsets == bloom.offsets("short")
+    assert len(offsets) == bloom.hashes
+    assert all(0 <= offset < bloom.size for offset in offsets)
+
+
+def test_bloom_filter_build_uses_redis_bit_order():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    bits, count = bloom.build(["short", "other"])
+    assert count == 2
+    assert len(bits) == (bloom.size + 7) // 8
+    for offset in bloom.offsets("short") + bloom.offsets("other"):
+        assert bits[offset // 8] & (0x80 >> (offset % 8))
+
+
+def test_bloom_filter_rebuild():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    redis = MagicMock()
+    assert bloom.rebuild(redis, iter(["short", "other"])) == 2
+    redis.set.assert_called_once()
+    assert redis.set.call_args.args[0] == "test:rebuild"
+    redis.pipeline.return_value.rename.assert_called_once_with("test:rebuild", "test")
+    redis.pipeline.return_value.set.assert_called_once_with("test:count", 2)
+    redis.pipeline.return_value.execute.assert_called_once()
+
+
+def test_bloom_filter_add_sync():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    redis = MagicMock()
+    bloom.add_sync(redis, ["short"])
+    pipe = redis.pipeline.return_value
+    assert pipe.setbit.call_count == bloom.hashes
+    pipe.incrby.assert_called_once_with("test:count", 1)
+    pipe.execute.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_bloom_filter_add():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    redis, pipe = _mock_async_redis()
+    await bloom.add(redis, "short")
+    for offset in bloom.offsets("short"):
+        pipe.setbit.assert_any_call("test", offset, 1)
+    pipe.incrby.assert_called_once_with("test:count", 1)
+
+
+@pytest.mark.anyio
+async def test_bloom_filter_stats():
+    bloom = BloomFilter(key="test", capacity=1000, error_rate=0.01)
+    redis, _ = _mock_async_redis()
+    redis.get.return_value = b"500"
+    stats = await bloom.stats(redis)
+    assert stats["items"] == 500
+    assert stats["configured_error_rate"] == 0.01
+    assert stats["estimated_error_rate"] < 0.01
+
+
+@pytest.mark.anyio
+async def test_short_code_may_exist_disabled():
+    with patch("src.links.bloom.FastAPICache") as mock_fastapi_cache:
+        assert await short_code_may_exist("short") is True
+        mock_fastapi_cache.get_backend.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_short_code_may_exist_negative_cache(filter_enabled, mock_redis):
+    _, pipe = mock_redis
+    pipe.execute.return_value = [1, 1] + [1] * short_code_filter.hashes
+    assert await short_code_may_exist("short") is False
+    pipe.exists.assert_any_call(MISSING_KEY_PREFIX + "short")
+
+
+@pytest.mark.anyio
+async def test_short_code_may_exist_not_in_filter(filter_enabled, mock_redis):
+    _, pipe = mock_redis
+    pipe.execute.return_value = [0, 1] + [1] * (short_code_filter.hashes - 1) + [0]
+    assert await short_code_may_exist("short") is False
+
+
+@pytest.mark.anyio
+async def test_short_code_may_exist_in_filter(filter_enabled, mock_redis):
+    _, pipe = mock_redis
+    pipe.execute.return_value = [0, 1] + [1] * short_code_filter.hashes
+    assert await short_code_may_exist("short") is True
+
+
+@pytest.mark.anyio
+async def test_short_code_may_exist_filter_not_built(filter_enabled, mock_redis):
+    _, pipe = mock_redis
+    pipe.execute.return_value = [0, 0] + [0] * short_code_filter.hashes
+    assert await short_code_may_exist("short") is True
+
+
+@pytest.mark.anyio
+async def test_remember_missing_short_code(filter_enabled, mock_redis):
+    redis, _ = mock_redis
+    await remember_missing_short_code("short")
+    redis.set.assert_awaited_once_with(MISSING_KEY_PREFIX + "short", 1, ex=settings.NEGATIVE_CACHE_TTL)
+
+
+@pytest.mark.anyio
+async def test_register_short_code(filter_enabled, mock_redis):
+    redis, pipe = mock_redis
+    await register_short_code("short")
+    redis.delete.assert_awaited_once_with(MISSING_KEY_PREFIX + "short")
+    assert pipe.setbit.call_count == short_code_filter.hashes
+
+
+@pytest.mark.anyio
+async def test_register_short_codes(filter_enabled, mock_redis):
+    redis, pipe = mock_redis
+    await register_short_codes(["short", "other"])
+    redis.delete.assert_awaited_once_with(MISSING_KEY_PREFIX + "short", MISSING_KEY_PREFIX + "other")
+    assert pipe.setbit.call_count == 2 * short_code_filter.hashes
+    pipe.incrby.assert_called_once_with(short_code_filter.count_key, 2)
+
+
+@pytest.mark.anyio
+async def test_register_short_codes_empty(filter_enabled, mock_redis):
+    redis, _ = mock_redis
+    await register_short_codes([])
+    redis.delete.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_register_short_code_disabled(mock_redis):
+    redis, _ = mock_redis
+    await register_short_code("short")
+    await remember_missing_short_code("short")
+    redis.delete.assert_not_called()
+    redis.set.assert_not_called()
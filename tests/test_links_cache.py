@@ -0,0 +1,289 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.cache import (
+    LocalCache,
+    INVALIDATION_CHANNEL,
+    queue_invalidation,
+    listen_for_invalidations,
+    redirect_cache,
+    redirect_bucket_key,
+    cache_redirect,
+    cache_redirects,
+    encode_redirect,
+    decode_redirect,
+    redirect_valid_until,
+    redirect_cache_ttl,
+    settings
+)
+
+
+@pytest.fixture
+def mock_redis():
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    pipe.execute = AsyncMock()
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=None)
+    redis.hget = AsyncMock(return_value=None)
+    redis.set = AsyncMock()
+    redis.zscore = AsyncMock(return_value=None)
+    redis.pipeline.return_value = pipe
+    return redis
+
+
+def test_local_cache_get_set():
+    cache = LocalCache(maxsize=2, ttl=30)
+    assert cache.get("short") is None
+    cache.set("short", "http://test.com")
+    assert cache.get("short") == "http://test.com"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+def test_local_cache_lru_eviction():
+    cache = LocalCache(maxsize=2, ttl=30)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_local_cache_ttl_expiration():
+    cache = LocalCache(maxsize=2, ttl=30)
+    with patch("src.links.cache.time.monotonic", return_value=100.0):
+        cache.set("short", "http://test.com")
+    with patch("src.links.cache.time.monotonic", return_value=131.0):
+        assert cache.get("short") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_local_cache_ttl_capped_by_default():
+    cache = LocalCache(maxsize=2, ttl=30)
+    with patch("src.links.cache.time.monotonic", return_value=100.0):
+        cache.set("short", "http://test.com", ttl=3600)
+    with patch("src.links.cache.time.monotonic", return_value=131.0):
+        assert cache.get("short") is None
+
+
+def test_local_cache_disabled():
+    cache = LocalCache(maxsize=0, ttl=30)
+    cache.set("short", "http://test.com")
+    assert cache.get("short") is None
+
+
+def test_local_cache_pop_and_clear():
+    cache = LocalCache(maxsize=2, ttl=30)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.pop("a")
+    cache.pop("missing")
+    assert cache.get("a") is None
+    cache.clear()
+    assert cache.get("b") is None
+
+
+def test_local_cache_skips_value_read_before_invalidation():
+    cache = LocalCache(maxsize=2, ttl=30)
+    version = cache.version()
+    # пока шел запрос в redis/БД, пришла инвалидация: прочитанный url уже устарел
+    cache.pop("short")
+    cache.set("short", "http://old.com", version=version)
+    assert cache.get("short") is None
+    cache.set("other", "http://other.com", version=version)
+    assert cache.get("other") == "http://other.com"
+    cache.set("short", "http://new.com", version=cache.version())
+    assert cache.get("short") == "http://new.com"
+
+
+def test_local_cache_version_of_forgotten_keys():
+    cache = LocalCache(maxsize=1, ttl=30)
+    version = cache.version()
+    cache.pop("a")
+    cache.pop("b")
+    # сведения о сбросе "a" вытеснены: запись пропускается на всякий случай
+    cache.set("a", "1", version=version)
+    assert cache.get("a") is None
+    version = cache.version()
+    cache.clear()
+    cache.set("b", "2", version=version)
+    assert cache.get("b") is None
+
+
+def test_queue_invalidation():
+    pipe = MagicMock()
+    redirect_cache.set("short", "http://test.com")
+    queue_invalidation(pipe, "short")
+    assert redirect_cache.get("short") is None
+    pipe.hdel.assert_called_once_with(redirect_bucket_key("short"), "short")
+    pipe.publish.assert_called_once_with(INVALIDATION_CHANNEL, "short")
+
+
+def test_redirect_bucket_key():
+    with patch.object(settings, "REDIRECT_CACHE_BUCKETS", 16):
+        keys = {redirect_bucket_key(f"code{i}") for i in range(1000)}
+        assert redirect_bucket_key("short") == redirect_bucket_key("short")
+    assert keys == {f"r:{bucket:x}" for bucket in range(16)}
+
+
+def test_encode_redirect():
+    assert encode_redirect("http://test.com/a|b", 1735689600) == "1735689600|http://test.com/a|b"
+
+
+def test_decode_redirect():
+    with patch("src.links.cache.time.time", return_value=1735689500):
+        assert decode_redirect("1735689600|http://test.com/a|b") == ("http://test.com/a|b", 100)
+    # записи прежних форматов
+    assert decode_redirect("|http://test.com") == ("http://test.com", None)
+    assert decode_redirect("http://test.com/a|b") == ("http://test.com/a|b", None)
+
+
+def test_redirect_cache_ttl_scales_with_clicks():
+    with patch.object(settings, "REDIRECT_CACHE_MIN_TTL", 60), \
+         patch.object(settings, "REDIRECT_CACHE_TTL", 3600), \
+         patch.object(settings, "REDIRECT_CACHE_TTL_PER_CLICK", 30):
+        assert redirect_cache_ttl(None) == 60
+        assert redirect_cache_ttl(None, clicks=10) == 360
+        assert redirect_cache_ttl(None, clicks=1000) == 3600
+        assert redirect_cache_ttl(datetime.utcnow() + timedelta(days=1), clicks=1000) == 3600
+
+
+def test_redirect_cache_ttl_capped_by_expiry():
+    assert 0 < redirect_cache_ttl(datetime.utcnow() + timedelta(seconds=30), clicks=1000) <= 30
+    assert redirect_cache_ttl(datetime.utcnow() - timedelta(minutes=1)) <= 0
+
+
+def test_redirect_valid_until():
+    with patch("src.links.cache.time.time", return_value=1735689000):
+        assert redirect_valid_until(None, 60) == 1735689060
+        assert redirect_valid_until(datetime(2025, 1, 1), 3600) == 1735689600
+
+
+@pytest.mark.anyio
+async def test_cache_redirect_sets_bucket_ttl_once(mock_redis):
+    pipe = mock_redis.pipeline.return_value
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "hash"), \
+         patch.object(settings, "REDIRECT_CACHE_FIELD_EXPIRY", False), \
+         patch("src.links.cache.time.time", return_value=1000):
+        assert await cache_redirect(mock_redis, "short", "http://test.com") == settings.REDIRECT_CACHE_MIN_TTL
+    key = redirect_bucket_key("short")
+    pipe.hset.assert_called_once_with(key, "short", f"{1000 + settings.REDIRECT_CACHE_MIN_TTL}|http://test.com")
+    pipe.expire.assert_called_once_with(key, settings.REDIRECT_CACHE_TTL, nx=True)
+    pipe.execute.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_cache_redirect_field_expiry(mock_redis):
+    pipe = mock_redis.pipeline.return_value
+    mock_redis.zscore.return_value = 10.0
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "hash"), \
+         patch.object(settings, "REDIRECT_CACHE_FIELD_EXPIRY", True):
+        await cache_redirect(mock_redis, "short", "http://test.com")
+    key = redirect_bucket_key("short")
+    mock_redis.zscore.assert_awaited_once_with("links:hot", "short")
+    pipe.execute_command.assert_called_once_with(
+        "HEXPIRE", key, redirect_cache_ttl(None, 10.0), "FIELDS", 1, "short")
+    pipe.expire.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_cache_redirect_keys_layout(mock_redis):
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "keys"), \
+         patch("src.links.cache.time.time", return_value=1000):
+        await cache_redirect(mock_redis, "short", "http://test.com")
+    mock_redis.set.assert_awaited_once_with(
+        "src.links.router:redirect_link:0:short",
+        f"{1000 + settings.REDIRECT_CACHE_MIN_TTL}|http://test.com",
+        ex=settings.REDIRECT_CACHE_MIN_TTL
+    )
+    mock_redis.pipeline.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_cache_redirect_keys_layout_expires_with_link(mock_redis):
+    expires_at = datetime.utcnow() + timedelta(seconds=30)
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "keys"):
+        await cache_redirect(mock_redis, "short", "http://test.com", expires_at)
+    assert 0 < mock_redis.set.call_args.kwargs["ex"] <= 30
+
+
+@pytest.mark.anyio
+async def test_cache_redirect_skips_expired_link(mock_redis):
+    assert await cache_redirect(
+        mock_redis, "short", "http://test.com", datetime.utcnow() - timedelta(minutes=1)) == 0
+    mock_redis.pipeline.assert_not_called()
+    mock_redis.set.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_cache_redirects_one_pipeline(mock_redis):
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.side_effect = [[10.0, None, None], None]
+    links = [
+        ("short1", "http://one.com", None),
+        ("short2", "http://two.com", datetime.utcnow() - timedelta(minutes=1)),
+        ("short3", "http://three.com", None),
+    ]
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "hash"), \
+         patch.object(settings, "REDIRECT_CACHE_FIELD_EXPIRY", False):
+        assert await cache_redirects(mock_redis, links) == {
+            "short1": redirect_cache_ttl(None, 10.0),
+            "short3": settings.REDIRECT_CACHE_MIN_TTL,
+        }
+    assert [call.args[1] for call in pipe.zscore.call_args_list] == ["short1", "short2", "short3"]
+    assert [call.args[1] for call in pipe.hset.call_args_list] == ["short1", "short3"]
+    assert pipe.execute.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_cache_redirects_keys_layout(mock_redis):
+    pipe = mock_redis.pipeline.return_value
+    pipe.execute.side_effect = [[None, b"2", None, None], None]
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "keys"), \
+         patch("src.links.cache.time.time", return_value=1000):
+        await cache_redirects(mock_redis, [("short1", "http://one.com", None), ("short2", "http://two.com", None)])
+    ttl = settings.REDIRECT_CACHE_MIN_TTL
+    pipe.set.assert_any_call("src.links.router:redirect_link:2:short1", f"{1000 + ttl}|http://one.com", ex=ttl)
+    pipe.set.assert_any_call("src.links.router:redirect_link:0:short2", f"{1000 + ttl}|http://two.com", ex=ttl)
+
+
+@pytest.mark.anyio
+async def test_cache_redirects_nothing_to_write(mock_redis):
+    assert await cache_redirects(mock_redis, []) == {}
+    mock_redis.pipeline.assert_not_called()
+
+
+@pytest.mark.anyio
+async def test_listen_for_invalidations():
+    redirect_cache.set("short", "http://test.com")
+    listened = asyncio.Event()
+
+    async def listen():
+        yield {"type": "subscribe", "data": 1}
+        redirect_cache.set("short", "http://test.com")
+        redirect_cache.set("other", "http://other.com")
+        yield {"type": "message", "data": b"short"}
+        listened.set()
+        await asyncio.Event().wait()
+
+    pubsub = MagicMock()
+    pubsub.subscribe = AsyncMock()
+    pubsub.listen = listen
+    redis = MagicMock()
+    redis.pubsub.return_value = pubsub
+
+    task = asyncio.create_task(listen_for_invalidations(redis))
+    await asyncio.wait_for(listened.wait(), timeout=1)
+    task.cancel()
+
+    pubsub.subscribe.assert_awaited_once_with(INVALIDATION_CHANNEL)
+    assert redirect_cache.get("short") is None
+    assert redirect_cache.get("other") == "http://other.com"
+    redirect_cache.clear()
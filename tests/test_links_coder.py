@@ -0,0 +1,69 @@
+import zlib
+from datetime import datetime
+from unittest.mock import patch
+
+import orjson
+from fastapi_cache.coder import JsonCoder
+
+from src.links.coder import OrjsonCoder, ZLIB_MARKER, resolve_compression
+from src.links.schemes import GetAllLinksResponse, GetLinkResponse, GetLinkShortResponse
+
+
+def _all_links(count: int) -> GetAllLinksResponse:
+    return GetAllLinksResponse(
+        links=[
+            GetLinkShortResponse(original_url=f"http://example.com/{i}", short_url=f"http://test/links/code{i}")
+            for i in range(count)
+        ],
+        next_after=count
+    )
+
+
+def test_encode_small_value_is_plain_json():
+    response = GetLinkResponse(
+        original_url="http://test.com",
+        short_url="http://test/links/short",
+        expires_at=None,
+        created_at=datetime(2025, 1, 1, 12, 30)
+    )
+    data = OrjsonCoder.encode(response)
+    assert data.startswith(b"{")
+    assert OrjsonCoder.decode(data) == {
+        "original_url": "http://test.com",
+        "short_url": "http://test/links/short",
+        "expires_at": None,
+        "created_at": "2025-01-01T12:30:00"
+    }
+
+
+def test_encode_large_value_is_compressed():
+    response = _all_links(100)
+    with patch.object(OrjsonCoder, "compression", "zlib"), patch.object(OrjsonCoder, "min_size", 1024):
+        data = OrjsonCoder.encode(response)
+    assert data.startswith(ZLIB_MARKER)
+    assert len(data) < len(orjson.dumps(response.model_dump()))
+    assert GetAllLinksResponse.model_validate(OrjsonCoder.decode_as_type(data, type_=GetAllLinksResponse)) == response
+
+
+def test_encode_without_compression():
+    with patch.object(OrjsonCoder, "compression", None):
+        data = OrjsonCoder.encode(_all_links(100))
+    assert data.startswith(b"{")
+
+
+def test_decode_reads_json_coder_entries():
+    response = _all_links(3)
+    assert OrjsonCoder.decode(JsonCoder.encode(response)) == response.model_dump()
+
+
+def test_decode_compressed_entry_regardless_of_settings():
+    data = ZLIB_MARKER + zlib.compress(b'{"a": 1}')
+    with patch.object(OrjsonCoder, "compression", None):
+        assert OrjsonCoder.decode(data) == {"a": 1}
+
+
+def test_resolve_compression():
+    assert resolve_compression("none") is None
+    assert resolve_compression("zlib") == "zlib"
+    with patch("src.links.coder.CODECS", {"zlib": None}):
+        assert resolve_compression("zstd") == "zlib"
@@ -0,0 +1,159 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import ANY, AsyncMock, MagicMock, patch
+from redis.exceptions import ResponseError
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+from src.links.models import Link
+from src.links.counters import (
+    PENDING_CLICKS_KEY,
+    PROCESSING_CLICKS_KEY,
+    PROCESSING_FLUSH_ID_KEY,
+    HOT_LINKS_KEY,
+    trim_hot_links,
+    decay_hot_links,
+    get_pending_clicks,
+    take_pending_clicks,
+    release_pending_clicks,
+    processing_flush_id,
+    build_claim_flush_statement,
+    build_flush_statement,
+    build_sharded_flush_statements,
+    build_compact_chunk_statement,
+    total_redirect_counter
+)
+
+
+def _mock_async_redis(execute_result=None):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=execute_result)
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    redis = MagicMock()
+    redis.pipeline.return_value = pipe
+    return redis, pipe
+
+
+@pytest.mark.anyio
+async def test_get_pending_clicks_merges_pending_and_processing():
+    redis, pipe = _mock_async_redis([[b"2", b"1700000000"], [b"3", b"1700000060"]])
+    clicks, last_used = await get_pending_clicks(redis, "short")
+    assert clicks == 5
+    assert last_used == datetime.utcfromtimestamp(1700000060)
+    pipe.hmget.assert_any_call(PENDING_CLICKS_KEY, "c:short", "t:short")
+    pipe.hmget.assert_any_call(PROCESSING_CLICKS_KEY, "c:short", "t:short")
+
+
+@pytest.mark.anyio
+async def test_get_pending_clicks_empty():
+    redis, _ = _mock_async_redis([[None, None], [None, None]])
+    assert await get_pending_clicks(redis, "short") == (0, None)
+
+
+def test_trim_hot_links():
+    redis = MagicMock()
+    trim_hot_links(redis, 100)
+    redis.zremrangebyrank.assert_called_once_with(HOT_LINKS_KEY, 0, -101)
+
+
+def test_decay_hot_links():
+    redis = MagicMock()
+    decay_hot_links(redis, 0.5)
+    redis.zunionstore.assert_called_once_with(HOT_LINKS_KEY, {HOT_LINKS_KEY: 0.5})
+
+
+def test_take_pending_clicks():
+    redis = MagicMock()
+    redis.exists.return_value = 0
+    redis.hgetall.return_value = {
+        b"c:short": b"3",
+        b"t:short": b"1700000000",
+        b"c:other": b"1",
+    }
+    pending = take_pending_clicks(redis)
+    redis.rename.assert_called_once_with(PENDING_CLICKS_KEY, PROCESSING_CLICKS_KEY)
+    assert pending == {
+        "short": (3, datetime.utcfromtimestamp(1700000000)),
+        "other": (1, None),
+    }
+
+
+def test_take_pending_clicks_resumes_unfinished_flush():
+    redis = MagicMock()
+    redis.exists.return_value = 1
+    redis.hgetall.return_value = {b"c:short": b"1"}
+    assert take_pending_clicks(redis) == {"short": (1, None)}
+    redis.rename.assert_not_called()
+
+
+def test_take_pending_clicks_nothing_pending():
+    redis = MagicMock()
+    redis.exists.return_value = 0
+    redis.rename.side_effect = ResponseError("no such key")
+    assert take_pending_clicks(redis) == {}
+    redis.hgetall.assert_not_called()
+
+
+def test_release_pending_clicks():
+    redis = MagicMock()
+    release_pending_clicks(redis)
+    redis.delete.assert_called_once_with(PROCESSING_CLICKS_KEY, PROCESSING_FLUSH_ID_KEY)
+
+
+def test_processing_flush_id_is_kept_until_release():
+    redis = MagicMock()
+    redis.get.return_value = b"earlier"
+    assert processing_flush_id(redis) == "earlier"
+    redis.set.assert_called_once_with(PROCESSING_FLUSH_ID_KEY, ANY, nx=True)
+
+
+def test_build_claim_flush_statement():
+    stmt = build_claim_flush_statement("flush", datetime(2025, 1, 1))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("INSERT INTO applied_click_flushes (flush_id, applied_at)")
+    assert sql.endswith("ON CONFLICT (flush_id) DO NOTHING RETURNING applied_click_flushes.flush_id")
+
+
+def test_build_flush_statement():
+    stmt = build_flush_statement([("short", 3, datetime(2025, 1, 1)), ("other", 1, None)], timedelta(days=5))
+    sql = str(stmt.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("UPDATE links SET redirect_counter=(links.redirect_counter + pending.clicks)")
+    assert "FROM (VALUES" in sql
+    assert "WHERE links.short_code = pending.short_code" in sql
+    assert "delete_after=CASE WHEN (links.expires_at IS NULL AND pending.last_used IS NOT NULL) " \
+           "THEN greatest(links.delete_after, pending.last_used + " in sql
+
+
+def test_build_sharded_flush_statements():
+    with patch("src.links.counters.random.randrange", return_value=5):
+        increment, touch = build_sharded_flush_statements(
+            [("short", 3, datetime(2025, 1, 1)), ("other", 1, None)], timedelta(days=5), 8)
+    sql = str(increment.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("INSERT INTO link_click_counters (link_id, shard, clicks) SELECT links.id, pending.shard")
+    assert "ON CONFLICT (link_id, shard) DO UPDATE SET clicks = (link_click_counters.clicks + excluded.clicks)" in sql
+    assert increment.compile(dialect=postgresql.dialect()).params["param_2"] == 5
+    sql = str(touch.compile(dialect=postgresql.dialect()))
+    assert "redirect_counter" not in sql
+    assert "updated_at=links.updated_at" in sql
+    assert "(links.last_used_at IS NULL OR links.last_used_at < pending.last_used)" in sql
+    # в обновление строки links попадают только ссылки с временем перехода
+    assert len(touch.compile().params) == 4
+
+
+def test_build_sharded_flush_statements_without_last_used():
+    statements = build_sharded_flush_statements([("short", 3, None)], timedelta(days=5), 8)
+    assert len(statements) == 1
+
+
+def test_build_compact_chunk_statement():
+    sql = str(build_compact_chunk_statement(100).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("WITH moved AS \n(DELETE FROM link_click_counters")
+    assert "FOR UPDATE SKIP LOCKED) RETURNING link_click_counters.link_id, link_click_counters.clicks" in sql
+    assert "UPDATE links SET redirect_counter=(links.redirect_counter + totals.clicks)" in sql
+    assert "GROUP BY moved.link_id" in sql
+
+
+def test_total_redirect_counter_sums_shards():
+    sql = str(select(Link.short_code, total_redirect_counter()).compile(dialect=postgresql.dialect()))
+    assert "links.redirect_counter + (SELECT coalesce(sum(link_click_counters.clicks)" in sql
+    assert "WHERE link_click_counters.link_id = links.id) AS redirect_counter" in sql
@@ -0,0 +1,22 @@
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+from src.links.expiry import compute_delete_after, default_delete_after, link_ttl
+
+
+def test_compute_delete_after_uses_expiry_date():
+    expires_at = datetime(2030, 1, 1)
+    assert compute_delete_after(expires_at, datetime(2026, 1, 1)) == expires_at
+
+
+def test_compute_delete_after_uses_ttl():
+    with patch("src.links.expiry.Settings") as mock_settings:
+        mock_settings.return_value.LINK_TTL_IN_DAYS = 5
+        assert link_ttl() == timedelta(days=5)
+        assert compute_delete_after(None, datetime(2026, 1, 1)) == datetime(2026, 1, 6)
+
+
+def test_default_delete_after():
+    context = MagicMock()
+    context.get_current_parameters.return_value = {"expires_at": None}
+    with patch("src.links.expiry.utcnow_minute", return_value=datetime(2026, 1, 1)):
+        assert default_delete_after(context) == datetime(2026, 1, 1) + link_ttl()
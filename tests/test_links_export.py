@@ -0,0 +1,41 @@
+import gzip
+import pytest
+from datetime import datetime
+from src.links.export import STATISTICS_HEADER, iter_statistics_csv, gzip_chunks
+from src.links.models import Link
+
+
+async def _chunks(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+async def _collect(iterator):
+    return [chunk async for chunk in iterator]
+
+
+@pytest.mark.anyio
+async def test_iter_statistics_csv():
+    link = Link(short_code="short", long_url="http://test.com", created_at=datetime(2026, 1, 1, 12, 30),
+                expires_at=None, redirect_counter=3, last_used_at=None)
+    chunks = await _collect(iter_statistics_csv(_chunks([link], [link]), "http://host"))
+    assert chunks[0] == ",".join(STATISTICS_HEADER) + "\r\n"
+    assert chunks[1] == "http://host/links/short,http://test.com,2026-01-01 12:30:00,N/A,3,Never\r\n"
+    assert chunks[2] == chunks[1]
+
+
+@pytest.mark.anyio
+async def test_iter_statistics_csv_header_before_rows():
+    async def never_ready():
+        raise AssertionError("query must not run before the header is sent")
+        yield
+
+    iterator = iter_statistics_csv(never_ready(), "http://host")
+    assert await iterator.__anext__() == ",".join(STATISTICS_HEADER) + "\r\n"
+
+
+@pytest.mark.anyio
+async def test_gzip_chunks():
+    compressed = await _collect(gzip_chunks(_chunks("first,", "second")))
+    assert len(compressed) == 3
+    assert gzip.decompress(b"".join(compressed)) == b"first,second"
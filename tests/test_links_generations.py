@@ -0,0 +1,38 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.links.generations import (
+    GENERATION_KEY_PREFIX,
+    GENERATION_TTL,
+    get_generation,
+    link_namespaces,
+    queue_generation_bumps,
+    url_namespace
+)
+
+
+def test_url_namespace_ignores_scheme_and_equivalent_spelling():
+    assert url_namespace("http://test.com") == url_namespace("HTTPS://Test.com:443/")
+    assert url_namespace("test.com") == url_namespace("https://test.com")
+    assert url_namespace("http://test.com") != url_namespace("http://other.com")
+
+
+def test_link_namespaces():
+    assert link_namespaces(["short", None], ["http://test.com", None, "https://test.com"]) == [
+        "link:short", url_namespace("http://test.com"), "all"
+    ]
+
+
+@pytest.mark.anyio
+async def test_get_generation():
+    redis = MagicMock()
+    redis.get = AsyncMock(side_effect=[None, b"4"])
+    assert await get_generation(redis, "all") == 0
+    assert await get_generation(redis, "all") == 4
+    redis.get.assert_awaited_with(GENERATION_KEY_PREFIX + "all")
+
+
+def test_queue_generation_bumps():
+    pipe = MagicMock()
+    queue_generation_bumps(pipe, ["link:short", "all"])
+    pipe.incr.assert_any_call(GENERATION_KEY_PREFIX + "link:short")
+    pipe.expire.assert_any_call(GENERATION_KEY_PREFIX + "all", GENERATION_TTL)
@@ -0,0 +1,190 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.expiry import link_ttl
+from src.links.urls import long_url_digest
+from src.links.importer import (
+    IMPORT_COLUMNS,
+    MERGE_STAGING_TABLE,
+    SELECT_EXISTING_DIGESTS,
+    TRUNCATE_STAGING_TABLE,
+    iter_rows,
+    validate_row,
+    import_links
+)
+
+EXPIRES_AT = (datetime.utcnow() + timedelta(days=30)).replace(second=0, microsecond=0)
+NOW = datetime(2026, 1, 1)
+
+
+def _mock_engine(imported_batches, existing_digests=()):
+    driver_connection = MagicMock()
+    driver_connection.copy_records_to_table = AsyncMock()
+
+    merge_results = iter(imported_batches)
+
+    async def execute(statement, params=None):
+        result = MagicMock()
+        if statement is MERGE_STAGING_TABLE:
+            result.all.return_value = [(code, long_url_digest(url)) for code, url in next(merge_results)]
+        elif statement is SELECT_EXISTING_DIGESTS:
+            result.scalars.return_value.all.return_value = [
+                digest for digest in params["digests"] if digest in existing_digests
+            ]
+        return result
+
+    conn = MagicMock()
+    conn.execute = AsyncMock(side_effect=execute)
+    conn.commit = AsyncMock()
+    conn.get_raw_connection = AsyncMock(return_value=MagicMock(driver_connection=driver_connection))
+    engine = MagicMock()
+    engine.connect.return_value.__aenter__ = AsyncMock(return_value=conn)
+    engine.connect.return_value.__aexit__ = AsyncMock(return_value=None)
+    return engine, conn, driver_connection
+
+
+def test_iter_rows_csv():
+    lines = [
+        "original_url,custom_alias,expires_at\n",
+        "google.com,google,\n",
+        "yahoo.com,,\n",
+    ]
+    rows = list(iter_rows(lines, "csv"))
+    assert rows == [
+        {"original_url": "google.com", "custom_alias": "google", "expires_at": ""},
+        {"original_url": "yahoo.com", "custom_alias": "", "expires_at": ""},
+    ]
+
+
+def test_iter_rows_jsonl():
+    lines = [
+        '{"original_url": "google.com"}\n',
+        "\n",
+        "{broken\n",
+        "[1, 2]\n",
+    ]
+    assert list(iter_rows(lines, "jsonl")) == [{"original_url": "google.com"}, None, None]
+
+
+def test_validate_row():
+    model = validate_row({"original_url": "google.com", "custom_alias": "", "expires_at": str(EXPIRES_AT)})
+    assert model.original_url == "http://google.com"
+    assert model.custom_alias is None
+    assert model.expires_at == EXPIRES_AT
+
+
+def test_validate_row_aware_expires_at():
+    model = validate_row({"original_url": "google.com", "expires_at": "2099-01-01T03:00:00+03:00"})
+    assert model.expires_at == datetime(2099, 1, 1)
+
+
+@pytest.mark.parametrize("row", [
+    None,
+    {"custom_alias": "google"},
+    {"original_url": "invalidurl"},
+    {"original_url": "google.com", "custom_alias": "abc"},
+    {"original_url": "google.com", "expires_at": "2020-01-01T00:00:00"},
+    {"original_url": "google.com", "expires_at": "2020-01-01T00:00:00Z"},
+])
+def test_validate_row_invalid(row):
+    assert validate_row(row) is None
+
+
+@pytest.mark.anyio
+async def test_import_links_in_batches():
+    engine, conn, driver_connection = _mock_engine(
+        [[("google", "http://google.com")], [("code2", "http://bing.com")]],
+        existing_digests={long_url_digest("http://yahoo.com")}
+    )
+    lines = [
+        '{"original_url": "google.com", "custom_alias": "google"}\n',
+        '{"original_url": "invalidurl", "expires_at": "2020-01-01T00:00:00Z"}\n',
+        '{"original_url": "yahoo.com", "custom_alias": "yahoo"}\n',
+        f'{{"original_url": "bing.com", "expires_at": "{EXPIRES_AT.isoformat()}"}}\n',
+    ]
+    with patch("src.links.importer.short_code_allocator") as mock_allocator, \
+         patch("src.links.importer.utcnow_minute", return_value=NOW), \
+         patch("src.links.importer.register_short_codes", new=AsyncMock()) as mock_register, \
+         patch("src.links.importer.invalidate_links", new=AsyncMock()) as mock_invalidate:
+        mock_allocator.allocate = AsyncMock(return_value="code2")
+        stats = await import_links(engine, lines, "jsonl", batch_size=2)
+
+    assert (stats.total, stats.imported, stats.skipped, stats.invalid) == (4, 2, 1, 1)
+    assert stats.invalid_rows == [2]
+    assert driver_connection.copy_records_to_table.await_count == 2
+    driver_connection.copy_records_to_table.assert_any_await(
+        "links_import",
+        records=[
+            ("google", "http://google.com", long_url_digest("http://google.com"), None, NOW + link_ttl()),
+            ("yahoo", "http://yahoo.com", long_url_digest("http://yahoo.com"), None, NOW + link_ttl())
+        ],
+        columns=IMPORT_COLUMNS
+    )
+    driver_connection.copy_records_to_table.assert_any_await(
+        "links_import",
+        records=[("code2", "http://bing.com", long_url_digest("http://bing.com"), EXPIRES_AT, EXPIRES_AT)],
+        columns=IMPORT_COLUMNS
+    )
+    mock_allocator.allocate.assert_awaited_once_with(conn, "http://bing.com")
+    conn.execute.assert_any_await(TRUNCATE_STAGING_TABLE)
+    assert conn.commit.await_count == 3
+    mock_register.assert_any_await(["google"])
+    mock_register.assert_any_await(["code2"])
+    assert mock_invalidate.await_count == 2
+
+
+@pytest.mark.anyio
+async def test_import_links_empty_file():
+    engine, _, driver_connection = _mock_engine([])
+    stats = await import_links(engine, ["original_url,custom_alias,expires_at\n"], "csv")
+    assert stats.total == 0
+    driver_connection.copy_records_to_table.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_import_links_reallocates_colliding_codes():
+    # hash-код нового URL занят другой ссылкой: выделяем код со следующей попыткой
+    engine, conn, driver_connection = _mock_engine(
+        [[("taken", "http://google.com")], [("free", "http://yahoo.com")]],
+        existing_digests={long_url_digest("http://google.com")}
+    )
+    lines = [
+        '{"original_url": "google.com"}\n',
+        '{"original_url": "google.com", "custom_alias": "google"}\n',
+        '{"original_url": "yahoo.com"}\n',
+    ]
+    with patch("src.links.importer.short_code_allocator") as mock_allocator, \
+         patch("src.links.importer.utcnow_minute", return_value=NOW), \
+         patch("src.links.importer.register_short_codes", new=AsyncMock()) as mock_register, \
+         patch("src.links.importer.invalidate_links", new=AsyncMock()):
+        mock_allocator.allocate = AsyncMock(side_effect=["taken", "taken", "free"])
+        stats = await import_links(engine, lines, "jsonl")
+
+    assert (stats.total, stats.imported, stats.skipped, stats.invalid) == (3, 2, 1, 0)
+    mock_allocator.allocate.assert_awaited_with(conn, "http://yahoo.com", 1)
+    driver_connection.copy_records_to_table.assert_awaited_with(
+        "links_import",
+        records=[("free", "http://yahoo.com", long_url_digest("http://yahoo.com"), None, NOW + link_ttl())],
+        columns=IMPORT_COLUMNS
+    )
+    assert conn.commit.await_count == 2
+    mock_register.assert_awaited_once_with(["taken", "free"])
+
+
+@pytest.mark.anyio
+async def test_import_links_gives_up_after_code_generation_attempts():
+    engine, _, driver_connection = _mock_engine([[], [], []])
+    lines = ['{"original_url": "google.com"}\n', '{"original_url": "yahoo.com", "custom_alias": "taken"}\n']
+    with patch("src.links.importer.short_code_allocator") as mock_allocator, \
+         patch("src.links.importer.Settings") as mock_settings, \
+         patch("src.links.importer.register_short_codes", new=AsyncMock()), \
+         patch("src.links.importer.invalidate_links", new=AsyncMock()):
+        mock_settings.return_value.IMPORT_BATCH_SIZE = 100
+        mock_settings.return_value.CODE_GENERATION_ATTEMPTS = 2
+        mock_allocator.allocate = AsyncMock(return_value="taken")
+        stats = await import_links(engine, lines, "jsonl")
+
+    assert (stats.imported, stats.skipped, stats.invalid) == (0, 0, 2)
+    assert sorted(stats.invalid_rows) == [1, 2]
+    assert mock_allocator.allocate.await_count == 3
+    assert driver_connection.copy_records_to_table.await_count == 3
@@ -0,0 +1,55 @@
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock, patch
+from redis.exceptions import NoScriptError
+from src.links.cache import redirect_bucket_key
+from src.links.counters import HOT_LINKS_KEY, PENDING_CLICKS_KEY
+from src.links.redirects import REDIRECT_SCRIPT, REDIRECT_SCRIPT_SHA, ResolvedRedirect, resolve_redirect, settings
+
+KEYS = [redirect_bucket_key("short"), PENDING_CLICKS_KEY, HOT_LINKS_KEY, "links:gen:link:short"]
+
+
+@pytest.fixture
+def mock_redis():
+    redis = MagicMock()
+    redis.evalsha = AsyncMock(return_value=b"http://test.com")
+    redis.eval = AsyncMock(return_value=b"http://test.com")
+    return redis
+
+
+@pytest.mark.anyio
+async def test_resolve_redirect_single_evalsha(mock_redis):
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "hash"), \
+         patch("src.links.redirects.datetime") as mock_datetime:
+        mock_datetime.utcnow.return_value = datetime(2025, 1, 1)
+        assert await resolve_redirect(mock_redis, "short", count_click=True) == ResolvedRedirect("http://test.com", None)
+    mock_redis.evalsha.assert_awaited_once_with(REDIRECT_SCRIPT_SHA, 4, *KEYS, "short", 1735689600, 1, 1, "", 1)
+    mock_redis.eval.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_resolve_redirect_keys_layout(mock_redis):
+    with patch.object(settings, "REDIRECT_CACHE_LAYOUT", "keys"):
+        await resolve_redirect(mock_redis, "short", lookup=False, rank=False)
+    args = mock_redis.evalsha.call_args.args
+    assert args[-4:] == (0, 0, "src.links.router:redirect_link", 0)
+
+
+@pytest.mark.anyio
+async def test_resolve_redirect_miss(mock_redis):
+    mock_redis.evalsha.return_value = None
+    assert await resolve_redirect(mock_redis, "short") is None
+
+
+@pytest.mark.anyio
+async def test_resolve_redirect_loads_script_after_restart(mock_redis):
+    mock_redis.evalsha.side_effect = NoScriptError("NOSCRIPT")
+    assert (await resolve_redirect(mock_redis, "short")).long_url == "http://test.com"
+    assert mock_redis.eval.call_args.args[:2] == (REDIRECT_SCRIPT, 4)
+
+
+@pytest.mark.anyio
+async def test_resolve_redirect_returns_remaining_ttl(mock_redis):
+    mock_redis.evalsha.return_value = b"1000|http://test.com"
+    with patch("src.links.cache.time.time", return_value=940):
+        assert await resolve_redirect(mock_redis, "short") == ResolvedRedirect("http://test.com", 60)
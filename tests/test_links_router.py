@@ -1,12 +1,17 @@
+import json
 import uuid
 import pytest
+from datetime import datetime, timedelta
 from src.main import app
 from fastapi import status
-from sqlalchemy import StaticPool
+from sqlalchemy import StaticPool, event
 from fastapi_cache import FastAPICache
-from unittest.mock import patch, AsyncMock
+from unittest.mock import ANY, patch, AsyncMock, MagicMock
 from httpx import ASGITransport, AsyncClient
-from src.database import DbBase, get_async_session
+from src.database import DbBase, get_async_session, get_async_session_maker
+from src.links.cache import legacy_redirect_key, redirect_bucket_key, redirect_cache
+from src.links.router import settings, redirect_link, link_stats, LINK_STATS_CACHE_TTL
+from src.links.utils import get_link_cache_key_builder
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -42,6 +47,19 @@ async def client(async_session):
     mock_cache_backend.get.return_value = None
     mock_cache_backend.set.return_value = None
     mock_cache_backend.delete.return_value = None
+    mock_cache_pipeline = MagicMock()
+    mock_cache_pipeline.__aenter__ = AsyncMock(return_value=mock_cache_pipeline)
+    mock_cache_pipeline.__aexit__ = AsyncMock(return_value=None)
+    mock_cache_pipeline.execute = AsyncMock()
+    mock_cache_backend.redis = MagicMock()
+    mock_cache_backend.redis.get = AsyncMock(return_value=None)
+    mock_cache_backend.redis.hget = AsyncMock(return_value=None)
+    mock_cache_backend.redis.evalsha = AsyncMock(return_value=None)
+    mock_cache_backend.redis.hgetall = AsyncMock(return_value={})
+    mock_cache_backend.redis.zscore = AsyncMock(return_value=None)
+    mock_cache_backend.redis.lock.return_value.acquire = AsyncMock(return_value=True)
+    mock_cache_backend.redis.lock.return_value.release = AsyncMock()
+    mock_cache_backend.redis.pipeline.return_value = mock_cache_pipeline
     with patch('src.auth.backend.redis', mock_redis), \
          patch('src.links.utils.FastAPICache.get_backend', return_value=mock_cache_backend):
         FastAPICache.init(backend=mock_cache_backend, prefix="test-cache")
@@ -51,6 +69,7 @@ async def client(async_session):
                 yield session
 
         app.dependency_overrides[get_async_session] = override_get_async_session
+        app.dependency_overrides[get_async_session_maker] = lambda: async_session
         async with AsyncClient(
             transport=ASGITransport(app=app),
             base_url="http://test",
@@ -92,7 +111,7 @@ def _get_link_data():
     return {
         "original_url": f"http://google.com/search?q={uuid.uuid4()}",
         "custom_alias": f"{uuid.uuid4().hex[:16]}",
-        "expires_at": "2026-01-01T00:00:00"
+        "expires_at": (datetime.utcnow() + timedelta(days=30)).replace(microsecond=0).isoformat()
     }
 
 
@@ -206,6 +225,17 @@ async def test_create_short_link(client, auth_cookies):
     assert "links/" in response.json()["link"]
 
 
+@pytest.mark.asyncio
+async def test_create_short_link_seeds_stats_cache(client, auth_cookies):
+    response = await client.post("/links/shorten", json=_get_link_data(), cookies=auth_cookies)
+    short_code = response.json()["link"].split("/")[-1]
+    key = await get_link_cache_key_builder(func=link_stats, short_code=short_code)
+    pipe = FastAPICache.get_backend().redis.pipeline.return_value
+    pipe.hset.assert_any_call(key, mapping=ANY)
+    pipe.expire.assert_any_call(key, LINK_STATS_CACHE_TTL + settings.STATS_CACHE_MAX_STALE)
+    pipe.hset.assert_any_call(redirect_bucket_key(short_code), short_code, ANY)
+
+
 @pytest.mark.asyncio
 async def test_redirect_link(client, auth_cookies):
     data = _get_link_data()
@@ -221,6 +251,74 @@ async def test_redirect_link(client, auth_cookies):
     assert response.headers["location"] == original_url
 
 
+@pytest.mark.asyncio
+async def test_redirect_link_served_from_local_cache(client, auth_cookies):
+    data = _get_link_data()
+    create_resp = await client.post("/links/shorten", json=data, cookies=auth_cookies)
+    short_code = create_resp.json()["link"].split("/")[-1]
+    await client.get(f"/links/{short_code}", cookies=auth_cookies)
+    redis = FastAPICache.get_backend().redis
+    redis.hget.reset_mock()
+    response = await client.get(f"/links/{short_code}", cookies=auth_cookies)
+    assert response.status_code == 302
+    assert response.headers["location"] == data["original_url"]
+    redis.hget.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_redirect_link_served_from_redis_bucket(client, async_session):
+    redis = FastAPICache.get_backend().redis
+    redis.evalsha.return_value = b"http://cached.com"
+    session_maker = MagicMock(side_effect=async_session)
+    app.dependency_overrides[get_async_session_maker] = lambda: session_maker
+    with patch.object(settings, "REDIRECT_COUNTER_MODE", "buffered"):
+        response = await client.get("/links/bucketed")
+    assert response.status_code == 302
+    assert response.headers["location"] == "http://cached.com"
+    session_maker.assert_not_called()
+    # поиск, счетчик и рейтинг - один вызов скрипта
+    redis.evalsha.assert_awaited_once()
+    redis.hget.assert_not_awaited()
+    redis.pipeline.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_redirect_link_invalidated_during_lookup_not_cached_in_l1(client):
+    redis = FastAPICache.get_backend().redis
+
+    async def invalidated_lookup(*args, **kwargs):
+        # сообщение pub/sub об изменении ссылки пришло, пока шел запрос в redis
+        redirect_cache.pop("racing")
+        return b"http://old.com"
+
+    redis.evalsha.side_effect = invalidated_lookup
+    with patch.object(settings, "REDIRECT_COUNTER_MODE", "buffered"):
+        response = await client.get("/links/racing")
+    assert response.headers["location"] == "http://old.com"
+    assert redirect_cache.get("racing") is None
+
+
+@pytest.mark.asyncio
+async def test_legacy_redirect_key_matches_key_builder(client):
+    redis = FastAPICache.get_backend().redis
+    assert await legacy_redirect_key(redis, "short") == await get_link_cache_key_builder(
+        func=redirect_link, short_code="short")
+
+
+@pytest.mark.asyncio
+async def test_redirect_cache_hit_does_not_open_session(client, auth_cookies, async_session):
+    data = _get_link_data()
+    create_resp = await client.post("/links/shorten", json=data, cookies=auth_cookies)
+    short_code = create_resp.json()["link"].split("/")[-1]
+    await client.get(f"/links/{short_code}", cookies=auth_cookies)
+    session_maker = MagicMock(side_effect=async_session)
+    app.dependency_overrides[get_async_session_maker] = lambda: session_maker
+    with patch.object(settings, "REDIRECT_COUNTER_MODE", "buffered"):
+        response = await client.get(f"/links/{short_code}", cookies=auth_cookies)
+    assert response.status_code == 302
+    session_maker.assert_not_called()
+
+
 @pytest.mark.asyncio
 async def test_unauthorized_access(client):
     response = await client.get("/links/my-statistics")
@@ -286,6 +384,98 @@ async def test_delete_link_unauthorized(client, auth_cookies):
     assert delete_resp.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+@pytest.mark.asyncio
+async def test_shorten_batch(client, auth_cookies):
+    existing = _get_link_data()
+    await client.post("/links/shorten", json=existing, cookies=auth_cookies)
+    first, second = _get_link_data(), _get_link_data()
+    second["custom_alias"] = None
+    invalid = _get_link_data()
+    invalid["original_url"] = "invalidurl"
+    duplicate = _get_link_data()
+    duplicate["original_url"] = existing["original_url"]
+    taken_alias = _get_link_data()
+    taken_alias["custom_alias"] = existing["custom_alias"]
+    response = await client.post(
+        "/links/shorten/batch",
+        json=[first, second, invalid, duplicate, taken_alias, dict(first)],
+        cookies=auth_cookies
+    )
+    assert response.status_code == status.HTTP_200_OK
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == [
+        "created", "created", "invalid", "duplicate", "duplicate", "duplicate"
+    ]
+    assert [result["index"] for result in body["results"]] == list(range(6))
+    assert (body["created"], body["duplicates"], body["invalid"]) == (2, 3, 1)
+    assert body["results"][0]["link"].endswith(f"/links/{first['custom_alias']}")
+    assert "already has been shorten" in body["results"][3]["detail"]
+    assert "already exists" in body["results"][4]["detail"]
+
+    short_code = body["results"][1]["link"].split("/")[-1]
+    redirect = await client.get(f"/links/{short_code}")
+    assert redirect.headers["location"] == second["original_url"]
+
+
+@pytest.mark.asyncio
+async def test_shorten_batch_code_generation_error(client):
+    taken = _get_link_data()
+    await client.post("/links/shorten", json=taken)
+    item = _get_link_data()
+    item["custom_alias"] = None
+    with patch("src.links.service.short_code_allocator.allocate", new=AsyncMock(return_value=taken["custom_alias"])):
+        response = await client.post("/links/shorten/batch", json=[item, _get_link_data()])
+    body = response.json()
+    assert [result["status"] for result in body["results"]] == ["error", "created"]
+    assert (body["created"], body["duplicates"], body["invalid"], body["errors"]) == (1, 0, 0, 1)
+    assert body["created"] + body["duplicates"] + body["invalid"] + body["errors"] == len(body["results"])
+
+
+@pytest.mark.asyncio
+async def test_shorten_batch_aware_expires_at(client):
+    aware, past = _get_link_data(), _get_link_data()
+    aware["expires_at"] = "2099-01-01T03:00:30+03:00"
+    past["expires_at"] = "2000-01-01T00:00:00Z"
+    response = await client.post("/links/shorten/batch", json=[aware, past])
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in response.json()["results"]] == ["created", "invalid"]
+
+    link = await client.get(f"/links/search?original_url={aware['original_url']}")
+    assert link.json()["expires_at"].startswith("2099-01-01T00:00:00")
+
+
+@pytest.mark.asyncio
+async def test_shorten_batch_ndjson(client):
+    items = [_get_link_data(), _get_link_data()]
+    body = "\n".join(json.dumps(item) for item in items) + "\n{not json}\n"
+    response = await client.post(
+        "/links/shorten/batch",
+        content=body,
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    assert response.status_code == status.HTTP_200_OK
+    assert [result["status"] for result in response.json()["results"]] == ["created", "created", "invalid"]
+
+
+@pytest.mark.asyncio
+async def test_shorten_batch_wrong_format(client):
+    response = await client.post("/links/shorten/batch", json={"original_url": "google.com"})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    response = await client.post(
+        "/links/shorten/batch",
+        content="not json",
+        headers={"Content-Type": "application/json"}
+    )
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_shorten_batch_too_many_items(client):
+    with patch.object(settings, "BATCH_SHORTEN_MAX_ITEMS", 1):
+        response = await client.post("/links/shorten/batch", json=[_get_link_data(), _get_link_data()])
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 @pytest.mark.asyncio
 async def test_search_link(client, auth_cookies):
     data = _get_link_data()
@@ -308,6 +498,75 @@ async def test_get_all_links(client, auth_cookies):
     assert get_all_resp.status_code == status.HTTP_200_OK
     links = get_all_resp.json()["links"]
     assert len(links) == 2
+    assert get_all_resp.json()["next_after"] is None
+
+
+@pytest.mark.asyncio
+async def test_authenticated_request_query_count(client, auth_cookies, test_db):
+    # пользователь и ссылки не должны подтягивать друг друга: число запросов не зависит от числа ссылок
+    for _ in range(5):
+        await client.post("/links/shorten", json=_get_link_data(), cookies=auth_cookies)
+
+    statements = []
+
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(test_db.sync_engine, "before_cursor_execute", count_statement)
+    try:
+        response = await client.get("/links/all", cookies=auth_cookies)
+    finally:
+        event.remove(test_db.sync_engine, "before_cursor_execute", count_statement)
+
+    assert response.status_code == status.HTTP_200_OK
+    assert len(response.json()["links"]) == 5
+    # SELECT user + SELECT links
+    assert len(statements) == 2, statements
+
+
+@pytest.mark.asyncio
+async def test_get_all_links_keyset_pagination(client, auth_cookies):
+    urls = []
+    for _ in range(3):
+        data = _get_link_data()
+        urls.append(data["original_url"])
+        await client.post("/links/shorten", json=data, cookies=auth_cookies)
+
+    first_page = (await client.get("/links/all?limit=2", cookies=auth_cookies)).json()
+    assert len(first_page["links"]) == 2
+    assert first_page["next_after"] is not None
+
+    second_page = (await client.get(
+        f"/links/all?limit=2&after={first_page['next_after']}", cookies=auth_cookies)).json()
+    assert len(second_page["links"]) == 1
+    assert second_page["next_after"] is None
+
+    assert [link["original_url"] for link in first_page["links"] + second_page["links"]] == urls
+
+
+@pytest.mark.asyncio
+async def test_get_all_links_limit_too_large(client, auth_cookies):
+    response = await client.get(f"/links/all?limit={settings.LINKS_PAGE_MAX_SIZE + 1}", cookies=auth_cookies)
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
+@pytest.mark.asyncio
+async def test_stream_all_links(client, auth_cookies):
+    for _ in range(3):
+        await client.post("/links/shorten", json=_get_link_data(), cookies=auth_cookies)
+    with patch.object(settings, "LINKS_STREAM_CHUNK_SIZE", 2):
+        response = await client.get("/links/all/stream", cookies=auth_cookies)
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/json"
+    links = json.loads(response.text)["links"]
+    assert len(links) == 3
+    assert all(link["short_url"].startswith("http://test/links/") for link in links)
+
+
+@pytest.mark.asyncio
+async def test_stream_all_links_empty(client, auth_cookies):
+    response = await client.get("/links/all/stream", cookies=auth_cookies)
+    assert json.loads(response.text) == {"links": []}
 
 
 @pytest.mark.asyncio
@@ -323,6 +582,25 @@ async def test_user_statistics_csv(client, auth_cookies):
     assert data["original_url"] in content
 
 
+@pytest.mark.asyncio
+async def test_user_statistics_csv_gzip(client, auth_cookies):
+    await client.post("/links/shorten", json=_get_link_data(), cookies=auth_cookies)
+    with patch.object(settings, "STATISTICS_CHUNK_SIZE", 1):
+        stats_resp = await client.get(
+            "/links/my-statistics", cookies=auth_cookies, headers={"Accept-Encoding": "gzip"})
+    assert stats_resp.headers["content-encoding"] == "gzip"
+    assert "Short URL,Original URL" in stats_resp.text
+
+
+@pytest.mark.asyncio
+async def test_user_statistics_csv_without_gzip(client, auth_cookies):
+    await client.post("/links/shorten", json=_get_link_data(), cookies=auth_cookies)
+    stats_resp = await client.get(
+        "/links/my-statistics", cookies=auth_cookies, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in stats_resp.headers
+    assert len(stats_resp.text.splitlines()) == 2
+
+
 @pytest.mark.asyncio
 async def test_link_stats(client, auth_cookies):
     data = _get_link_data()
@@ -336,6 +614,24 @@ async def test_link_stats(client, auth_cookies):
     assert stats_resp.json()["redirect_amount"] == 1
 
 
+@pytest.mark.asyncio
+async def test_link_stats_buffered_counters(client, auth_cookies):
+    data = _get_link_data()
+    create_resp = await client.post("/links/shorten", json=data, cookies=auth_cookies)
+    short_code = create_resp.json()["link"].split("/")[-1]
+    with patch.object(settings, "REDIRECT_COUNTER_MODE", "buffered"), \
+         patch("src.links.router.resolve_redirect", new=AsyncMock(return_value=None)) as mock_resolve, \
+         patch("src.links.router.get_pending_clicks",
+               new=AsyncMock(return_value=(3, datetime(2025, 1, 1, 12, 0)))):
+        response = await client.get(f"/links/{short_code}", cookies=auth_cookies)
+        assert response.status_code == 302
+        mock_resolve.assert_any_await(ANY, short_code, lookup=True, count_click=True)
+        mock_resolve.assert_awaited_with(ANY, short_code, lookup=False, count_click=True)
+        stats_resp = await client.get(f"/links/{short_code}/stats", cookies=auth_cookies)
+    assert stats_resp.json()["redirect_amount"] == 3
+    assert stats_resp.json()["last_used_datetime"] == "01/01/2025, 12:00:00"
+
+
 @pytest.mark.asyncio
 async def test_create_link_invalid_url(client, auth_cookies):
     invalid_data = _get_link_data()
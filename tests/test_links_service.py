@@ -3,9 +3,12 @@ from datetime import datetime, timedelta
 from unittest.mock import AsyncMock, MagicMock, patch
 from src.auth.models import User
 from src.config import Settings
+from src.links.expiry import link_ttl
 from src.links.models import Link
-from src.links.schemes import UpdateLinkRequest
+from src.links.rows import LinkListRow, LinkStatsRow, LinkRedirectRow
+from src.links.schemes import UpdateLinkRequest, CreateLinkRequest
 from src.links.service import LinkService
+from src.links.urls import long_url_digest
 from src.links.exceptions import (
     NonUniqueAliasError,
     AliasLengthError,
@@ -28,6 +31,18 @@ def mock_session():
     return session
 
 
+@pytest.fixture(autouse=True)
+def mock_invalidate_links():
+    with patch('src.links.service.invalidate_links', new=AsyncMock()) as mock_invalidate:
+        yield mock_invalidate
+
+
+@pytest.fixture(autouse=True)
+def mock_cache_link_redirect():
+    with patch('src.links.service.cache_link_redirect', new=AsyncMock()) as mock_cache:
+        yield mock_cache
+
+
 @pytest.fixture
 def link_service(mock_session):
     return LinkService(mock_session)
@@ -48,6 +63,17 @@ async def test_find_by_long_url_found(link_service, mock_session):
     assert result == mock_link
 
 
+@pytest.mark.anyio
+async def test_find_by_long_url_uses_digest(link_service, mock_session):
+    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=Link()))
+    await link_service.find_by_long_url("Test.com/")
+    params = mock_session.execute.call_args.args[0].compile().params
+    assert sorted(params["long_url_digest_1"]) == sorted([
+        long_url_digest("http://test.com"),
+        long_url_digest("https://test.com"),
+    ])
+
+
 @pytest.mark.anyio
 async def test_find_by_long_url_not_found(link_service, mock_session):
     mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
@@ -70,68 +96,118 @@ async def test_get_link_not_found(link_service, mock_session):
         await link_service.get("short")
 
 
+@pytest.mark.anyio
+async def test_get_link_rejected_by_short_code_filter(link_service, mock_session):
+    with patch('src.links.service.short_code_may_exist', new=AsyncMock(return_value=False)):
+        with pytest.raises(LinkNotFoundError):
+            await link_service.get("short")
+    mock_session.execute.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_get_link_not_found_remembered(link_service, mock_session):
+    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
+    with patch('src.links.service.remember_missing_short_code', new=AsyncMock()) as mock_remember:
+        with pytest.raises(LinkNotFoundError):
+            await link_service.get("short")
+    mock_remember.assert_awaited_once_with("short")
+
+
 @pytest.mark.anyio
 async def test_get_stats(link_service, mock_session):
-    mock_link = Link(short_code="short", redirect_counter=5)
-    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
+    created_at = datetime(2026, 1, 1)
+    mock_session.execute.return_value = MagicMock(one_or_none=MagicMock(
+        return_value=("short", "http://test.com", created_at, None, 5, None)))
     result = await link_service.get_stats("short")
-    assert result.redirect_counter == 5
+    assert result == LinkStatsRow("short", "http://test.com", created_at, None, 5, None)
+    query = mock_session.execute.call_args.args[0]
+    assert "link_click_counters" in str(query)
 
 
 @pytest.mark.anyio
 async def test_get_stats_link_not_found(link_service, mock_session):
     with pytest.raises(LinkNotFoundError):
-        mock_link = None
-        mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
-        result = await link_service.get_stats("short")
-        assert result.redirect_counter == 5
+        mock_session.execute.return_value = MagicMock(one_or_none=MagicMock(return_value=None))
+        await link_service.get_stats("short")
+
+def _inserted(link):
+    return MagicMock(scalar_one_or_none=MagicMock(return_value=link))
+
+
+def _conflicts(*links):
+    return MagicMock(all=MagicMock(return_value=list(links)))
+
 
 @pytest.mark.anyio
-async def test_create(link_service, mock_session, user):
-    mock_session.execute.side_effect = [
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
-    ]
+async def test_create(link_service, mock_session, user, mock_cache_link_redirect):
+    mock_session.execute.return_value = _inserted(Link(long_url="http://test.com", short_code="short"))
     link = await link_service.create(
         long_url="http://test.com",
         custom_alias=None,
         user=user
     )
     assert link.long_url == "http://test.com"
-    mock_session.add.assert_called_once()
+    mock_session.execute.assert_awaited_once()
+    stmt = mock_session.execute.call_args.args[0]
+    assert stmt.compile().params["author_id"] == user.id
     mock_session.commit.assert_awaited_once()
+    mock_cache_link_redirect.assert_awaited_once_with("short", "http://test.com", None)
 
 @pytest.mark.anyio
 async def test_create_with_custom_alias_success(link_service, mock_session, user):
-    mock_session.execute.side_effect = [
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
-    ]
+    mock_session.execute.return_value = _inserted(Link(long_url="http://test.com", short_code="short"))
     link = await link_service.create(
         long_url="http://test.com",
         custom_alias="short",
         user=user
     )
     assert link.short_code == "short"
-    mock_session.add.assert_called_once()
+    mock_session.execute.assert_awaited_once()
+    stmt = mock_session.execute.call_args.args[0]
+    assert stmt.compile().params["short_code"] == "short"
     mock_session.commit.assert_awaited_once()
 
 
 @pytest.mark.anyio
 async def test_create_with_non_unique_alias(link_service, mock_session):
-    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=Link()))
-    with pytest.raises(UrlAlreadyExists):
+    mock_session.execute.side_effect = [
+        _inserted(None),
+        _conflicts(Link(long_url="http://other.com", short_code="short")),
+    ]
+    with pytest.raises(NonUniqueAliasError):
         await link_service.create("http://test.com", custom_alias="short")
 
 
 @pytest.mark.anyio
 async def test_create_with_duplicate_url(link_service, mock_session):
-    mock_session.execute.return_value = (
-        MagicMock(scalar_one_or_none=MagicMock(return_value=Link(long_url="http://test.com"))))
+    mock_session.execute.side_effect = [
+        _inserted(None),
+        _conflicts(Link(long_url="http://test.com", long_url_digest=long_url_digest("http://test.com"),
+                        short_code="other")),
+    ]
     with pytest.raises(UrlAlreadyExists):
         await link_service.create(long_url="http://test.com")
 
 
+@pytest.mark.anyio
+async def test_create_with_duplicate_url_and_alias(link_service, mock_session):
+    mock_session.execute.side_effect = [
+        _inserted(None),
+        _conflicts(Link(long_url="http://test.com", long_url_digest=long_url_digest("http://test.com"),
+                        short_code="other")),
+    ]
+    with pytest.raises(UrlAlreadyExists):
+        await link_service.create("http://test.com", custom_alias="short")
+
+
+@pytest.mark.anyio
+async def test_create_rollback_on_error(link_service, mock_session):
+    mock_session.execute.side_effect = RuntimeError("db is down")
+    with pytest.raises(RuntimeError):
+        await link_service.create("http://test.com", custom_alias="short")
+    mock_session.rollback.assert_awaited_once()
+
+
 @pytest.mark.anyio
 async def test_create_with_alias_length_error(link_service, mock_session):
     mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=None))
@@ -139,15 +215,101 @@ async def test_create_with_alias_length_error(link_service, mock_session):
         await link_service.create(long_url="http://test.com", custom_alias="sho")
 
 
+@pytest.mark.anyio
+async def test_create_stores_normalized_digest(link_service, mock_session):
+    mock_session.execute.return_value = _inserted(Link(long_url="HTTP://Test.com:80/", short_code="short"))
+    await link_service.create(long_url="HTTP://Test.com:80/")
+    params = mock_session.execute.call_args.args[0].compile().params
+    assert params["long_url"] == "HTTP://Test.com:80/"
+    assert params["long_url_digest"] == long_url_digest("http://test.com")
+
+
+def _create_request(url, alias=None):
+    return CreateLinkRequest(original_url=url, custom_alias=alias, expires_at=None)
+
+
+@pytest.mark.anyio
+async def test_create_many(link_service, mock_session, user, mock_invalidate_links):
+    mock_session.execute.side_effect = [
+        MagicMock(all=MagicMock(return_value=[
+            MagicMock(short_code="alias1", long_url="http://one.com"),
+            MagicMock(short_code="code2", long_url="http://two.com"),
+        ])),
+    ]
+    with patch.object(link_service, '_generate_short_code', side_effect=["code2"]):
+        results = await link_service.create_many([
+            _create_request("http://one.com", "alias1"),
+            _create_request("http://two.com"),
+            _create_request("http://one.com"),
+        ], user=user)
+    assert results[0] == ("created", "alias1", None)
+    assert results[1] == ("created", "code2", None)
+    assert results[2][0] == "duplicate"
+    mock_session.execute.assert_awaited_once()
+    mock_session.commit.assert_awaited_once()
+    mock_invalidate_links.assert_awaited_once_with()
+
+
+@pytest.mark.anyio
+async def test_create_many_conflicts(link_service, mock_session):
+    mock_session.execute.side_effect = [
+        MagicMock(all=MagicMock(return_value=[])),
+        MagicMock(all=MagicMock(return_value=[
+            MagicMock(short_code="other", long_url_digest=long_url_digest("http://one.com")),
+            MagicMock(short_code="alias2", long_url_digest=long_url_digest("http://other.com")),
+            MagicMock(short_code="taken", long_url_digest=long_url_digest("http://another.com")),
+        ])),
+        MagicMock(all=MagicMock(return_value=[
+            MagicMock(short_code="free", long_url="http://three.com"),
+        ])),
+    ]
+    with patch.object(link_service, '_generate_short_code', side_effect=["taken", "free"]):
+        results = await link_service.create_many([
+            _create_request("http://one.com", "alias1"),
+            _create_request("http://two.com", "alias2"),
+            _create_request("http://three.com"),
+        ])
+    assert results[0] == ("duplicate", None, UrlAlreadyExists("http://one.com").detail)
+    assert results[1] == ("duplicate", None, NonUniqueAliasError("alias2").detail)
+    assert results[2] == ("created", "free", None)
+
+
+@pytest.mark.anyio
+async def test_create_many_equivalent_urls_are_duplicates(link_service, mock_session):
+    mock_session.execute.side_effect = [
+        MagicMock(all=MagicMock(return_value=[MagicMock(short_code="alias1", long_url="http://one.com")])),
+    ]
+    results = await link_service.create_many([
+        _create_request("http://one.com", "alias1"),
+        _create_request("http://ONE.com:80/", "alias2"),
+    ])
+    assert results[1] == ("duplicate", None, UrlAlreadyExists("http://ONE.com:80/").detail)
+
+
+@pytest.mark.anyio
+async def test_create_many_in_chunks(link_service, mock_session):
+    mock_session.execute.side_effect = [
+        MagicMock(all=MagicMock(return_value=[MagicMock(short_code="alias1", long_url="http://one.com")])),
+        MagicMock(all=MagicMock(return_value=[MagicMock(short_code="alias2", long_url="http://two.com")])),
+    ]
+    with patch('src.links.service.Settings') as mock_settings:
+        mock_settings.return_value.BATCH_SHORTEN_CHUNK_SIZE = 1
+        mock_settings.return_value.CODE_GENERATION_ATTEMPTS = 5
+        results = await link_service.create_many([
+            _create_request("http://one.com", "alias1"),
+            _create_request("http://two.com", "alias2"),
+        ])
+    assert [result[0] for result in results] == ["created", "created"]
+    assert mock_session.commit.await_count == 2
+
+
 @pytest.mark.anyio
 async def test_delete_success(link_service, mock_session, user):
     mock_link = Link(short_code="short", author_id=user.id)
     mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache:
-        mock_backend = AsyncMock()
-        mock_fastapi_cache.get_backend.return_value = mock_backend
+    with patch('src.links.service.invalidate_cache', new=AsyncMock()) as mock_invalidate:
         result = await link_service.delete("short", user)
-        mock_backend.clear.assert_called()
+    mock_invalidate.assert_awaited_once()
     mock_session.execute.assert_awaited()
     mock_session.commit.assert_awaited_once()
     assert result == mock_link
@@ -170,7 +332,30 @@ async def test_delete_link_not_found(link_service, mock_session, user):
 
 
 @pytest.mark.anyio
-async def test_update_success(link_service, mock_session, user):
+async def test_delete_by_author(link_service, mock_session, mock_invalidate_links):
+    mock_session.execute.return_value = MagicMock(all=MagicMock(return_value=[
+        MagicMock(short_code="short1", long_url="http://one.com"),
+        MagicMock(short_code="short2", long_url="http://two.com"),
+    ]))
+    assert await link_service.delete_by_author(1) == 2
+    mock_session.execute.assert_awaited_once()
+    assert str(mock_session.execute.call_args.args[0]).startswith("DELETE FROM links")
+    mock_session.commit.assert_awaited_once()
+    mock_invalidate_links.assert_awaited_once_with(
+        ["short1", "short2"], ["http://one.com", "http://two.com"]
+    )
+
+
+@pytest.mark.anyio
+async def test_delete_by_author_rollback_on_error(link_service, mock_session):
+    mock_session.execute.side_effect = RuntimeError("db is down")
+    with pytest.raises(RuntimeError):
+        await link_service.delete_by_author(1)
+    mock_session.rollback.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_update_success(link_service, mock_session, user, mock_cache_link_redirect):
     mock_link = Link(
         short_code="short1",
         long_url="http://test.com",
@@ -185,15 +370,33 @@ async def test_update_success(link_service, mock_session, user):
         MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link)),
         MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
     ]
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache:
-        mock_backend = AsyncMock()
-        mock_fastapi_cache.get_backend.return_value = mock_backend
+    with patch('src.links.service.invalidate_cache', new=AsyncMock()) as mock_invalidate:
         result = await link_service.update("short1", user, update_data)
-        mock_backend.clear.assert_called()
+    mock_invalidate.assert_awaited_once_with(
+        short_code="short1", original_url="http://testnew.com", previous_url="http://test.com"
+    )
     assert result.long_url == "http://testnew.com"
+    assert result.delete_after == result.expires_at
+    mock_cache_link_redirect.assert_awaited_once_with("short1", "http://testnew.com", result.expires_at)
     mock_session.commit.assert_awaited_once()
 
 
+@pytest.mark.anyio
+async def test_update_equivalent_url_skips_uniqueness_check(link_service, mock_session, user):
+    mock_link = Link(
+        short_code="short1",
+        long_url="http://test.com",
+        long_url_digest=long_url_digest("http://test.com"),
+        author_id=user.id
+    )
+    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
+    with patch('src.links.service.invalidate_cache', new=AsyncMock()):
+        result = await link_service.update("short1", user, UpdateLinkRequest(
+            original_url="http://test.com/", expires_at=None))
+    mock_session.execute.assert_awaited_once()
+    assert result.long_url == "http://test.com/"
+
+
 @pytest.mark.anyio
 async def test_short_code_unique_or_raise_should_raise_error(link_service):
     short_code = "short"
@@ -204,12 +407,12 @@ async def test_short_code_unique_or_raise_should_raise_error(link_service):
 
 @pytest.mark.anyio
 async def test_create_should_raise_value_error_on_exceeded_attempts(link_service):
-    with patch.object(link_service, '_url_unique_or_raise', return_value=None), \
-         patch.object(link_service, '_alias_unique_or_raise', return_value=None), \
-         patch.object(link_service, '_generate_short_code', return_value="short"), \
-         patch.object(link_service, '_is_short_code_unique', return_value=False):
+    with patch.object(link_service, '_insert_link', return_value=None), \
+         patch.object(link_service, '_raise_on_conflict', return_value=None), \
+         patch.object(link_service, '_generate_short_code', return_value="short") as mock_generate:
         with pytest.raises(ValueError, match="Cannot create short link"):
             await link_service.create(long_url="https://test.com")
+    assert mock_generate.call_count == Settings().CODE_GENERATION_ATTEMPTS + 1
 
 
 @pytest.mark.anyio
@@ -240,20 +443,59 @@ async def test_update_link_not_found(link_service, mock_session):
 
 @pytest.mark.anyio
 async def test_get_all_redirect_links(link_service, mock_session):
-    mock_links = [Link(), Link()]
     mock_session.execute.return_value = MagicMock(
-        scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=mock_links))))
+        tuples=MagicMock(return_value=[(1, "short1", "http://one.com"), (2, "short2", "http://two.com")]))
     result = await link_service.get_all_redirect_links()
-    assert len(result) == 2
+    assert result == [LinkListRow(1, "short1", "http://one.com"), LinkListRow(2, "short2", "http://two.com")]
+    assert result[1].short_code == "short2"
+    query = mock_session.execute.call_args.args[0]
+    assert [column.name for column in query.selected_columns] == ["id", "short_code", "long_url"]
+
+
+@pytest.mark.anyio
+async def test_get_all_redirect_links_page(link_service, mock_session):
+    mock_session.execute.return_value = MagicMock(tuples=MagicMock(return_value=[]))
+    await link_service.get_all_redirect_links(after=10, limit=5)
+    query = mock_session.execute.call_args.args[0]
+    assert "links.id > " in str(query)
+    assert query.compile().params == {"id_1": 10, "param_1": 5}
+
+
+@pytest.mark.anyio
+async def test_get_redirect_targets(link_service, mock_session):
+    mock_session.execute.return_value = MagicMock(tuples=MagicMock(return_value=[("short1", "http://one.com", None)]))
+    result = await link_service.get_redirect_targets(["short1", "short2"])
+    assert result == [LinkRedirectRow("short1", "http://one.com", None)]
+    query = mock_session.execute.call_args.args[0]
+    assert "links.expires_at" in str(query)
+    assert query.compile().params["short_code_1"] == ["short1", "short2"]
+
+
+@pytest.mark.anyio
+async def test_stream_most_used_redirect_targets(link_service, mock_session):
+    async def partitions():
+        yield [("short1", "http://one.com", None)]
+
+    mock_session.stream = AsyncMock(return_value=MagicMock(partitions=partitions))
+    result = [rows async for rows in link_service.stream_most_used_redirect_targets(limit=10, chunk_size=5)]
+    assert result == [[LinkRedirectRow("short1", "http://one.com", None)]]
+    query = mock_session.stream.call_args.args[0]
+    assert "ORDER BY links.redirect_counter DESC" in str(query)
+    assert query.get_execution_options()["yield_per"] == 5
 
 
 @pytest.mark.anyio
 async def test_get_links_by_author(link_service, mock_session, user):
-    mock_links = [Link(author_id=user.id), Link(author_id=user.id)]
-    mock_session.execute.return_value = MagicMock(
-        scalars=MagicMock(return_value=MagicMock(all=MagicMock(return_value=mock_links))))
+    created_at = datetime(2026, 1, 1)
+    mock_session.execute.return_value = MagicMock(tuples=MagicMock(return_value=[
+        ("short1", "http://one.com", created_at, None, 1, None),
+        ("short2", "http://two.com", created_at, None, 0, None),
+    ]))
     result = await link_service.get_links_by_author(user.id)
     assert len(result) == 2
+    assert isinstance(result[0], LinkStatsRow)
+    assert result[0].redirect_counter == 1
+    assert not hasattr(result[0], "__dict__")
 
 
 @pytest.mark.anyio
@@ -262,6 +504,26 @@ async def test_increment_counter(link_service, mock_session):
     mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
     await link_service.increment_counter("short")
     assert mock_link.redirect_counter == 1
+    assert mock_link.delete_after == mock_link.last_used_at + link_ttl()
+    mock_session.commit.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_increment_counter_keeps_expiry_date(link_service, mock_session):
+    expires_at = datetime(2030, 1, 1)
+    mock_link = Link(redirect_counter=0, expires_at=expires_at, delete_after=expires_at)
+    mock_session.execute.return_value = MagicMock(scalar_one_or_none=MagicMock(return_value=mock_link))
+    await link_service.increment_counter("short")
+    assert mock_link.delete_after == expires_at
+
+
+@pytest.mark.anyio
+async def test_increment_counter_sharded(link_service, mock_session):
+    with patch('src.links.service.settings.CLICK_COUNTER_SHARDS', 8):
+        await link_service.increment_counter("short")
+    statements = [str(call.args[0]) for call in mock_session.execute.call_args_list]
+    assert statements[0].startswith("INSERT INTO link_click_counters")
+    assert statements[1].startswith("UPDATE links")
     mock_session.commit.assert_awaited_once()
 
 
@@ -294,10 +556,11 @@ async def test_url_unique_check_fail(link_service, mock_session):
 @pytest.mark.anyio
 async def test_create_auto_generate_code_retry(link_service, mock_session):
     mock_session.execute.side_effect = [
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
-        MagicMock(scalar_one_or_none=MagicMock(return_value=Link())),
-        MagicMock(scalar_one_or_none=MagicMock(return_value=None)),
+        _inserted(None),
+        _conflicts(Link(long_url="http://other.com", short_code="nounique")),
+        _inserted(Link(long_url="http://test.com", short_code="short")),
     ]
-    with patch.object(link_service, '_generate_short_code', side_effect=["nounique", "short"]):
+    with patch.object(link_service, '_generate_short_code', side_effect=["nounique", "short"]) as mock_generate:
         link = await link_service.create("http://test.com")
         assert link.short_code == "short"
+    mock_generate.assert_any_call("http://test.com", attempt=1)
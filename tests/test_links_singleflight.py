@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.singleflight import LOCK_KEY_PREFIX, SingleFlight, single_flight, settings
+
+
+def _mock_redis(acquired=True, lock_exists=1):
+    redis = MagicMock()
+    redis.lock.return_value.acquire = AsyncMock(return_value=acquired)
+    redis.lock.return_value.release = AsyncMock()
+    redis.exists = AsyncMock(return_value=lock_exists)
+    return redis
+
+
+@pytest.mark.anyio
+async def test_single_flight_loads_once_per_key():
+    flights = SingleFlight()
+    release = asyncio.Event()
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await release.wait()
+        return "value"
+
+    tasks = [asyncio.create_task(flights.do("key", loader)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    assert await asyncio.gather(*tasks) == ["value"] * 5
+    assert len(calls) == 1
+    assert flights._calls == {}
+
+
+@pytest.mark.anyio
+async def test_single_flight_shares_exception():
+    flights = SingleFlight()
+    release = asyncio.Event()
+
+    async def failing():
+        await release.wait()
+        raise ValueError("db is down")
+
+    tasks = [asyncio.create_task(flights.do("key", failing)) for _ in range(3)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert flights._calls == {}
+
+
+@pytest.mark.anyio
+async def test_single_flight_waiter_reloads_when_leader_cancelled():
+    flights = SingleFlight()
+    leader = asyncio.create_task(flights.do("key", asyncio.Event().wait))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flights.do("key", AsyncMock(return_value="value")))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await waiter == "value"
+
+
+@pytest.mark.anyio
+async def test_single_flight_leader_holds_redis_lock():
+    redis = _mock_redis()
+    load = AsyncMock(return_value="value")
+    assert await single_flight(redis, "key", AsyncMock(), load) == "value"
+    redis.lock.assert_called_once_with(LOCK_KEY_PREFIX + "key", timeout=settings.SINGLE_FLIGHT_LOCK_TTL,
+                                       thread_local=False)
+    redis.lock.return_value.release.assert_awaited_once()
+    load.assert_awaited_once()
+
+
+@pytest.mark.anyio
+async def test_single_flight_waits_for_other_worker():
+    redis = _mock_redis(acquired=False)
+    read_cache = AsyncMock(side_effect=[None, "value"])
+    load = AsyncMock()
+    with patch.object(settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0):
+        assert await single_flight(redis, "key", read_cache, load) == "value"
+    assert read_cache.await_count == 2
+    load.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_single_flight_loads_when_other_worker_failed():
+    redis = _mock_redis(acquired=False, lock_exists=0)
+    load = AsyncMock(return_value="value")
+    with patch.object(settings, "SINGLE_FLIGHT_POLL_INTERVAL", 0):
+        assert await single_flight(redis, "key", AsyncMock(return_value=None), load) == "value"
+    load.assert_awaited_once()
+
@@ -1,172 +1,196 @@
 import pytest
-from unittest.mock import AsyncMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.generations import GENERATION_KEY_PREFIX, url_namespace
 from src.links.utils import (
     search_cache_key_builder,
     get_link_cache_key_builder,
     get_all_links_key_builder,
-    invalidate_cache
+    invalidate_cache,
+    invalidate_links
 )
 
 
-def test_search_cache_key_builder_with_direct_original_url():
+@pytest.fixture
+def mock_redis():
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    redis = MagicMock()
+    redis.get = AsyncMock(return_value=None)
+    redis.pipeline.return_value = pipe
+    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache:
+        mock_fastapi_cache.get_backend.return_value.redis = redis
+        yield redis, pipe
+
+
+def _incremented(pipe):
+    return [call.args[0] for call in pipe.incr.call_args_list]
+
+
+@pytest.mark.anyio
+async def test_search_cache_key_builder_with_direct_original_url(mock_redis):
     def test_func(): pass
 
-    result = search_cache_key_builder(
+    result = await search_cache_key_builder(
         test_func,
         namespace="test",
         original_url="https://test.com"
     )
 
-    expected = f"{test_func.__module__}:{test_func.__name__}:https://test.com"
+    expected = f"{test_func.__module__}:{test_func.__name__}:0:https://test.com"
     assert result == expected
 
 
-def test_search_cache_key_builder_with_kwargs_original_url():
+@pytest.mark.anyio
+async def test_search_cache_key_builder_with_kwargs_original_url(mock_redis):
     def test_func(): pass
 
-    result = search_cache_key_builder(
+    result = await search_cache_key_builder(
         test_func,
         namespace="test",
         kwargs={"original_url": "https://test.com"}
     )
 
-    expected = f"{test_func.__module__}:{test_func.__name__}:https://test.com"
+    expected = f"{test_func.__module__}:{test_func.__name__}:0:https://test.com"
     assert result == expected
 
 
-def test_get_link_cache_key_builder_with_direct_short_code():
+@pytest.mark.anyio
+async def test_search_cache_key_builder_equivalent_urls_share_key(mock_redis):
+    def test_func(): pass
+
+    keys = {
+        await search_cache_key_builder(test_func, original_url=url)
+        for url in ["http://test.com", "http://Test.com/", "HTTP://test.com:80"]
+    }
+    assert keys == {f"{test_func.__module__}:{test_func.__name__}:0:http://test.com"}
+    schemeless_keys = {
+        await search_cache_key_builder(test_func, original_url=url)
+        for url in ["test.com", "Test.com/", " test.com:80"]
+    }
+    assert schemeless_keys == {f"{test_func.__module__}:{test_func.__name__}:0:any:http://test.com"}
+
+
+@pytest.mark.anyio
+async def test_search_cache_key_builder_separates_schemeless_url(mock_redis):
+    # без схемы ищутся и http, и https, с явным http - только http: ответы разные
+    def test_func(): pass
+
+    schemeless = await search_cache_key_builder(test_func, original_url="test.com")
+    assert schemeless != await search_cache_key_builder(test_func, original_url="http://test.com")
+    assert schemeless != await search_cache_key_builder(test_func, original_url="https://test.com")
+
+
+@pytest.mark.anyio
+async def test_search_cache_key_builder_uses_url_generation(mock_redis):
+    redis, _ = mock_redis
+    redis.get.return_value = b"3"
+
+    def test_func(): pass
+
+    result = await search_cache_key_builder(test_func, original_url="test.com")
+    assert result == f"{test_func.__module__}:{test_func.__name__}:3:any:http://test.com"
+    redis.get.assert_awaited_once_with(GENERATION_KEY_PREFIX + url_namespace("https://test.com"))
+
+
+@pytest.mark.anyio
+async def test_get_link_cache_key_builder_with_direct_short_code(mock_redis):
     def test_func(): pass
 
-    result = get_link_cache_key_builder(
+    result = await get_link_cache_key_builder(
         test_func,
         namespace="test",
         short_code="short"
     )
 
-    expected = f"{test_func.__module__}:{test_func.__name__}:short"
+    expected = f"{test_func.__module__}:{test_func.__name__}:0:short"
     assert result == expected
 
 
-def test_get_link_cache_key_builder_with_kwargs_short_code():
+@pytest.mark.anyio
+async def test_get_link_cache_key_builder_with_kwargs_short_code(mock_redis):
+    redis, _ = mock_redis
+    redis.get.return_value = b"5"
+
     def test_func(): pass
 
-    result = get_link_cache_key_builder(
+    result = await get_link_cache_key_builder(
         test_func,
         namespace="test",
         kwargs={"short_code": "short"}
     )
 
-    expected = f"{test_func.__module__}:{test_func.__name__}:short"
+    expected = f"{test_func.__module__}:{test_func.__name__}:5:short"
     assert result == expected
+    redis.get.assert_awaited_once_with(GENERATION_KEY_PREFIX + "link:short")
 
 
-def test_get_all_links_key_builder():
+@pytest.mark.anyio
+async def test_get_all_links_key_builder(mock_redis):
+    redis, _ = mock_redis
+    redis.get.return_value = b"7"
+
     def test_func(): pass
 
-    result = get_all_links_key_builder(
+    result = await get_all_links_key_builder(
         test_func,
-        namespace="test"
+        namespace="test",
+        kwargs={"after": 10, "limit": 100}
     )
 
-    expected = f"{test_func.__module__}:{test_func.__name__}"
+    expected = f"{test_func.__module__}:{test_func.__name__}:7:10:100"
     assert result == expected
+    redis.get.assert_awaited_once_with(GENERATION_KEY_PREFIX + "all")
 
 
 @pytest.mark.anyio
-async def test_invalidate_cache_no_params():
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache:
-        await invalidate_cache()
-        mock_fastapi_cache.get_backend.assert_not_called()
+async def test_invalidate_cache_no_params(mock_redis):
+    redis, _ = mock_redis
+    await invalidate_cache()
+    redis.pipeline.assert_not_called()
 
 
 @pytest.mark.anyio
-async def test_invalidate_cache_with_short_code():
-    class MockRouterModule:
-        @staticmethod
-        def redirect_link(): pass
-
-        @staticmethod
-        def link_stats(): pass
-
-        @staticmethod
-        def search_link_by_original_url(): pass
-
-    mock_router = MockRouterModule()
-    mock_backend = AsyncMock()
-
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache, \
-            patch('src.links.utils.get_link_cache_key_builder') as mock_key_builder, \
-            patch.dict('sys.modules', {'src.links.router': mock_router}):
-        mock_fastapi_cache.get_backend.return_value = mock_backend
-        mock_key_builder.side_effect = ["redirect_key", "stats_key"]
-
-        await invalidate_cache(short_code="abc123")
-
-        mock_fastapi_cache.get_backend.assert_called_once()
-        assert mock_key_builder.call_count == 2
-        assert mock_backend.clear.call_count == 2
-        mock_backend.clear.assert_any_call(key="redirect_key", namespace="")
-        mock_backend.clear.assert_any_call(key="stats_key", namespace="")
+async def test_invalidate_cache_with_short_code(mock_redis):
+    _, pipe = mock_redis
+    await invalidate_cache(short_code="abc123")
+    assert _incremented(pipe) == [GENERATION_KEY_PREFIX + "link:abc123", GENERATION_KEY_PREFIX + "all"]
+    pipe.publish.assert_called_once_with("links:invalidate", "abc123")
+    pipe.execute.assert_awaited_once()
 
 
 @pytest.mark.anyio
-async def test_invalidate_cache_with_original_url():
-    class MockRouterModule:
-        @staticmethod
-        def redirect_link(): pass
-
-        @staticmethod
-        def link_stats(): pass
+async def test_invalidate_cache_with_original_url(mock_redis):
+    _, pipe = mock_redis
+    await invalidate_cache(original_url="https://test.com")
+    assert _incremented(pipe) == [
+        GENERATION_KEY_PREFIX + url_namespace("https://test.com"),
+        GENERATION_KEY_PREFIX + "all"
+    ]
+    pipe.publish.assert_not_called()
 
-        @staticmethod
-        def search_link_by_original_url(): pass
 
-    mock_router = MockRouterModule()
-    mock_backend = AsyncMock()
-
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache, \
-            patch('src.links.utils.search_cache_key_builder') as mock_key_builder, \
-            patch.dict('sys.modules', {'src.links.router': mock_router}):
-        mock_fastapi_cache.get_backend.return_value = mock_backend
-        mock_key_builder.return_value = "search_key"
-
-        await invalidate_cache(original_url="https://test.com")
-
-        mock_fastapi_cache.get_backend.assert_called_once()
-        mock_key_builder.assert_called_once()
-        mock_backend.clear.assert_called_once_with("search_key")
+@pytest.mark.anyio
+async def test_invalidate_cache_with_both_params(mock_redis):
+    _, pipe = mock_redis
+    await invalidate_cache(
+        short_code="short",
+        original_url="https://new.com",
+        previous_url="https://old.com"
+    )
+    assert _incremented(pipe) == [
+        GENERATION_KEY_PREFIX + "link:short",
+        GENERATION_KEY_PREFIX + url_namespace("https://new.com"),
+        GENERATION_KEY_PREFIX + url_namespace("https://old.com"),
+        GENERATION_KEY_PREFIX + "all"
+    ]
+    assert pipe.expire.call_count == 4
+    pipe.execute.assert_awaited_once()
 
 
 @pytest.mark.anyio
-async def test_invalidate_cache_with_both_params():
-    class MockRouterModule:
-        @staticmethod
-        def redirect_link(): pass
-
-        @staticmethod
-        def link_stats(): pass
-
-        @staticmethod
-        def search_link_by_original_url(): pass
-
-    mock_router = MockRouterModule()
-    mock_backend = AsyncMock()
-    with patch('src.links.utils.FastAPICache') as mock_fastapi_cache, \
-            patch('src.links.utils.get_link_cache_key_builder') as mock_link_key_builder, \
-            patch('src.links.utils.search_cache_key_builder') as mock_search_key_builder, \
-            patch.dict('sys.modules', {'src.links.router': mock_router}):
-        mock_fastapi_cache.get_backend.return_value = mock_backend
-        mock_link_key_builder.side_effect = ["redirect_key", "stats_key"]
-        mock_search_key_builder.return_value = "search_key"
-
-        await invalidate_cache(
-            short_code="short",
-            original_url="https://test.com"
-        )
-        mock_fastapi_cache.get_backend.assert_called_once()
-        assert mock_link_key_builder.call_count == 2
-        mock_search_key_builder.assert_called_once()
-        assert mock_backend.clear.call_count == 3
-        mock_backend.clear.assert_any_call(key="redirect_key", namespace="")
-        mock_backend.clear.assert_any_call(key="stats_key", namespace="")
-        mock_backend.clear.assert_any_call("search_key")
+async def test_invalidate_links_only_lists(mock_redis):
+    _, pipe = mock_redis
+    await invalidate_links()
+    assert _incremented(pipe) == [GENERATION_KEY_PREFIX + "all"]
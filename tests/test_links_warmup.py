@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links.cache import redirect_cache
+from src.links.rows import LinkRedirectRow
+from src.links.warmup import WARMUP_LOCK_KEY, settings, start_warmup, warm_up_redirects
+
+
+@pytest.fixture
+def mock_redis():
+    redis = MagicMock()
+    redis.zrevrange = AsyncMock(return_value=[])
+    redis.set = AsyncMock(return_value=True)
+    return redis
+
+
+@pytest.fixture
+def mock_service():
+    service = MagicMock()
+    service.get_redirect_targets = AsyncMock(return_value=[])
+
+    async def most_used(limit, chunk_size):
+        yield [LinkRedirectRow("hot1", "http://one.com", None), LinkRedirectRow("db1", "http://db1.com", None)]
+        yield [LinkRedirectRow("db2", "http://db2.com", None), LinkRedirectRow("db3", "http://db3.com", None)]
+
+    service.stream_most_used_redirect_targets = MagicMock(side_effect=most_used)
+    with patch("src.links.warmup.LinkService", return_value=service):
+        yield service
+
+
+@pytest.fixture
+def session_maker():
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    return MagicMock(return_value=session)
+
+
+@pytest.fixture
+def mock_cache_redirects():
+    async def cache_redirects(redis, rows):
+        return {row.short_code: 60 for row in rows}
+
+    with patch("src.links.warmup.cache_redirects", new=AsyncMock(side_effect=cache_redirects)) as mock_cache:
+        yield mock_cache
+
+
+def _cached_codes(mock_cache_redirects):
+    return [row.short_code for call in mock_cache_redirects.call_args_list for row in call.args[1]]
+
+
+@pytest.mark.anyio
+async def test_warm_up_from_hot_links(mock_redis, mock_service, session_maker, mock_cache_redirects):
+    redirect_cache.clear()
+    mock_redis.zrevrange.return_value = [b"hot1", b"hot2", b"hot3"]
+    mock_service.get_redirect_targets.side_effect = [
+        [LinkRedirectRow("hot1", "http://one.com", None), LinkRedirectRow("hot2", "http://two.com", None)],
+        [LinkRedirectRow("hot3", "http://three.com", None)],
+    ]
+
+    assert await warm_up_redirects(mock_redis, session_maker, limit=3, chunk_size=2) == 3
+    mock_redis.zrevrange.assert_awaited_once_with("links:hot", 0, 2)
+    assert [call.args[0] for call in mock_service.get_redirect_targets.call_args_list] == [["hot1", "hot2"], ["hot3"]]
+    assert _cached_codes(mock_cache_redirects) == ["hot1", "hot2", "hot3"]
+    mock_service.stream_most_used_redirect_targets.assert_not_called()
+    assert redirect_cache.get("hot3") == "http://three.com"
+
+
+@pytest.mark.anyio
+async def test_warm_up_tops_up_from_database(mock_redis, mock_service, session_maker, mock_cache_redirects):
+    mock_redis.zrevrange.return_value = [b"hot1"]
+    mock_service.get_redirect_targets.return_value = [LinkRedirectRow("hot1", "http://one.com", None)]
+
+    assert await warm_up_redirects(mock_redis, session_maker, limit=3, chunk_size=2) == 3
+    # hot1 уже прогрет из рейтинга, из БД добираются только недостающие
+    assert _cached_codes(mock_cache_redirects) == ["hot1", "db1", "db2"]
+
+
+@pytest.mark.anyio
+async def test_start_warmup_disabled(mock_redis):
+    with patch.object(settings, "WARMUP_LINKS", 0):
+        assert await start_warmup(mock_redis, MagicMock()) is None
+    mock_redis.set.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_start_warmup_skipped_when_other_worker_warms(mock_redis):
+    mock_redis.set.return_value = False
+    with patch("src.links.warmup.warm_up_redirects", new=AsyncMock()) as mock_warm_up:
+        task = await start_warmup(mock_redis, MagicMock())
+    assert task.done()
+    mock_redis.set.assert_awaited_once_with(WARMUP_LOCK_KEY, 1, nx=True, ex=settings.WARMUP_LOCK_TTL)
+    mock_warm_up.assert_not_awaited()
+
+
+@pytest.mark.anyio
+async def test_start_warmup_continues_in_background_after_budget(mock_redis):
+    release = asyncio.Event()
+
+    async def slow_warm_up(*args):
+        await release.wait()
+
+    with patch("src.links.warmup.warm_up_redirects", side_effect=slow_warm_up), \
+         patch.object(settings, "WARMUP_TIME_BUDGET", 0.01):
+        task = await start_warmup(mock_redis, MagicMock())
+        assert not task.done()
+        release.set()
+        await task
+    assert task.done() and not task.cancelled()
+
+
+@pytest.mark.anyio
+async def test_start_warmup_failure_does_not_break_startup(mock_redis):
+    with patch("src.links.warmup.warm_up_redirects", new=AsyncMock(side_effect=RuntimeError("db is down"))), \
+         patch("src.links.warmup.logger") as mock_logger:
+        task = await start_warmup(mock_redis, MagicMock())
+    assert task.done()
+    mock_logger.exception.assert_called_once()
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from src.links import xfetch
+from src.links.xfetch import DELTA_FIELD, EXPIRES_FIELD, VALUE_FIELD, should_refresh, write_entry, xfetch_cache
+
+
+@pytest.fixture
+def mock_redis():
+    pipe = MagicMock()
+    pipe.__aenter__ = AsyncMock(return_value=pipe)
+    pipe.__aexit__ = AsyncMock(return_value=None)
+    pipe.execute = AsyncMock()
+    redis = MagicMock()
+    redis.pipeline.return_value = pipe
+    redis.hgetall = AsyncMock(return_value={})
+    redis.hget = AsyncMock(return_value=None)
+    redis.exists = AsyncMock(return_value=0)
+    redis.lock.return_value.acquire = AsyncMock(return_value=True)
+    redis.lock.return_value.release = AsyncMock()
+    return redis
+
+
+@pytest.fixture
+def endpoint(mock_redis):
+    coder = MagicMock()
+    coder.encode.side_effect = lambda value: f"encoded:{value}".encode()
+    coder.decode.side_effect = lambda value: value.decode()
+    func = AsyncMock(return_value="fresh")
+    func.__name__ = "endpoint"
+    func.__module__ = "tests"
+    with patch("src.links.xfetch.FastAPICache") as mock_fastapi_cache:
+        mock_fastapi_cache.get_backend.return_value.redis = mock_redis
+        mock_fastapi_cache.get_coder.return_value = coder
+        yield func, xfetch_cache(expire=10, key_builder=AsyncMock(return_value="key"), max_stale=30)(func)
+
+
+def _entry(value: bytes, expires_at: float, delta: float = 0.01) -> dict:
+    return {VALUE_FIELD: value, DELTA_FIELD: str(delta).encode(), EXPIRES_FIELD: str(expires_at).encode()}
+
+
+def test_should_refresh():
+    with patch("src.links.xfetch.random.random", return_value=0.5):
+        assert not should_refresh(expires_at=110, delta=1, beta=1, now=100)
+        assert should_refresh(expires_at=110, delta=20, beta=1, now=100)
+        assert should_refresh(expires_at=90, delta=0, beta=1, now=100)
+
+
+@pytest.mark.anyio
+async def test_write_entry(mock_redis):
+    with patch("src.links.xfetch.time.time", return_value=1000):
+        await write_entry(mock_redis, "key", b"value", 0.25, expire=10, max_stale=30)
+    pipe = mock_redis.pipeline.return_value
+    pipe.hset.assert_called_once_with("key", mapping={VALUE_FIELD: b"value", DELTA_FIELD: 0.25, EXPIRES_FIELD: 1010})
+    pipe.expire.assert_called_once_with("key", 40)
+
+
+@pytest.mark.anyio
+async def test_miss_recomputes_and_stores(endpoint, mock_redis):
+    func, cached = endpoint
+    assert await cached(short_code="short") == "fresh"
+    func.assert_awaited_once_with(short_code="short")
+    mock_redis.pipeline.return_value.hset.assert_called_once()
+
+
+@pytest.mark.anyio
+async def test_fresh_hit_served_without_refresh(endpoint, mock_redis):
+    func, cached = endpoint
+    mock_redis.hgetall.return_value = _entry(b"cached", expires_at=xfetch.time.time() + 3600)
+    assert await cached(short_code="short") == "cached"
+    func.assert_not_awaited()
+    assert not xfetch._background_tasks
+
+
+@pytest.mark.anyio
+async def test_stale_hit_served_and_refreshed_in_background(endpoint, mock_redis):
+    func, cached = endpoint
+    mock_redis.hgetall.return_value = _entry(b"stale", expires_at=xfetch.time.time() - 1)
+    assert await cached(short_code="short") == "stale"
+    # повторный запрос, пока идет обновление, второй раз его не запускает
+    assert await cached(short_code="short") == "stale"
+    await asyncio.gather(*xfetch._background_tasks)
+    func.assert_awaited_once_with(short_code="short")
+    mock_redis.pipeline.return_value.hset.assert_called_once()
+    mock_redis.lock.return_value.release.assert_awaited_once()
+    assert not xfetch._refreshing
+
+
+@pytest.mark.anyio
+async def test_background_refresh_skipped_when_other_worker_refreshes(endpoint, mock_redis):
+    func, cached = endpoint
+    mock_redis.lock.return_value.acquire.return_value = False
+    mock_redis.hgetall.return_value = _entry(b"stale", expires_at=xfetch.time.time() - 1)
+    assert await cached(short_code="short") == "stale"
+    await asyncio.gather(*xfetch._background_tasks)
+    func.assert_not_awaited()
+    assert not xfetch._refreshing
+
+
+@pytest.mark.anyio
+async def test_background_refresh_failure_is_logged(endpoint, mock_redis):
+    func, cached = endpoint
+    func.side_effect = RuntimeError("db is down")
+    mock_redis.hgetall.return_value = _entry(b"stale", expires_at=xfetch.time.time() - 1)
+    with patch("src.links.xfetch.logger") as mock_logger:
+        assert await cached(short_code="short") == "stale"
+        await asyncio.gather(*xfetch._background_tasks)
+    mock_logger.exception.assert_called_once()
+    assert not xfetch._refreshing
@@ -1,14 +1,27 @@
+import json
 import pytest
 from datetime import datetime, timedelta
-from unittest.mock import MagicMock, call
-from src.links.models import Link
-from src.tasks.tasks import clear_outdated_links_task
+from unittest.mock import ANY, MagicMock, call
+from sqlalchemy.dialects import postgresql
+from src.links.generations import url_namespace
+from src.tasks.tasks import (
+    build_delete_outdated_chunk_statement,
+    clear_outdated_links_task,
+    flush_click_counters_task,
+    compact_click_counters_task,
+    rebuild_short_code_filter_task,
+    import_links_task
+)
+from src.links.schemes import ImportLinksResponse
 
 
 @pytest.fixture
 def mock_settings(mocker):
     mock = mocker.patch('src.tasks.tasks.Settings')
     mock.return_value.LINK_TTL_IN_DAYS = 7
+    mock.return_value.COUNTER_FLUSH_INTERVAL = 5
+    mock.return_value.HOT_LINKS_HALF_LIFE = 600
+    mock.return_value.CLICK_COUNTER_SHARDS = 0
     return mock
 
 
@@ -22,38 +35,208 @@ def mock_session(mocker):
 
 
 @pytest.fixture
-def mock_loop(mocker):
-    loop = MagicMock()
-    mocker.patch('asyncio.get_event_loop', return_value=loop)
-    return loop
+def mock_redis(mocker):
+    redis = MagicMock()
+    redis.get.return_value = b"flush"
+    mocker.patch('src.tasks.tasks.Redis.from_url', return_value=redis)
+    return redis
 
 
-def test_no_links_to_delete(mock_settings, mock_session, mock_loop):
-    mock_session.execute.return_value.scalars.return_value.all.return_value = []
+@pytest.fixture
+def mock_flush_claim(mocker):
+    mocker.patch('src.tasks.tasks.build_claim_flush_statement', return_value='claim')
+    mocker.patch('src.tasks.tasks.build_forget_flushes_statement', return_value='forget')
+
+
+def _deleted(*short_codes):
+    return MagicMock(all=MagicMock(return_value=[
+        MagicMock(short_code=short_code, long_url=f"http://{short_code}.com") for short_code in short_codes
+    ]))
+
+
+def test_no_links_to_delete(mock_settings, mock_session, mock_redis):
+    mock_settings.return_value.CLEANUP_CHUNK_SIZE = 2
+    mock_settings.return_value.CLEANUP_MAX_CHUNKS = 10
+    mock_session.execute.return_value = _deleted()
     clear_outdated_links_task()
-    mock_session.delete.assert_not_called()
-    mock_session.commit.assert_not_called()
+    mock_session.execute.assert_called_once()
+    mock_redis.pipeline.assert_not_called()
 
 
-def test_multiple_links_deletion_and_cache_invalidation(mock_settings, mock_session, mock_loop):
-    old_updated = datetime.utcnow() - timedelta(days=8)
-    link1 = Link(id=6, short_code='short1', long_url='http://test.com',
-                 expires_at=None, updated_at=old_updated, last_used_at=None)
-    link2 = Link(id=7, short_code='short2', long_url='http://test.com',
-                 expires_at=datetime.utcnow() - timedelta(days=1), updated_at=datetime.utcnow())
-    mock_session.execute.return_value.scalars.return_value.all.return_value = [link1, link2]
+def test_outdated_links_deleted_in_chunks(mock_settings, mock_session, mock_redis):
+    mock_settings.return_value.CLEANUP_CHUNK_SIZE = 2
+    mock_settings.return_value.CLEANUP_MAX_CHUNKS = 10
+    mock_session.execute.side_effect = [_deleted('short1', 'short2'), _deleted('short3')]
     clear_outdated_links_task()
-    assert mock_session.delete.call_count == 2
-    mock_session.delete.assert_has_calls([call(link1), call(link2)], any_order=True)
-    mock_session.commit.assert_called_once()
-    assert mock_loop.create_task.call_count == 2
+    assert mock_session.execute.call_count == 2
+    assert mock_session.commit.call_count == 2
+    pipe = mock_redis.pipeline.return_value
+    assert pipe.execute.call_count == 2
+    pipe.incr.assert_any_call("links:gen:link:short1")
+    pipe.incr.assert_any_call("links:gen:" + url_namespace("http://short3.com"))
+    assert pipe.incr.call_args_list.count(call("links:gen:all")) == 2
+    pipe.unlink.assert_not_called()
+    pipe.publish.assert_has_calls([
+        call("links:invalidate", "short1"), call("links:invalidate", "short2"), call("links:invalidate", "short3")
+    ])
+
+
+def test_outdated_links_chunks_bounded_per_run(mock_settings, mock_session, mock_redis):
+    mock_settings.return_value.CLEANUP_CHUNK_SIZE = 1
+    mock_settings.return_value.CLEANUP_MAX_CHUNKS = 3
+    mock_session.execute.side_effect = lambda statement: _deleted('short')
+    clear_outdated_links_task()
+    assert mock_session.execute.call_count == 3
+
 
+def test_delete_outdated_chunk_statement():
+    statement = build_delete_outdated_chunk_statement(datetime(2026, 1, 10), 500)
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.startswith("DELETE FROM links WHERE links.id IN (SELECT links.id")
+    assert "WHERE links.delete_after < " in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+    assert "RETURNING links.short_code, links.long_url" in sql
+    assert statement.compile(dialect=postgresql.dialect()).params["param_1"] == 500
 
-def test_logging(mock_settings, mock_session, mock_loop, mocker):
+
+def test_logging(mock_settings, mock_session, mock_redis, mocker):
+    mock_settings.return_value.CLEANUP_CHUNK_SIZE = 2
+    mock_settings.return_value.CLEANUP_MAX_CHUNKS = 10
     mock_logger = mocker.patch('src.tasks.tasks.logger')
-    link = Link(id=8, short_code='short', long_url='http://test.com',
-                expires_at=datetime.utcnow() - timedelta(days=1))
-    mock_session.execute.return_value.scalars.return_value.all.return_value = [link]
+    mock_session.execute.return_value = _deleted('short')
     clear_outdated_links_task()
-    mock_logger.info.assert_any_call("outdated_links len == 1")
-    mock_logger.info.assert_any_call("Deleting link short")
+    mock_logger.info.assert_any_call("deleted outdated links chunk of 1")
+    assert mock_logger.info.call_args.args[0].startswith("outdated_links deleted == 1 in ")
+
+
+def test_flush_click_counters_nothing_pending(mock_settings, mock_session, mock_redis, mocker):
+    mocker.patch('src.tasks.tasks.take_pending_clicks', return_value={})
+    release = mocker.patch('src.tasks.tasks.release_pending_clicks')
+    flush_click_counters_task()
+    mock_session.execute.assert_not_called()
+    release.assert_not_called()
+
+
+def test_flush_click_counters_in_batches(mock_settings, mock_session, mock_redis, mock_flush_claim, mocker):
+    mock_settings.return_value.COUNTER_FLUSH_BATCH_SIZE = 2
+    mocker.patch('src.tasks.tasks.take_pending_clicks', return_value={
+        'short1': (3, datetime(2025, 1, 1)),
+        'short2': (1, None),
+        'short3': (5, datetime(2025, 1, 2)),
+    })
+    build = mocker.patch('src.tasks.tasks.build_flush_statement')
+    release = mocker.patch('src.tasks.tasks.release_pending_clicks')
+    flush_click_counters_task()
+    assert build.call_count == 2
+    build.assert_any_call([('short1', 3, datetime(2025, 1, 1)), ('short2', 1, None)], mocker.ANY)
+    build.assert_any_call([('short3', 5, datetime(2025, 1, 2))], mocker.ANY)
+    assert mock_session.execute.call_args_list == [
+        call('claim'), call(build.return_value), call(build.return_value), call('forget')
+    ]
+    mock_session.commit.assert_called_once()
+    release.assert_called_once_with(mock_redis)
+    mock_redis.lock.assert_called_once_with("links:clicks:flush", timeout=ANY, blocking=False)
+    mock_redis.lock.return_value.release.assert_called_once()
+    mock_redis.zremrangebyrank.assert_called_once()
+    mock_redis.zunionstore.assert_called_once_with("links:hot", {"links:hot": 0.5 ** (5 / 600)})
+
+
+def test_flush_click_counters_without_decay(mock_settings, mock_session, mock_redis, mocker):
+    mock_settings.return_value.HOT_LINKS_HALF_LIFE = 0
+    mocker.patch('src.tasks.tasks.take_pending_clicks', return_value={})
+    flush_click_counters_task()
+    mock_redis.zunionstore.assert_not_called()
+    mock_redis.zremrangebyrank.assert_called_once()
+
+
+def test_flush_click_counters_into_shards(mock_settings, mock_session, mock_redis, mock_flush_claim, mocker):
+    mock_settings.return_value.COUNTER_FLUSH_BATCH_SIZE = 1000
+    mock_settings.return_value.CLICK_COUNTER_SHARDS = 8
+    mocker.patch('src.tasks.tasks.take_pending_clicks', return_value={'short1': (3, datetime(2025, 1, 1))})
+    build = mocker.patch('src.tasks.tasks.build_flush_statement')
+    build_sharded = mocker.patch('src.tasks.tasks.build_sharded_flush_statements', return_value=['insert', 'touch'])
+    mocker.patch('src.tasks.tasks.release_pending_clicks')
+    flush_click_counters_task()
+    build.assert_not_called()
+    build_sharded.assert_called_once_with([('short1', 3, datetime(2025, 1, 1))], mocker.ANY, 8)
+    assert mock_session.execute.call_args_list == [call('claim'), call('insert'), call('touch'), call('forget')]
+    mock_session.commit.assert_called_once()
+
+
+def test_flush_click_counters_already_applied(mock_settings, mock_session, mock_redis, mock_flush_claim, mocker):
+    # воркер упал после коммита, но до release: пачка с тем же id не применяется второй раз
+    mock_settings.return_value.COUNTER_FLUSH_BATCH_SIZE = 1000
+    mocker.patch('src.tasks.tasks.take_pending_clicks', return_value={'short1': (3, None)})
+    build = mocker.patch('src.tasks.tasks.build_flush_statement')
+    release = mocker.patch('src.tasks.tasks.release_pending_clicks')
+    mock_session.execute.return_value.first.return_value = None
+    flush_click_counters_task()
+    build.assert_not_called()
+    assert mock_session.execute.call_args_list == [call('claim')]
+    mock_session.commit.assert_called_once()
+    release.assert_called_once_with(mock_redis)
+
+
+def test_flush_click_counters_locked(mock_settings, mock_session, mock_redis, mocker):
+    mock_redis.lock.return_value.acquire.return_value = False
+    take = mocker.patch('src.tasks.tasks.take_pending_clicks')
+    flush_click_counters_task()
+    take.assert_not_called()
+    mock_redis.zunionstore.assert_not_called()
+    mock_redis.lock.return_value.release.assert_not_called()
+
+
+def test_compact_click_counters_until_empty(mock_settings, mock_session):
+    mock_settings.return_value.CLICK_COUNTER_COMPACTION_CHUNK_SIZE = 2
+    mock_settings.return_value.CLICK_COUNTER_COMPACTION_MAX_CHUNKS = 10
+    mock_session.execute.side_effect = [MagicMock(rowcount=2), MagicMock(rowcount=1), MagicMock(rowcount=0)]
+    compact_click_counters_task()
+    assert mock_session.execute.call_count == 3
+    assert mock_session.commit.call_count == 3
+
+
+def test_compact_click_counters_bounded_per_run(mock_settings, mock_session):
+    mock_settings.return_value.CLICK_COUNTER_COMPACTION_CHUNK_SIZE = 1
+    mock_settings.return_value.CLICK_COUNTER_COMPACTION_MAX_CHUNKS = 3
+    mock_session.execute.return_value = MagicMock(rowcount=1)
+    compact_click_counters_task()
+    assert mock_session.execute.call_count == 3
+
+
+def test_rebuild_short_code_filter_disabled(mock_settings, mock_session, mock_redis):
+    mock_settings.return_value.SHORT_CODE_FILTER_ENABLED = False
+    rebuild_short_code_filter_task()
+    mock_session.execute.assert_not_called()
+
+
+def test_rebuild_short_code_filter(mock_settings, mock_session, mock_redis, mocker):
+    mock_settings.return_value.SHORT_CODE_FILTER_ENABLED = True
+    mock_filter = mocker.patch('src.tasks.tasks.short_code_filter')
+    mock_filter.rebuild.return_value = 2
+    mock_session.execute.return_value.scalars.return_value.all.return_value = ['recent']
+    rebuild_short_code_filter_task()
+    mock_filter.rebuild.assert_called_once_with(mock_redis, mock_session.execute.return_value.scalars.return_value)
+    mock_filter.add_sync.assert_called_once_with(mock_redis, ['recent'])
+
+
+def test_import_links_task(mock_settings, mock_redis, mocker, tmp_path):
+    mock_settings.return_value.IMPORT_JOB_TTL = 60
+    path = tmp_path / "job.csv"
+    path.write_text("original_url\ngoogle.com\n")
+    mock_import = mocker.patch('src.tasks.tasks.import_file', new=mocker.AsyncMock(
+        return_value=ImportLinksResponse(total=1, imported=1)
+    ))
+    import_links_task("job", str(path), "csv")
+    mock_import.assert_awaited_once_with(str(path), "csv")
+    assert [json.loads(args.args[1])["status"] for args in mock_redis.set.call_args_list] == ["running", "done"]
+    assert json.loads(mock_redis.set.call_args.args[1])["result"]["imported"] == 1
+    mock_redis.set.assert_called_with("links:import:job", ANY, ex=60)
+    assert not path.exists()
+
+
+def test_import_links_task_failed(mock_settings, mock_redis, mocker, tmp_path):
+    mock_settings.return_value.IMPORT_JOB_TTL = 60
+    mocker.patch('src.tasks.tasks.import_file', new=mocker.AsyncMock(side_effect=RuntimeError("db is down")))
+    import_links_task("job", str(tmp_path / "missing.csv"), "csv")
+    job = json.loads(mock_redis.set.call_args.args[1])
+    assert (job["status"], job["detail"]) == ("failed", "db is down")